@@ -0,0 +1,50 @@
+"""add event_logs inserted_at
+
+Revision ID: 0053fbb5598b
+Revises: 210105ddefeb
+Create Date: 2026-10-17 20:18:52.334427
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0053fbb5598b'
+down_revision: Union[str, Sequence[str], None] = '210105ddefeb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The database's clock in UTC (see models.utcnow). Existing rows get the time of
+# the migration, which only makes the CAPI dispatcher wait CAPI_SETTLE_SECONDS once.
+# On a partitioned event_logs, PostgreSQL adds the column to every partition; the
+# default is stable, so no table is rewritten.
+# The (website_id, id) index serves the dispatcher's checkpoint scan, which reads
+# one website's events after an id in id order.
+
+
+def _is_postgresql() -> bool:
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if _is_postgresql():
+        op.add_column('event_logs', sa.Column('inserted_at', sa.DateTime(), server_default=sa.text("timezone('utc', statement_timestamp())"), nullable=False))
+    else:
+        # SQLite can't ADD COLUMN with a CURRENT_TIMESTAMP default, so the table is rebuilt.
+        with op.batch_alter_table('event_logs', recreate='always') as batch_op:
+            batch_op.add_column(sa.Column('inserted_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False))
+    op.create_index('ix_event_logs_website_id_id', 'event_logs', ['website_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_event_logs_website_id_id', table_name='event_logs')
+    if _is_postgresql():
+        op.drop_column('event_logs', 'inserted_at')
+    else:
+        with op.batch_alter_table('event_logs', recreate='always') as batch_op:
+            batch_op.drop_column('inserted_at')
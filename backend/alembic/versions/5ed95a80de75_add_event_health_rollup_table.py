@@ -0,0 +1,62 @@
+"""add event_health_rollup table
+
+Revision ID: 5ed95a80de75
+Revises: 8c4631237d96
+Create Date: 2026-10-17 19:40:12.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5ed95a80de75'
+down_revision: Union[str, Sequence[str], None] = '8c4631237d96'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _present(column: str) -> str:
+    """SQL that counts a row when the identifier column is filled in."""
+    return f"SUM(CASE WHEN {column} IS NOT NULL AND {column} <> '' THEN 1 ELSE 0 END)"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('event_health_rollup',
+    sa.Column('website_id', sa.Integer(), nullable=False),
+    sa.Column('event_name', sa.String(length=100), nullable=False),
+    sa.Column('first_received', sa.DateTime(), nullable=False),
+    sa.Column('last_received', sa.DateTime(), nullable=False),
+    sa.Column('event_count', sa.Integer(), nullable=False),
+    sa.Column('email_count', sa.Integer(), nullable=False),
+    sa.Column('phone_count', sa.Integer(), nullable=False),
+    sa.Column('ip_count', sa.Integer(), nullable=False),
+    sa.Column('user_agent_count', sa.Integer(), nullable=False),
+    sa.Column('fbp_count', sa.Integer(), nullable=False),
+    sa.Column('fbc_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['website_id'], ['websites.id'], ),
+    sa.PrimaryKeyConstraint('website_id', 'event_name')
+    )
+
+    # Backfill the rollup from the events we already have, so the health
+    # monitor keeps working straight after the upgrade.
+    op.execute(f"""
+        INSERT INTO event_health_rollup (
+            website_id, event_name, first_received, last_received, event_count,
+            email_count, phone_count, ip_count, user_agent_count, fbp_count, fbc_count
+        )
+        SELECT
+            website_id, event_name, MIN(received_at), MAX(received_at), COUNT(*),
+            {_present('email')}, {_present('phone')}, {_present('user_ip_address')},
+            {_present('user_agent')}, {_present('fbp')}, {_present('fbc')}
+        FROM event_logs
+        GROUP BY website_id, event_name
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('event_health_rollup')
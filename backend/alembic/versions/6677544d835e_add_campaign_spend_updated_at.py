@@ -0,0 +1,45 @@
+"""add campaign_spend updated_at
+
+Revision ID: 6677544d835e
+Revises: 0053fbb5598b
+Create Date: 2026-10-17 20:27:50.457031
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6677544d835e'
+down_revision: Union[str, Sequence[str], None] = '0053fbb5598b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# The database's clock in UTC (see models.utcnow), like event_logs.inserted_at.
+# Existing figures get the time of the migration.
+
+
+def _is_postgresql() -> bool:
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if _is_postgresql():
+        op.add_column('campaign_spend', sa.Column('updated_at', sa.DateTime(), server_default=sa.text("timezone('utc', statement_timestamp())"), nullable=False))
+    else:
+        # SQLite can't ADD COLUMN with a CURRENT_TIMESTAMP default, so the table is rebuilt.
+        with op.batch_alter_table('campaign_spend', recreate='always') as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if _is_postgresql():
+        op.drop_column('campaign_spend', 'updated_at')
+    else:
+        with op.batch_alter_table('campaign_spend', recreate='always') as batch_op:
+            batch_op.drop_column('updated_at')
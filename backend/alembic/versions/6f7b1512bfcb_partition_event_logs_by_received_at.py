@@ -0,0 +1,136 @@
+"""partition event_logs by received_at
+
+Revision ID: 6f7b1512bfcb
+Revises: 934f9471319f
+Create Date: 2026-10-17 20:14:03.402871
+
+"""
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6f7b1512bfcb'
+down_revision: Union[str, Sequence[str], None] = '934f9471319f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# PostgreSQL only: SQLite has no declarative partitioning, so there this
+# migration does nothing and retention falls back to batched DELETEs
+# (see app/partitions.py, which also creates new partitions over time).
+
+# Must match app/partitions.py.
+PARTITION_INTERVAL = os.getenv("EVENT_LOG_PARTITION_INTERVAL", "daily")
+PARTITIONS_AHEAD_DAYS = int(os.getenv("EVENT_LOG_PARTITIONS_AHEAD_DAYS", "7"))
+
+INDEXES = [
+    ('ix_event_logs_received_at', ['received_at'], {}),
+    ('ix_event_logs_website_event_id_received', ['website_id', 'event_id', 'received_at'], {}),
+    ('ix_event_logs_website_received', ['website_id', 'received_at'], {}),
+]
+
+COLUMNS = (
+    "id, website_id, received_at, event_id, event_name, event_time, event_source_url, "
+    "user_ip_address, user_agent, fbp, fbc, email, phone, value, currency"
+)
+
+
+def _event_log_columns(id_column: sa.Column) -> list:
+    return [
+        id_column,
+        sa.Column('website_id', sa.Integer(), nullable=False),
+        sa.Column('received_at', sa.DateTime(), nullable=False),
+        sa.Column('event_id', sa.String(length=100), nullable=True),
+        sa.Column('event_name', sa.String(length=100), nullable=False),
+        sa.Column('event_time', sa.DateTime(), nullable=False),
+        sa.Column('event_source_url', sa.String(length=2048), nullable=True),
+        sa.Column('user_ip_address', sa.String(length=64), nullable=True),
+        sa.Column('user_agent', sa.String(length=512), nullable=True),
+        sa.Column('fbp', sa.String(length=100), nullable=True),
+        sa.Column('fbc', sa.String(length=255), nullable=True),
+        sa.Column('email', sa.String(length=255), nullable=True),
+        sa.Column('phone', sa.String(length=100), nullable=True),
+        sa.Column('value', sa.Float(), nullable=True),
+        sa.Column('currency', sa.String(length=10), nullable=True),
+        sa.ForeignKeyConstraint(['website_id'], ['websites.id'], ),
+    ]
+
+
+def _partition_start(day: date) -> date:
+    if PARTITION_INTERVAL == "weekly":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def _create_indexes() -> None:
+    for name, columns, options in INDEXES:
+        op.create_index(name, 'event_logs', columns, unique=False, **options)
+
+
+def _drop_indexes() -> None:
+    for name, _, _ in INDEXES:
+        op.drop_index(name, table_name='event_logs')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    # 1. Move the existing table out of the way. Index and primary key names are
+    #    global in PostgreSQL, so those are cleared from the old table first.
+    _drop_indexes()
+    op.rename_table('event_logs', 'event_logs_unpartitioned')
+    op.execute("ALTER TABLE event_logs_unpartitioned RENAME CONSTRAINT event_logs_pkey TO event_logs_unpartitioned_pkey")
+
+    # 2. Create the partitioned parent. The partition key has to be part of the
+    #    primary key; ids keep coming from the same sequence as before.
+    op.create_table('event_logs',
+        *_event_log_columns(sa.Column('id', sa.Integer(), server_default=sa.text("nextval('event_logs_id_seq')"), nullable=False)),
+        sa.PrimaryKeyConstraint('id', 'received_at'),
+        postgresql_partition_by='RANGE (received_at)'
+    )
+    op.execute("ALTER SEQUENCE event_logs_id_seq OWNED BY event_logs.id")
+    # Catches anything outside the partitions we create (it should stay empty).
+    op.execute("CREATE TABLE event_logs_default PARTITION OF event_logs DEFAULT")
+
+    # 3. One partition per day (or week) from the oldest event up to a few days ahead.
+    oldest = bind.execute(sa.text("SELECT MIN(received_at) FROM event_logs_unpartitioned")).scalar()
+    today = datetime.now(timezone.utc).date()
+    step = timedelta(weeks=1) if PARTITION_INTERVAL == "weekly" else timedelta(days=1)
+    start = _partition_start(oldest.date() if oldest else today)
+    while start <= today + timedelta(days=PARTITIONS_AHEAD_DAYS):
+        op.execute(
+            f"CREATE TABLE event_logs_p{start:%Y%m%d} PARTITION OF event_logs "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{(start + step).isoformat()}')"
+        )
+        start += step
+
+    # 4. Copy the data over, then build the indexes (they cascade to every partition).
+    op.execute(f"INSERT INTO event_logs ({COLUMNS}) SELECT {COLUMNS} FROM event_logs_unpartitioned")
+    op.drop_table('event_logs_unpartitioned')
+    _create_indexes()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    _drop_indexes()
+    op.rename_table('event_logs', 'event_logs_partitioned')
+    op.execute("ALTER TABLE event_logs_partitioned RENAME CONSTRAINT event_logs_pkey TO event_logs_partitioned_pkey")
+
+    op.create_table('event_logs',
+        *_event_log_columns(sa.Column('id', sa.Integer(), server_default=sa.text("nextval('event_logs_id_seq')"), nullable=False)),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("ALTER SEQUENCE event_logs_id_seq OWNED BY event_logs.id")
+    op.execute(f"INSERT INTO event_logs ({COLUMNS}) SELECT {COLUMNS} FROM event_logs_partitioned")
+    op.drop_table('event_logs_partitioned') # Drops every partition with it
+    _create_indexes()
@@ -0,0 +1,64 @@
+"""add composite event_logs indexes
+
+Revision ID: 934f9471319f
+Revises: 5ed95a80de75
+Create Date: 2026-10-17 19:52:40.119385
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '934f9471319f'
+down_revision: Union[str, Sequence[str], None] = '5ed95a80de75'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The queries that still read event_logs filter by website_id plus a received_at
+# range (and duplicate detection groups by event_id), so the indexes lead with
+# website_id and end with received_at. Per-event-type summaries come from
+# event_health_rollup, so there is no (website_id, event_name) index. The old single-column indexes on id (already the primary key),
+# website_id (a prefix of every new index), event_name and event_id (never
+# filtered on alone) only slowed down inserts. ix_event_logs_received_at stays
+# for retention jobs that delete by age across all websites.
+NEW_INDEXES = [
+    ('ix_event_logs_website_event_id_received', ['website_id', 'event_id', 'received_at'], {}),
+    ('ix_event_logs_website_received', ['website_id', 'received_at'], {}),
+]
+OLD_INDEXES = [
+    ('ix_event_logs_id', ['id']),
+    ('ix_event_logs_website_id', ['website_id']),
+    ('ix_event_logs_event_name', ['event_name']),
+    ('ix_event_logs_event_id', ['event_id']),
+]
+
+
+def _is_postgresql() -> bool:
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if _is_postgresql():
+        # Build the indexes without locking out writes on a live table.
+        with op.get_context().autocommit_block():
+            for name, columns, options in NEW_INDEXES:
+                op.create_index(name, 'event_logs', columns, unique=False, postgresql_concurrently=True, **options)
+            for name, _ in OLD_INDEXES:
+                op.drop_index(name, table_name='event_logs', postgresql_concurrently=True)
+    else:
+        for name, columns, options in NEW_INDEXES:
+            op.create_index(name, 'event_logs', columns, unique=False, **options)
+        for name, _ in OLD_INDEXES:
+            op.drop_index(name, table_name='event_logs')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, columns in OLD_INDEXES:
+        op.create_index(op.f(name), 'event_logs', columns, unique=False)
+    for name, _, _ in NEW_INDEXES:
+        op.drop_index(name, table_name='event_logs')
@@ -0,0 +1,306 @@
+from sqlalchemy import func, insert, or_, select, true, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from datetime import date, datetime, timedelta, timezone
+
+# The async twins of the recipes in crud.py, for `async def` endpoints.
+# They take an AsyncSession and follow the same rules as their sync versions:
+# same normalization, same ownership checks, and (unless noted) no commits.
+# One extra rule applies here: async sessions can't lazy load relationships,
+# so anything a response schema reads must be loaded up front.
+from . import attribution, crud, models, schemas, security
+
+# =============================================================================
+# USER CRUD OPERATIONS
+# =============================================================================
+
+async def get_user_by_email(db: AsyncSession, email: str) -> models.User | None:
+    """
+    Async version of `crud.get_user_by_email`.
+    Also loads the user's auth record, since login needs the password hash.
+    """
+    normalized_email = email.strip().lower()
+    result = await db.execute(
+        select(models.User)
+        .options(selectinload(models.User.auth))
+        .where(models.User.email == normalized_email)
+    )
+    return result.scalars().first()
+
+async def get_user_by_id(db: AsyncSession, user_id: int) -> models.User | None:
+    """Fetches a user by primary key (used by the async "Bouncer")."""
+    return await db.get(models.User, user_id)
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate) -> models.User:
+    """
+    Async version of `crud.create_user`. Creates the User and its UserAuth record
+    in the same transaction. The endpoint is responsible for the commit.
+    The password is hashed on the dedicated hashing pool, off the event loop.
+    """
+    hashed_password = await security.get_password_hash_async(user.password)
+
+    db_user = models.User(
+        email=user.email.strip().lower(),
+        name=(user.name or "New User").strip()
+    )
+    db.add(db_user)
+    # Flush to get the new user's ID for the UserAuth record.
+    await db.flush()
+
+    db.add(models.UserAuth(user_id=db_user.id, password_hash=hashed_password))
+    return db_user
+
+# =============================================================================
+# WEBSITE CRUD OPERATIONS
+# =============================================================================
+
+async def get_websites_by_user(db: AsyncSession, user_id: int, limit: int | None = None, after_id: int | None = None) -> list[models.Website]:
+    """Async version of `crud.get_websites_by_user`: one page of websites, with their connections loaded."""
+    query = (
+        select(models.Website)
+        .options(selectinload(models.Website.connections))
+        .where(models.Website.user_id == user_id)
+    )
+    if after_id is not None:
+        query = query.where(models.Website.id > after_id)
+    query = query.order_by(models.Website.id)
+    if limit is not None:
+        query = query.limit(limit)
+    result = await db.execute(query)
+    return list(result.scalars().all())
+
+async def create_website(db: AsyncSession, website: schemas.WebsiteCreate, user_id: int) -> models.Website:
+    """
+    Async version of `crud.create_website`.
+    A brand new website has no connections, so we set the empty list ourselves
+    and the response can be built without another query.
+    """
+    db_website = models.Website(
+        **website.model_dump(),
+        user_id=user_id,
+        connections=[]
+    )
+    db.add(db_website)
+    return db_website
+
+# =============================================================================
+# CONNECTION CRUD OPERATIONS
+# =============================================================================
+
+async def get_website_by_id(db: AsyncSession, website_id: int) -> models.Website | None:
+    """Fetches a website by primary key, without any ownership check."""
+    return await db.get(models.Website, website_id)
+
+async def get_website_by_id_and_owner(db: AsyncSession, website_id: int, user_id: int) -> models.Website | None:
+    """
+    Async version of `crud.get_website_by_id_and_owner`.
+    Fetches a website only if it belongs to the specified user.
+    """
+    result = await db.execute(
+        select(models.Website).where(
+            models.Website.id == website_id,
+            models.Website.user_id == user_id
+        )
+    )
+    return result.scalars().first()
+
+async def get_website_owner_id(db: AsyncSession, website_id: int) -> int | None:
+    """Async version of `crud.get_website_owner_id`."""
+    result = await db.execute(select(models.Website.user_id).where(models.Website.id == website_id))
+    return result.scalar()
+
+async def create_connection_for_website(db: AsyncSession, connection: schemas.ConnectionCreate, website_id: int) -> models.Connection:
+    """Async version of `crud.create_connection_for_website`."""
+    db_connection = models.Connection(
+        **connection.model_dump(),
+        website_id=website_id
+    )
+    db.add(db_connection)
+    return db_connection
+
+# =============================================================================
+# WAITLIST CRUD OPERATIONS
+# =============================================================================
+
+async def create_or_get_waitlist_entry(db: AsyncSession, data: schemas.WaitlistCreate, ip_address: str, user_agent: str) -> tuple[models.Waitlist, bool]:
+    """
+    Async version of `crud.create_or_get_waitlist_entry`.
+    Like the sync version, this one commits itself so it can recover from the
+    unique-constraint race between two simultaneous signups.
+    """
+    normalized_email = data.email.strip().lower()
+    query = select(models.Waitlist).where(models.Waitlist.email == normalized_email)
+
+    existing_entry = (await db.execute(query)).scalars().first()
+    if existing_entry:
+        return existing_entry, False
+
+    new_entry = models.Waitlist(email=normalized_email)
+    db.add(new_entry)
+
+    try:
+        await db.commit()
+        await db.refresh(new_entry)
+        return new_entry, True
+    except IntegrityError:
+        # Another request created the same entry at the same time.
+        await db.rollback()
+        existing_entry = (await db.execute(query)).scalars().first()
+        assert existing_entry is not None
+        return existing_entry, False
+
+# =============================================================================
+# EVENT LOG CRUD OPERATIONS
+# =============================================================================
+
+async def bulk_insert_event_logs(db: AsyncSession, rows: list[dict]) -> int:
+    """Async version of `crud.bulk_insert_event_logs` (one multi-row INSERT)."""
+    if not rows:
+        return 0
+
+    await db.execute(insert(models.EventLog), rows)
+    return len(rows)
+
+async def upsert_event_health_rollup(db: AsyncSession, rows: list[dict]) -> None:
+    """Async version of `crud.upsert_event_health_rollup`."""
+    rollups = crud.aggregate_event_health(rows)
+    if not rollups:
+        return
+    await db.execute(crud.build_event_health_rollup_upsert(db.get_bind().dialect.name, rollups))
+
+async def get_recent_event_summary(db: AsyncSession, website_id: int, time_window_hours: int = 72) -> list:
+    """Async version of `crud.get_recent_event_summary` (reads the rollup and the hourly volume buckets)."""
+    cutoff_time = datetime.now(timezone.utc) - timedelta(hours=time_window_hours)
+    result = await db.execute(
+        select(models.EventHealthRollup).where(
+            models.EventHealthRollup.website_id == website_id,
+            models.EventHealthRollup.last_received >= cutoff_time
+        )
+    )
+    summary = [crud.summarize_rollup(rollup) for rollup in result.scalars()]
+
+    window_counts = await db.execute(crud.window_counts_query(website_id, cutoff_time))
+    return crud.with_window_counts(summary, window_counts)
+
+async def get_dashboard_data_version(db: AsyncSession, website_id: int, since: date) -> tuple:
+    """
+    A fingerprint of the stored data a website's dashboard is built from, read in one
+    small round trip: every flushed event moves the health rollup's totals, and every
+    spend report moves campaign_spend's. It's the same whichever worker asks, unlike
+    `monitor.website_data_versions`, which only sees this worker's own writes.
+    """
+    rollup = models.EventHealthRollup
+    spend = models.CampaignSpend
+    events = select(func.sum(rollup.event_count), func.max(rollup.last_received)).where(rollup.website_id == website_id).subquery()
+    reported = select(func.count(), func.sum(spend.spend), func.max(spend.updated_at)).where(spend.website_id == website_id, spend.day >= since).subquery()
+    row = (await db.execute(select(events, reported).select_from(events.join(reported, true())))).one() # Two one-row results side by side
+    return tuple(row)
+
+async def get_potential_duplicate_events(db: AsyncSession, website_id: int, time_window_minutes: int = 60) -> list:
+    """Async version of `crud.get_potential_duplicate_events`."""
+    cutoff_time = datetime.now(timezone.utc) - timedelta(minutes=time_window_minutes)
+
+    result = await db.execute(
+        select(
+            models.EventLog.event_id
+        ).where(
+            models.EventLog.website_id == website_id,
+            models.EventLog.received_at >= cutoff_time,
+            models.EventLog.event_id.is_not(None)
+        ).group_by(
+            models.EventLog.event_id
+        ).having(
+            func.count(models.EventLog.event_id) > 1
+        )
+    )
+
+    return [row.event_id for row in result]
+
+# =============================================================================
+# PLATFORM FORWARDING OPERATIONS
+# =============================================================================
+
+async def get_active_connections(db: AsyncSession, platform: str) -> list[models.Connection]:
+    """Fetches every active connection for one platform (e.g. all Meta pixels)."""
+    result = await db.execute(
+        select(models.Connection).where(
+            models.Connection.platform == platform,
+            models.Connection.is_active.is_(True)
+        ).order_by(models.Connection.id)
+    )
+    return list(result.scalars())
+
+async def get_events_to_forward(
+    db: AsyncSession,
+    website_id: int,
+    after_event_id: int | None,
+    received_since: datetime,
+    inserted_before: datetime,
+    limit: int
+) -> list[models.EventLog]:
+    """
+    Fetches the next events a connection hasn't forwarded yet, oldest first.
+    `after_event_id` is the connection's checkpoint; `received_since` bounds the
+    scan for connections that have never forwarded anything. `inserted_before`
+    (database time) leaves out rows whose neighbours may not be committed yet.
+    """
+    query = select(models.EventLog).where(
+        models.EventLog.website_id == website_id,
+        models.EventLog.received_at >= received_since,
+        models.EventLog.inserted_at < inserted_before
+    )
+    if after_event_id is not None:
+        query = query.where(models.EventLog.id > after_event_id)
+
+    result = await db.execute(query.order_by(models.EventLog.id).limit(limit))
+    return list(result.scalars())
+
+async def get_database_time(db: AsyncSession) -> datetime:
+    """The database's current time (naive UTC), the clock `EventLog.inserted_at` is stamped with."""
+    return await db.scalar(select(models.utcnow()))
+
+async def update_forwarding_checkpoint(db: AsyncSession, connection_id: int, last_event_id: int) -> None:
+    """Moves a connection's checkpoint forward (never back). The caller commits."""
+    await db.execute(
+        update(models.Connection)
+        .where(
+            models.Connection.id == connection_id,
+            or_(models.Connection.last_forwarded_event_id.is_(None), models.Connection.last_forwarded_event_id < last_event_id),
+        )
+        .values(last_forwarded_event_id=last_event_id, last_forwarded_at=datetime.now(timezone.utc))
+    )
+
+# =============================================================================
+# ATTRIBUTION
+# =============================================================================
+
+async def get_attribution_totals(db: AsyncSession, website_id: int, since: date) -> tuple[list[dict], list[dict]]:
+    """
+    Reads the precomputed attribution totals from `since` on:
+    (conversions per campaign and currency, spend per campaign and currency).
+    """
+    conversions = await db.execute(attribution.conversion_totals_query(website_id, since))
+    spend = await db.execute(attribution.spend_totals_query(website_id, since))
+    return [dict(row._mapping) for row in conversions], [dict(row._mapping) for row in spend]
+
+async def save_campaign_spend(db: AsyncSession, website_id: int, entries: list[schemas.CampaignSpendEntry]) -> int:
+    """
+    Upserts reported ad spend. The endpoint handles the commit.
+    Returns how many (day, campaign, currency) figures were saved.
+    """
+    # One INSERT ... ON CONFLICT can't touch the same row twice (PostgreSQL raises
+    # CardinalityViolation), and "usd" and "USD" are the same row once normalized.
+    # A batch that reports a figure twice is treated like two requests: the later one wins.
+    rows = {}
+    for entry in entries:
+        currency = attribution.normalize_currency(entry.currency)
+        rows[(entry.day, entry.campaign, currency)] = {
+            "website_id": website_id,
+            "day": entry.day,
+            "campaign": entry.campaign,
+            "currency": currency,
+            "spend": entry.spend,
+        }
+    await db.execute(attribution.build_campaign_spend_upsert(db.get_bind().dialect.name, list(rows.values())))
+    return len(rows)
@@ -0,0 +1,328 @@
+import os
+import logging
+from datetime import date, datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlsplit
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .dedup import DEDUP_WINDOW_SECONDS
+from .monitor import CONVERSION_EVENT
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+ATTRIBUTION_WINDOW_DAYS = int(os.getenv("ATTRIBUTION_WINDOW_DAYS", "28")) # How many days the dashboard totals cover
+ATTRIBUTION_CLICK_WINDOW_DAYS = int(os.getenv("ATTRIBUTION_CLICK_WINDOW_DAYS", "7")) # Meta's default click-through window
+ATTRIBUTION_DEFAULT_CURRENCY = os.getenv("ATTRIBUTION_DEFAULT_CURRENCY", "USD") # For purchases sent without a currency
+
+# Purchases we can't tie to any campaign are still counted, under this name.
+UNATTRIBUTED = "(unattributed)"
+# Where the campaign comes from in a landing page URL, best first. Meta ads usually
+# carry utm_campaign={{campaign.name}} and/or utm_id={{campaign.id}}.
+CAMPAIGN_PARAMETERS = ("utm_campaign", "utm_id")
+
+def campaign_from_url(url: str | None) -> str | None:
+    """The campaign named in a page URL's utm parameters, if any."""
+    if not url or "utm_" not in url: # Cheap check first: most page views carry no utm tags
+        return None
+    try:
+        query = parse_qs(urlsplit(url).query)
+    except ValueError:
+        return None
+    for parameter in CAMPAIGN_PARAMETERS:
+        values = query.get(parameter)
+        if values and values[0].strip():
+            return values[0].strip()[:255]
+    return None
+
+def normalize_currency(currency: str | None) -> str:
+    return (currency or "").strip().upper()[:10] or ATTRIBUTION_DEFAULT_CURRENCY
+
+def _naive_utc(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+# =============================================================================
+# INCREMENTAL UPDATES (called for every flushed batch of events)
+# =============================================================================
+
+def collect_clicks(rows: list[dict]) -> dict[tuple[int, str], dict]:
+    """The latest campaign seen for each (website, fbc) in a batch of event rows."""
+    clicks: dict[tuple[int, str], dict] = {}
+    for row in rows:
+        if not row.get("fbc"):
+            continue
+        campaign = campaign_from_url(row.get("event_source_url"))
+        if campaign is None:
+            continue
+        key = (row["website_id"], row["fbc"])
+        seen = _naive_utc(row["received_at"])
+        if key not in clicks or seen >= clicks[key]["last_seen"]:
+            clicks[key] = {"website_id": key[0], "fbc": key[1], "campaign": campaign, "last_seen": seen}
+    return clicks
+
+def collect_click_touches(rows: list[dict]) -> dict[tuple[int, str], list[tuple[datetime, str]]]:
+    """Every ad click in a batch of event rows, per (website, fbc), as (event_time, campaign) in time order."""
+    touches: dict[tuple[int, str], list[tuple[datetime, str]]] = {}
+    for row in rows:
+        if not row.get("fbc"):
+            continue
+        campaign = campaign_from_url(row.get("event_source_url"))
+        if campaign is not None:
+            touches.setdefault((row["website_id"], row["fbc"]), []).append((_naive_utc(row["event_time"]), campaign))
+    for key_touches in touches.values():
+        key_touches.sort(key=lambda touch: touch[0])
+    return touches
+
+def _latest_touch_before(touches: list[tuple[datetime, str]], purchase_time: datetime) -> str | None:
+    """The campaign of the last click at or before the purchase (a flushed batch isn't in time order)."""
+    campaign = None
+    for event_time, touch_campaign in touches:
+        if event_time > purchase_time:
+            break
+        campaign = touch_campaign
+    return campaign
+
+def _stored_click_campaigns(db: Session | Connection, wanted: set[tuple[int, str]]) -> dict[tuple[int, str], dict]:
+    """Looks up clicks from earlier batches: one query per website in the batch."""
+    by_website: dict[int, list[str]] = {}
+    for website_id, fbc in wanted:
+        by_website.setdefault(website_id, []).append(fbc)
+
+    table = models.AttributionClick
+    found = {}
+    for website_id, fbcs in by_website.items():
+        result = db.execute(
+            select(table.fbc, table.campaign, table.last_seen)
+            .where(table.website_id == website_id, table.fbc.in_(fbcs))
+        )
+        for fbc, campaign, last_seen in result:
+            found[(website_id, fbc)] = {"campaign": campaign, "last_seen": last_seen}
+    return found
+
+def attribute_purchases(db: Session | Connection, purchases: list[dict], batch_touches: dict[tuple[int, str], list[tuple[datetime, str]]]) -> list[str]:
+    """
+    The campaign credited with each purchase (last touch): its own page's utm tags,
+    else the campaign of its last ad click at or before it (from the same batch, or
+    from an earlier one if recent enough), else UNATTRIBUTED.
+    """
+    campaigns: list[str | None] = [campaign_from_url(row.get("event_source_url")) for row in purchases]
+    for i, row in enumerate(purchases):
+        if campaigns[i] is None and row.get("fbc"):
+            touches = batch_touches.get((row["website_id"], row["fbc"]))
+            if touches:
+                campaigns[i] = _latest_touch_before(touches, _naive_utc(row["event_time"]))
+
+    # Clicks from earlier batches were all received before this one.
+    unresolved = {
+        (row["website_id"], row["fbc"])
+        for row, campaign in zip(purchases, campaigns)
+        if campaign is None and row.get("fbc")
+    }
+    stored_clicks = _stored_click_campaigns(db, unresolved) if unresolved else {}
+
+    click_window = timedelta(days=ATTRIBUTION_CLICK_WINDOW_DAYS)
+    for i, row in enumerate(purchases):
+        if campaigns[i] is not None or not row.get("fbc"):
+            continue
+        click = stored_clicks.get((row["website_id"], row["fbc"]))
+        if click and _naive_utc(row["received_at"]) - click["last_seen"] <= click_window:
+            campaigns[i] = click["campaign"]
+    return [campaign or UNATTRIBUTED for campaign in campaigns]
+
+def aggregate_conversions(purchases: list[dict], campaigns: list[str]) -> list[dict]:
+    """Collapses attributed purchases into one delta per (website, day, campaign, currency)."""
+    totals: dict[tuple, dict] = {}
+    for row, campaign in zip(purchases, campaigns):
+        key = (row["website_id"], _naive_utc(row["received_at"]).date(), campaign, normalize_currency(row.get("currency")))
+        total = totals.get(key)
+        if total is None:
+            total = totals[key] = {"website_id": key[0], "day": key[1], "campaign": key[2], "currency": key[3], "conversions": 0, "revenue": 0.0}
+        total["conversions"] += 1
+        total["revenue"] += row.get("value") or 0.0
+    return list(totals.values())
+
+def build_click_upsert(dialect_name: str, clicks: list[dict]):
+    """Remembers each click's campaign; a click seen again keeps its newest campaign."""
+    table = models.AttributionClick
+    stmt = crud.upsert_dialect_insert(dialect_name, table).values(clicks)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.website_id, table.fbc],
+        set_={"campaign": stmt.excluded.campaign, "last_seen": stmt.excluded.last_seen},
+    )
+
+def build_attribution_daily_upsert(dialect_name: str, deltas: list[dict]):
+    """Adds a batch's conversion deltas onto the existing daily rows (or creates them)."""
+    table = models.AttributionDaily
+    stmt = crud.upsert_dialect_insert(dialect_name, table).values(deltas)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.website_id, table.day, table.campaign, table.currency],
+        set_={
+            "conversions": table.conversions + stmt.excluded.conversions,
+            "revenue": table.revenue + stmt.excluded.revenue,
+        },
+    )
+
+def record_events(db: Session | Connection, rows: list[dict]) -> None:
+    """
+    Folds a batch of freshly written event rows into the attribution tables.
+    Runs in the ingest flush's transaction, next to the health rollup. The caller commits.
+    Purchases flagged as duplicates (`is_duplicate`, set by the ingest endpoint's
+    dedup check) are stored but not counted again.
+    """
+    dialect_name = db.get_bind().dialect.name if isinstance(db, Session) else db.dialect.name
+    # Attribute before storing this batch's clicks, so the click table only holds earlier ones.
+    purchases = [row for row in rows if row["event_name"] == CONVERSION_EVENT and not row.get("is_duplicate")]
+    if purchases:
+        campaigns = attribute_purchases(db, purchases, collect_click_touches(rows))
+        db.execute(build_attribution_daily_upsert(dialect_name, aggregate_conversions(purchases, campaigns)))
+
+    clicks = collect_clicks(rows)
+    if clicks:
+        db.execute(build_click_upsert(dialect_name, list(clicks.values())))
+
+# =============================================================================
+# DASHBOARD
+# =============================================================================
+
+def attribution_since(now: datetime, window_days: int = ATTRIBUTION_WINDOW_DAYS) -> date:
+    """The first day the dashboard totals include (today counts as one of the days)."""
+    return now.astimezone(timezone.utc).date() - timedelta(days=window_days - 1)
+
+def conversion_totals_query(website_id: int, since: date):
+    """Conversions and revenue per (campaign, currency) from `since` on: a few dozen daily rows per campaign."""
+    table = models.AttributionDaily
+    return select(
+        table.campaign, table.currency,
+        func.sum(table.conversions).label("conversions"), func.sum(table.revenue).label("revenue"),
+    ).where(table.website_id == website_id, table.day >= since).group_by(table.campaign, table.currency)
+
+def spend_totals_query(website_id: int, since: date):
+    table = models.CampaignSpend
+    return select(
+        table.campaign, table.currency, func.sum(table.spend).label("spend"),
+    ).where(table.website_id == website_id, table.day >= since).group_by(table.campaign, table.currency)
+
+def build_campaign_spend_upsert(dialect_name: str, entries: list[dict]):
+    """Saves reported spend; reporting a (day, campaign, currency) again replaces the old figure."""
+    table = models.CampaignSpend
+    stmt = crud.upsert_dialect_insert(dialect_name, table).values(entries)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.website_id, table.day, table.campaign, table.currency],
+        set_={"spend": stmt.excluded.spend, "updated_at": models.utcnow()}, # ON CONFLICT skips server defaults
+    )
+
+def compute_attribution(conversions: list[dict], spend: list[dict], window_days: int = ATTRIBUTION_WINDOW_DAYS) -> dict:
+    """
+    Turns per-(campaign, currency) totals into the dashboard's numbers.
+    There are no exchange rates here, so ROAS is reported in the website's main
+    currency (the one with the most revenue); conversions are counted in every currency.
+    """
+    revenue_by_currency: dict[str, float] = {}
+    for row in conversions:
+        revenue_by_currency[row["currency"]] = revenue_by_currency.get(row["currency"], 0.0) + row["revenue"]
+    for row in spend:
+        revenue_by_currency.setdefault(row["currency"], 0.0)
+    if not revenue_by_currency:
+        return {"total_conversions": 0, "overall_roas": 0.0, "currency": ATTRIBUTION_DEFAULT_CURRENCY, "campaigns": [], "window_days": window_days}
+    currency = max(revenue_by_currency, key=revenue_by_currency.get)
+
+    campaigns: dict[str, dict] = {}
+    for row in conversions:
+        if row["currency"] == currency and row["campaign"] != UNATTRIBUTED:
+            campaign = campaigns.setdefault(row["campaign"], {"conversions": 0, "revenue": 0.0, "spend": 0.0})
+            campaign["conversions"] += row["conversions"]
+            campaign["revenue"] += row["revenue"]
+    for row in spend:
+        if row["currency"] == currency:
+            campaigns.setdefault(row["campaign"], {"conversions": 0, "revenue": 0.0, "spend": 0.0})["spend"] += row["spend"]
+
+    def roas(revenue: float, spend: float) -> float:
+        return round(revenue / spend, 2) if spend > 0 else 0.0 # No spend reported: ROAS unknown
+
+    total_spend = sum(campaign["spend"] for campaign in campaigns.values())
+    attributed_revenue = sum(campaign["revenue"] for campaign in campaigns.values())
+    return {
+        "total_conversions": sum(row["conversions"] for row in conversions),
+        "overall_roas": roas(attributed_revenue, total_spend),
+        "currency": currency,
+        "window_days": window_days,
+        "campaigns": sorted((
+            {
+                "id": name,
+                "name": name,
+                "conversions": campaign["conversions"],
+                "revenue": round(campaign["revenue"], 2),
+                "spend": round(campaign["spend"], 2),
+                "roas": roas(campaign["revenue"], campaign["spend"]),
+                "currency": currency,
+            }
+            for name, campaign in campaigns.items()
+        ), key=lambda campaign: (-campaign["revenue"], campaign["name"])),
+    }
+
+# =============================================================================
+# REBUILD
+# =============================================================================
+
+def flag_replayed_duplicates(rows: list[dict], last_seen: dict[tuple[int, str], datetime]) -> None:
+    """
+    event_logs doesn't keep the ingest's duplicate flags, so a replay recomputes them
+    for purchases the same way: an event_id seen again within DEDUP_WINDOW_SECONDS.
+    `last_seen` carries (website, event_id) -> received_at across the replayed chunks.
+    """
+    window = timedelta(seconds=DEDUP_WINDOW_SECONDS)
+    for row in rows:
+        if row["event_name"] != CONVERSION_EVENT or not row.get("event_id"):
+            continue
+        key = (row["website_id"], row["event_id"])
+        received_at = _naive_utc(row["received_at"])
+        previous = last_seen.get(key)
+        row["is_duplicate"] = previous is not None and received_at - previous <= window
+        last_seen[key] = received_at
+
+def rebuild(engine, website_id: int | None = None) -> int:
+    """
+    Recomputes the click map and daily conversions from event_logs (e.g. after the
+    upgrade that added them, or after changing the attribution rules). Streams the
+    events in received order through the same code as the ingest flush, so memory
+    stays flat. Spend is left alone. Returns the number of events replayed.
+    Pause ingestion while it runs: a batch flushed mid-rebuild could be counted twice.
+    """
+    event_logs = models.EventLog.__table__
+    query = select(
+        event_logs.c.website_id, event_logs.c.received_at, event_logs.c.event_id, event_logs.c.event_name,
+        event_logs.c.event_time, event_logs.c.event_source_url, event_logs.c.fbc, event_logs.c.value, event_logs.c.currency,
+    )
+    if website_id is not None:
+        query = query.where(event_logs.c.website_id == website_id)
+    query = query.order_by(event_logs.c.received_at, event_logs.c.id)
+
+    replayed = 0
+    purchases_seen: dict[tuple[int, str], datetime] = {}
+    with Session(engine) as db:
+        for table in (models.AttributionClick, models.AttributionDaily):
+            stmt = delete(table)
+            if website_id is not None:
+                stmt = stmt.where(table.website_id == website_id)
+            db.execute(stmt)
+
+        with engine.connect() as reader: # A second connection, so the upserts don't disturb the open cursor
+            for rows in crud.stream_query(reader, query):
+                rows = [row._asdict() for row in rows]
+                flag_replayed_duplicates(rows, purchases_seen)
+                record_events(db, rows)
+                replayed += len(rows)
+        db.commit()
+    logger.info("Rebuilt attribution from %d events", replayed)
+    return replayed
+
+if __name__ == "__main__":
+    # Backfills attribution by hand: `python -m app.attribution [WEBSITE_ID]` from backend/.
+    import sys
+    from . import database
+
+    logging.basicConfig(level=logging.INFO)
+    print(rebuild(database.engine, int(sys.argv[1]) if len(sys.argv) > 1 else None))
@@ -0,0 +1,198 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+# A sentinel so we can tell "not cached" apart from a cached None.
+MISSING = object()
+
+class TTLCache:
+    """
+    A small, thread-safe in-memory cache with a time-to-live and LRU eviction.
+
+    Entries expire `ttl_seconds` after they were stored, and once the cache holds
+    `maxsize` entries the least recently used one is evicted to make room.
+    A ttl of 0 (or less) turns the cache off: nothing is ever stored.
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: float):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        # Maps key -> (expires_at, value). OrderedDict keeps the LRU order for us.
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Hit/miss counters so we can see whether the cache is pulling its weight.
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.maxsize > 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """Returns the cached value, or `default` if it's missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key) # Mark as most recently used
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Stores a value, evicting the least recently used entries if we're full."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """Removes a key (explicit invalidation). Missing keys are ignored."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+class _Flight:
+    """One in-progress computation that other callers can wait on."""
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller runs the function,
+    and everyone who asks for that key while it is running waits and gets the same
+    result (or the same exception). Nothing is remembered once the call finishes;
+    put a TTLCache in front for that (see CoalescingCache).
+    """
+
+    def __init__(self):
+        self._flights: dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func()
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+class CoalescingCache:
+    """
+    A short-lived result cache with single-flight misses: a burst of identical
+    requests costs one computation, and repeats within `ttl_seconds` cost none.
+    `results` is where finished values live: a TTLCache by default, or anything
+    with the same get/set (such as a SharedCache, to share them between workers).
+    """
+
+    def __init__(self, maxsize: int = 0, ttl_seconds: float = 0, results=None):
+        self.results = results if results is not None else TTLCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+        self.flights = SingleFlight()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any], is_current: Callable[[], bool] | None = None) -> Any:
+        """
+        `is_current` is checked once the computation is done: if the data changed
+        while it ran (and the entry was invalidated meanwhile), the result is
+        returned to the callers that were waiting but not stored.
+        """
+        value = self.results.get(key)
+        if value is not MISSING:
+            return value
+
+        def compute_and_store() -> Any:
+            result = compute()
+            if is_current is None or is_current():
+                self.results.set(key, result)
+            return result
+
+        return self.flights.do(key, compute_and_store)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.results),
+            "max_entries": self.results.maxsize,
+            "ttl_seconds": self.results.ttl_seconds,
+            "hits": self.results.hits,
+            "misses": self.results.misses,
+            "computations": self.flights.executions,
+            "coalesced": self.flights.coalesced,
+        }
+
+class VersionCounter:
+    """
+    A version number per key that goes up every time the key's data changes.
+
+    Anything this process derives from that data (a cached result) can remember the
+    version it was built from: if the version hasn't moved, the derived value is still good.
+    Versions are kept in memory, so each process only counts its own writes: nothing
+    handed to clients that may come back to another worker (an ETag) can rely on them.
+    """
+
+    def __init__(self):
+        self._versions: dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self._listeners: list[Callable[[tuple], None]] = []
+
+    def get(self, key: Hashable) -> int:
+        return self._versions.get(key, 0)
+
+    def bump(self, *keys: Hashable) -> None:
+        with self._lock:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+        for listener in list(self._listeners):
+            listener(keys)
+
+    def add_listener(self, listener: Callable[[tuple], None]) -> None:
+        """
+        Calls `listener(keys)` after every bump. It runs on whichever thread bumped,
+        so it must be quick and thread-safe.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[tuple], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
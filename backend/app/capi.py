@@ -0,0 +1,377 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from sqlalchemy import text
+from cryptography.fernet import Fernet, InvalidToken
+
+from . import async_crud, crud, database, models
+from .identifiers import hash_identifier_batch
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Point META_GRAPH_API_URL at a local mock server (see benchmarks/mock_capi.py) to test forwarding.
+META_GRAPH_API_URL = os.getenv("META_GRAPH_API_URL", "https://graph.facebook.com").rstrip("/")
+META_GRAPH_API_VERSION = os.getenv("META_GRAPH_API_VERSION", "v21.0")
+# Meta accepts at most 1000 events per request.
+CAPI_BATCH_SIZE = min(int(os.getenv("CAPI_BATCH_SIZE", "1000")), 1000)
+# How many batches we read for one connection per cycle (they are sent concurrently).
+CAPI_MAX_BATCHES_PER_CYCLE = int(os.getenv("CAPI_MAX_BATCHES_PER_CYCLE", "5"))
+# In-flight requests allowed per pixel, across every connection that targets it.
+CAPI_MAX_CONCURRENCY_PER_PIXEL = int(os.getenv("CAPI_MAX_CONCURRENCY_PER_PIXEL", "2"))
+# Connections forwarded at the same time (each one holds a database session while it reads).
+CAPI_MAX_CONCURRENT_CONNECTIONS = int(os.getenv("CAPI_MAX_CONCURRENT_CONNECTIONS", "8"))
+# Size of the shared keep-alive HTTP connection pool.
+CAPI_HTTP_MAX_CONNECTIONS = int(os.getenv("CAPI_HTTP_MAX_CONNECTIONS", "50"))
+CAPI_REQUEST_TIMEOUT_SECONDS = float(os.getenv("CAPI_REQUEST_TIMEOUT_SECONDS", "30"))
+# How long the dispatcher sleeps between cycles when there is nothing left to send.
+CAPI_POLL_INTERVAL_SECONDS = float(os.getenv("CAPI_POLL_INTERVAL_SECONDS", "5"))
+# Events are only forwarded once they were inserted this long ago (by the database's
+# clock, see EventLog.inserted_at). Ids are handed out at INSERT but become visible
+# at COMMIT, so another worker's flush may still commit lower ids than the ones we
+# can see; once every transaction that could hold such rows has had this long to
+# commit, the checkpoint can safely move past them. It must stay well above the
+# time one ingest flush transaction takes.
+CAPI_SETTLE_SECONDS = float(os.getenv("CAPI_SETTLE_SECONDS", "10"))
+# After a failure that may pass (Meta down, rate limited, bad token, network), a
+# connection waits before it is tried again: the base delay, doubled per failure
+# in a row, up to the max.
+CAPI_RETRY_BASE_SECONDS = float(os.getenv("CAPI_RETRY_BASE_SECONDS", "5"))
+CAPI_RETRY_MAX_SECONDS = float(os.getenv("CAPI_RETRY_MAX_SECONDS", "600"))
+CAPI_ENABLED = os.getenv("CAPI_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Fernet key used to encrypt `Connection.encrypted_access_token`.
+ACCESS_TOKEN_ENCRYPTION_KEY = os.getenv("ACCESS_TOKEN_ENCRYPTION_KEY")
+
+# Meta rejects events whose event_time is more than 7 days old.
+MAX_EVENT_AGE = timedelta(days=7)
+
+# Every uvicorn worker runs a dispatcher, but only one may forward at a time or the
+# same events would be sent once per worker. On PostgreSQL each cycle runs under this
+# advisory lock; the other workers skip the cycle and try again after the poll interval.
+_DISPATCHER_LOCK_ID = 7_406_117_117 # Arbitrary, but must stay stable (and differ from maintenance's)
+
+# Meta error codes that come with a 4xx but say nothing about the events themselves:
+# rate limits (4, 17, 32, 613, 80004) and access token or permission problems
+# (10, 102, 190, 200-299). Those batches are retried; any other 4xx means Meta
+# refused the batch's content, and sending it again would fail the same way.
+_RETRYABLE_META_ERROR_CODES = {4, 10, 17, 32, 102, 190, 613, 80004, *range(200, 300)}
+_RETRYABLE_STATUS_CODES = {401, 403, 408, 429}
+
+# =============================================================================
+# PAYLOAD BUILDING
+# =============================================================================
+
+def decrypt_access_token(encrypted_token: str | None) -> str | None:
+    """Returns the plain access token of a connection, or None if we can't read it."""
+    if not encrypted_token or not ACCESS_TOKEN_ENCRYPTION_KEY:
+        return None
+    try:
+        return Fernet(ACCESS_TOKEN_ENCRYPTION_KEY).decrypt(encrypted_token.encode()).decode()
+    except (InvalidToken, ValueError):
+        return None
+
+def build_capi_event(event: models.EventLog, hashed_identifiers: dict[str, str]) -> dict:
+    """
+    Turns one stored event into a Conversions API event. `hashed_identifiers` are
+    its email/phone hashes from the hashing stage (see identifiers.py).
+    """
+    user_data = {
+        "client_ip_address": event.user_ip_address,
+        "client_user_agent": event.user_agent,
+        "fbp": event.fbp,
+        "fbc": event.fbc,
+    }
+    for key, hashed_value in hashed_identifiers.items():
+        user_data[key] = [hashed_value]
+
+    capi_event = {
+        "event_name": event.event_name,
+        "event_time": int(crud.as_utc(event.event_time).timestamp()),
+        "action_source": "website",
+        "user_data": {key: value for key, value in user_data.items() if value},
+    }
+    if event.event_id:
+        capi_event["event_id"] = event.event_id # Lets Meta deduplicate against the browser pixel
+    if event.event_source_url:
+        capi_event["event_source_url"] = event.event_source_url
+    if event.value is not None:
+        capi_event["custom_data"] = {"value": event.value, "currency": event.currency or "USD"}
+    return capi_event
+
+def is_forwardable(event: models.EventLog, now: datetime) -> bool:
+    """Meta refuses a whole batch if one event is too old, so those are left out."""
+    return now - crud.as_utc(event.event_time) <= MAX_EVENT_AGE
+
+def is_rejected_batch(error: BaseException) -> bool:
+    """True when Meta refused a batch for good (a 4xx about its events), so it must be skipped."""
+    if not isinstance(error, httpx.HTTPStatusError):
+        return False # Network errors and timeouts
+    response = error.response
+    if not 400 <= response.status_code < 500 or response.status_code in _RETRYABLE_STATUS_CODES:
+        return False
+    try:
+        code = (response.json().get("error") or {}).get("code")
+    except (ValueError, AttributeError):
+        code = None
+    return code not in _RETRYABLE_META_ERROR_CODES
+
+def build_capi_events(events: list[models.EventLog]) -> list[dict]:
+    """Builds the payload for a whole batch, hashing its identifiers in one pass."""
+    return [
+        build_capi_event(event, hashed)
+        for event, hashed in zip(events, hash_identifier_batch(events))
+    ]
+
+# =============================================================================
+# DISPATCHER
+# =============================================================================
+
+class CAPIDispatcher:
+    """
+    Forwards stored events to the Meta Conversions API.
+
+    Every active Meta connection is its own queue: the events after its checkpoint
+    (`last_forwarded_event_id`). Each cycle we read up to a few batches per
+    connection, send them over one shared keep-alive HTTP client, and move the
+    checkpoint past every batch that is settled: accepted, or rejected for good
+    by Meta (logged and counted, then skipped, so one bad batch can't block a
+    connection forever). A batch that failed for a reason that may pass stops the
+    checkpoint there, and the connection backs off before it is retried.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        max_batches_per_cycle: int,
+        max_concurrency_per_pixel: int,
+        max_concurrent_connections: int,
+        poll_interval_seconds: float,
+    ):
+        self.batch_size = batch_size
+        self.max_batches_per_cycle = max_batches_per_cycle
+        self.max_concurrency_per_pixel = max_concurrency_per_pixel
+        self.max_concurrent_connections = max_concurrent_connections
+        self.poll_interval_seconds = poll_interval_seconds
+
+        self._client: httpx.AsyncClient | None = None
+        self._task: asyncio.Task | None = None
+        self._pixel_limits: dict[str, asyncio.Semaphore] = {}
+        # connection id -> (failures in a row, loop time before which it isn't retried).
+        # Kept by the worker that ran into the failures; another worker taking over
+        # the lock starts without it.
+        self._backoff: dict[int, tuple[int, float]] = {}
+
+        # Simple counters so we can see what the dispatcher is doing.
+        self.forwarded_events = 0
+        self.skipped_events = 0
+        self.failed_batches = 0
+        self.rejected_batches = 0 # Refused for good by Meta and skipped
+        self.rejected_events = 0
+        self.skipped_cycles = 0 # Another worker held the lock
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "forwarded_events": self.forwarded_events,
+            "skipped_events": self.skipped_events,
+            "failed_batches": self.failed_batches,
+            "rejected_batches": self.rejected_batches,
+            "rejected_events": self.rejected_events,
+            "skipped_cycles": self.skipped_cycles,
+            "backing_off_connections": len(self._backoff),
+        }
+
+    async def start(self, client: httpx.AsyncClient | None = None) -> None:
+        """Opens the HTTP client and starts the forwarding loop (called once at app startup)."""
+        if self._task is not None:
+            return
+        self._client = client or httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=CAPI_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=CAPI_HTTP_MAX_CONNECTIONS,
+            ),
+            timeout=CAPI_REQUEST_TIMEOUT_SECONDS,
+        )
+        self._task = asyncio.create_task(self._run(), name="capi-dispatcher")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self._client.aclose()
+        self._client = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                forwarded = await self.run_once()
+            except Exception:
+                logger.exception("CAPI dispatch cycle failed")
+                forwarded = 0
+            # Keep going right away while checkpoints are moving; otherwise wait for new events.
+            if not forwarded:
+                await asyncio.sleep(self.poll_interval_seconds)
+
+    async def run_once(self) -> int:
+        """
+        Runs one forwarding cycle over every active Meta connection, unless another
+        worker is already running one. Returns how many events the checkpoints moved
+        past (sent, left out as too old, or rejected), i.e. whether there was progress.
+        """
+        async with database.async_engine.connect() as lock_conn:
+            is_postgresql = lock_conn.dialect.name == "postgresql"
+            if is_postgresql:
+                # Session-level advisory lock, held on this connection for the whole cycle.
+                locked = await lock_conn.scalar(text("SELECT pg_try_advisory_lock(:id)"), {"id": _DISPATCHER_LOCK_ID})
+                await lock_conn.commit()
+                if not locked:
+                    self.skipped_cycles += 1
+                    return 0
+            try:
+                return await self._forward_all()
+            finally:
+                if is_postgresql:
+                    await lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _DISPATCHER_LOCK_ID})
+                    await lock_conn.commit()
+
+    async def _forward_all(self) -> int:
+        async with database.AsyncSessionLocal() as db:
+            connections = await async_crud.get_active_connections(db, platform="meta")
+            loop_time = asyncio.get_running_loop().time()
+            connections = [connection for connection in connections if not self._is_backing_off(connection.id, loop_time)]
+            # Checkpoints are read fresh every cycle, so whichever worker holds the lock next
+            # continues exactly where the last one stopped. The settle cutoff uses the
+            # database's clock, like inserted_at.
+            database_now = await async_crud.get_database_time(db)
+        inserted_before = database_now - timedelta(seconds=CAPI_SETTLE_SECONDS)
+
+        connection_limit = asyncio.Semaphore(self.max_concurrent_connections)
+
+        async def forward(connection: models.Connection) -> int:
+            async with connection_limit:
+                return await self.forward_connection(connection, inserted_before)
+
+        results = await asyncio.gather(*(forward(connection) for connection in connections), return_exceptions=True)
+        forwarded = 0
+        for connection, result in zip(connections, results):
+            if isinstance(result, BaseException):
+                logger.error("Forwarding failed for connection %s: %r", connection.id, result)
+            else:
+                forwarded += result
+        return forwarded
+
+    def _is_backing_off(self, connection_id: int, loop_time: float) -> bool:
+        backoff = self._backoff.get(connection_id)
+        return backoff is not None and loop_time < backoff[1]
+
+    def _back_off(self, connection_id: int) -> None:
+        failures = self._backoff.get(connection_id, (0, 0.0))[0] + 1
+        delay = min(CAPI_RETRY_BASE_SECONDS * 2 ** (failures - 1), CAPI_RETRY_MAX_SECONDS)
+        self._backoff[connection_id] = (failures, asyncio.get_running_loop().time() + delay)
+
+    async def forward_connection(self, connection: models.Connection, inserted_before: datetime) -> int:
+        """
+        Sends the next batches of one connection and advances its checkpoint.
+        Only rows inserted before `inserted_before` (database time) are considered.
+        Returns how many events the checkpoint moved past.
+        """
+        pixel_id = str((connection.platform_identifiers or {}).get("pixel_id") or "")
+        access_token = decrypt_access_token(connection.encrypted_access_token)
+        if not pixel_id or not access_token:
+            return 0 # Not fully set up yet
+
+        now = datetime.now(timezone.utc)
+        received_since = now - MAX_EVENT_AGE
+        if connection.last_forwarded_event_id is None:
+            # A new connection starts from the moment it was created, not from all history.
+            received_since = max(received_since, crud.as_utc(connection.created_at))
+
+        async with database.AsyncSessionLocal() as db:
+            events = await async_crud.get_events_to_forward(
+                db,
+                website_id=connection.website_id,
+                after_event_id=connection.last_forwarded_event_id,
+                received_since=received_since,
+                inserted_before=inserted_before,
+                limit=self.batch_size * self.max_batches_per_cycle,
+            )
+        if not events:
+            return 0
+
+        batches = [events[i:i + self.batch_size] for i in range(0, len(events), self.batch_size)]
+        results = await asyncio.gather(
+            *(self._send_batch(pixel_id, access_token, batch, now) for batch in batches),
+            return_exceptions=True
+        )
+
+        # The checkpoint only moves over the unbroken run of settled batches.
+        forwarded = 0
+        advanced = 0
+        last_event_id = None
+        for batch, result in zip(batches, results):
+            if isinstance(result, BaseException):
+                if not is_rejected_batch(result):
+                    self.failed_batches += 1
+                    self._back_off(connection.id)
+                    logger.warning("CAPI batch for pixel %s failed, will retry: %r", pixel_id, result)
+                    break
+                # Meta will never take this batch: record what we drop and move on.
+                self.rejected_batches += 1
+                self.rejected_events += len(batch)
+                logger.error(
+                    "Meta rejected CAPI batch for pixel %s (connection %s, event ids %s-%s), skipping it: %s",
+                    pixel_id, connection.id, batch[0].id, batch[-1].id, result.response.text[:500],
+                )
+            else:
+                forwarded += result
+                self._backoff.pop(connection.id, None)
+            advanced += len(batch)
+            last_event_id = batch[-1].id
+
+        if last_event_id is not None:
+            async with database.AsyncSessionLocal() as db:
+                await async_crud.update_forwarding_checkpoint(db, connection.id, last_event_id)
+                await db.commit()
+            connection.last_forwarded_event_id = last_event_id
+            self.forwarded_events += forwarded
+        return advanced
+
+    def _pixel_limit(self, pixel_id: str) -> asyncio.Semaphore:
+        limit = self._pixel_limits.get(pixel_id)
+        if limit is None:
+            limit = self._pixel_limits[pixel_id] = asyncio.Semaphore(self.max_concurrency_per_pixel)
+        return limit
+
+    async def _send_batch(self, pixel_id: str, access_token: str, batch: list[models.EventLog], now: datetime) -> int:
+        """POSTs one batch to the pixel's /events edge. Returns how many events were sent."""
+        forwardable = [event for event in batch if is_forwardable(event, now)]
+        self.skipped_events += len(batch) - len(forwardable)
+        data = build_capi_events(forwardable)
+        if not data:
+            return 0
+
+        async with self._pixel_limit(pixel_id):
+            response = await self._client.post(
+                f"{META_GRAPH_API_URL}/{META_GRAPH_API_VERSION}/{pixel_id}/events",
+                json={"data": data, "access_token": access_token},
+            )
+        response.raise_for_status()
+        return len(data)
+
+# The single dispatcher shared by the whole app.
+capi_dispatcher = CAPIDispatcher(
+    batch_size=CAPI_BATCH_SIZE,
+    max_batches_per_cycle=CAPI_MAX_BATCHES_PER_CYCLE,
+    max_concurrency_per_pixel=CAPI_MAX_CONCURRENCY_PER_PIXEL,
+    max_concurrent_connections=CAPI_MAX_CONCURRENT_CONNECTIONS,
+    poll_interval_seconds=CAPI_POLL_INTERVAL_SECONDS,
+)
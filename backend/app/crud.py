@@ -1,7 +1,10 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func # Need func for MAX aggregation
+from sqlalchemy import case, func, insert, select, union_all # Need func for MAX aggregation, insert for bulk writes
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
 from datetime import datetime, timedelta, timezone
+from typing import Iterator
 
 # We import our models (the database blueprint), schemas (the API contract),
 # and security functions (the locksmith).
@@ -59,9 +62,24 @@ def create_user(db: Session, user: schemas.UserCreate) -> models.User:
 # WEBSITE CRUD OPERATIONS
 # =============================================================================
 
-def get_websites_by_user(db: Session, user_id: int) -> list[models.Website]:
-    """Fetches all websites owned by a user"""
-    return db.query(models.Website).filter(models.Website.user_id == user_id).all()
+def get_websites_by_user(db: Session, user_id: int, limit: int | None = None, after_id: int | None = None) -> list[models.Website]:
+    """
+    Fetches the websites owned by a user, ordered by id, with their connections loaded.
+    `selectinload` fetches the connections of the whole page in one extra query,
+    instead of one lazy query per website when the response is serialized.
+    Pagination is keyset-based: pass the last id you got as `after_id` for the next page.
+    """
+    query = (
+        db.query(models.Website)
+        .options(selectinload(models.Website.connections))
+        .filter(models.Website.user_id == user_id)
+    )
+    if after_id is not None:
+        query = query.filter(models.Website.id > after_id)
+    query = query.order_by(models.Website.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
 
 def create_website(db: Session, website: schemas.WebsiteCreate, user_id: int) -> models.Website:
     """
@@ -90,6 +108,13 @@ def get_website_by_id_and_owner(db: Session, website_id: int, user_id: int) -> m
         models.Website.user_id == user_id
     ).first()
 
+def get_website_owner_id(db: Session, website_id: int) -> int | None:
+    """
+    Returns the owner's user_id for a website, or None if the website doesn't exist.
+    Only one column is read, which makes this the cheapest possible ownership check.
+    """
+    return db.query(models.Website.user_id).filter(models.Website.id == website_id).scalar()
+
 def create_connection_for_website(db: Session, connection: schemas.ConnectionCreate, website_id: int) -> models.Connection:
     """
     Creates a new Connection record and links it to a specific website.
@@ -149,50 +174,225 @@ def create_or_get_waitlist_entry(db: Session, data: schemas.WaitlistCreate, ip_a
 # EVENT LOG CRUD OPERATIONS
 # =============================================================================
 
-def get_recent_event_summary(db: Session, website_id: int, time_window_hours: int = 72) -> list:
+def build_event_log_rows(website_id: int, events: list[schemas.EventIngest], ip_address: str | None, user_agent: str | None) -> list[dict]:
     """
-    Queries the event_logs table for the most recent timestamp of each event type
-    within a given time window for a specific website.
-    Also fetches associated data like fbp presence for simple EMQ calculation later.
+    Turns a validated batch of events into plain row dictionaries for `event_logs`.
+    The request's IP and user agent are used when the snippet didn't send its own.
+    Building rows is cheap and needs no database, so it can happen inside the request
+    while the actual write happens later.
     """
+    received_at = datetime.now(timezone.utc)
 
-    # Calculate the cutoff time
-    cutoff_time = datetime.now(timezone.utc) - timedelta(hours=time_window_hours)
+    return [
+        {
+            "website_id": website_id,
+            "received_at": received_at, # One timestamp for the whole batch
+            "event_id": event.event_id,
+            "event_name": event.event_name,
+            # Clients send local offsets (e.g. "+02:00"), but our columns store no timezone:
+            # convert to UTC like received_at, or the offset would simply be dropped.
+            "event_time": as_utc(event.event_time).astimezone(timezone.utc),
+            "event_source_url": event.event_source_url,
+            "user_ip_address": event.user_ip_address or (ip_address or "")[:64] or None, # Truncate to fit the column
+            "user_agent": event.user_agent or (user_agent or "")[:512] or None,
+            "fbp": event.fbp,
+            "fbc": event.fbc,
+            "email": event.email,
+            "phone": event.phone,
+            "value": event.value,
+            "currency": event.currency,
+        } for event in events
+    ]
 
-    # Subquery to find the latest ID for each event_name within the window
-    # We use ID because MAX(received_at) can be slow wihtout a good index strategy later
-    latest_event_ids = db.query(
-        models.EventLog.event_name,
-        func.max(models.EventLog.id).label("max_id")
-    ).filter(
-        models.EventLog.website_id == website_id,
-        models.EventLog.received_at >= cutoff_time
-    ).group_by(
-        models.EventLog.event_name
-    ).subquery()
+def bulk_insert_event_logs(db: Session, rows: list[dict]) -> int:
+    """
+    Writes many event rows with ONE multi-row INSERT instead of one ORM `db.add()`
+    per event. Passing a list of dicts to `insert()` lets SQLAlchemy use
+    executemany/"insertmanyvalues", so the database sees a single round trip.
+    Keys that aren't columns (like the ingest endpoint's `is_duplicate`) are ignored.
+    Returns the number of rows written. The caller handles the commit.
+    """
+    if not rows:
+        return 0
 
-    # Main query to get the full log entry for those specific latest IDs
-    main_results = db.query(
-        models.EventLog.event_name,
-        models.EventLog.received_at,
-        models.EventLog.fbp, # Include fbp to help calculate mock EMQ
-        # Add other fields here if needed for EMQ calc later (e.g., email presence)
-    ).join(
-        latest_event_ids,
-        models.EventLog.id == latest_event_ids.c.max_id
-    ).all()
+    db.execute(insert(models.EventLog), rows)
+    return len(rows)
 
-    # Convery SQLAlchemy Row objects to simple dictionaries for easier handling in the endpoint
-    summary = [
-        {
-            "event_name": row.event_name,
-            "latest_received": row.received_at,
-            "fbp_present": bool(row.fbp) # Example field for EMQ calc
-        } for row in main_results
-    ]
+# =============================================================================
+# STREAMING QUERIES
+# =============================================================================
+
+# How many rows `stream_query` fetches per round trip.
+STREAM_BATCH_SIZE = 5000
+
+def stream_query(db: Session | Connection, query, batch_size: int = STREAM_BATCH_SIZE) -> Iterator[list]:
+    """
+    The streaming alternative to `.all()`: runs `query` and yields its rows in lists
+    of `batch_size`. `yield_per` also turns on `stream_results`, so PostgreSQL reads
+    through a server-side cursor and only one batch is ever held in memory.
+    Use it for every scan over event_logs (exports, recomputations, backfills).
+    The session or connection must stay open until the iteration is done.
+    """
+    result = db.execute(query.execution_options(yield_per=batch_size))
+    try:
+        yield from result.partitions()
+    finally:
+        result.close()
+
+# =============================================================================
+# EVENT HEALTH ROLLUP OPERATIONS
+# =============================================================================
+
+# Which event_logs column feeds each identifier-coverage counter in the rollup.
+IDENTIFIER_COUNTERS = {
+    "email_count": "email",
+    "phone_count": "phone",
+    "ip_count": "user_ip_address",
+    "user_agent_count": "user_agent",
+    "fbp_count": "fbp",
+    "fbc_count": "fbc",
+}
+
+def as_utc(value: datetime) -> datetime:
+    """
+    Our DateTime columns don't store a timezone, so values come back "naive".
+    Everything we write is UTC, so we simply label it as such.
+    """
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def aggregate_event_health(rows: list[dict]) -> list[dict]:
+    """
+    Collapses a batch of event rows into one rollup delta per (website, event_name):
+    how many events arrived, when, and how many carried each identifier.
+    """
+    rollups: dict[tuple[int, str], dict] = {}
+    for row in rows:
+        key = (row["website_id"], row["event_name"])
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollup = rollups[key] = {
+                "website_id": row["website_id"],
+                "event_name": row["event_name"],
+                "first_received": row["received_at"],
+                "last_received": row["received_at"],
+                "event_count": 0,
+                **{counter: 0 for counter in IDENTIFIER_COUNTERS},
+            }
+
+        rollup["event_count"] += 1
+        rollup["first_received"] = min(rollup["first_received"], row["received_at"])
+        rollup["last_received"] = max(rollup["last_received"], row["received_at"])
+        for counter, column in IDENTIFIER_COUNTERS.items():
+            if row.get(column):
+                rollup[counter] += 1
+
+    return list(rollups.values())
+
+def upsert_dialect_insert(dialect_name: str, table):
+    """
+    Returns an INSERT that supports `ON CONFLICT DO UPDATE` for our database.
+    PostgreSQL and SQLite both speak it, they just live in different modules.
+    """
+    if dialect_name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+def build_event_health_rollup_upsert(dialect_name: str, rollups: list[dict]):
+    """
+    Builds ONE multi-row upsert that adds the batch's deltas onto the existing
+    rollup rows (or creates them for event types we haven't seen yet).
+    """
+    table = models.EventHealthRollup
+    stmt = upsert_dialect_insert(dialect_name, table).values(rollups)
+    excluded = stmt.excluded
+
+    return stmt.on_conflict_do_update(
+        index_elements=[table.website_id, table.event_name],
+        set_={
+            # Keep the earliest first_received and the latest last_received.
+            "first_received": case((excluded.first_received < table.first_received, excluded.first_received), else_=table.first_received),
+            "last_received": case((excluded.last_received > table.last_received, excluded.last_received), else_=table.last_received),
+            "event_count": table.event_count + excluded.event_count,
+            **{counter: getattr(table, counter) + getattr(excluded, counter) for counter in IDENTIFIER_COUNTERS},
+        },
+    )
 
+def upsert_event_health_rollup(db: Session, rows: list[dict]) -> None:
+    """
+    Folds a batch of freshly written event rows into `event_health_rollup`.
+    Runs in the same transaction as the event insert, so the two never drift apart.
+    The caller handles the commit.
+    """
+    rollups = aggregate_event_health(rows)
+    if not rollups:
+        return
+    db.execute(build_event_health_rollup_upsert(db.get_bind().dialect.name, rollups))
+
+def summarize_rollup(rollup: models.EventHealthRollup) -> dict:
+    """Turns a rollup row into the plain dictionary the endpoints work with."""
+    return {
+        "event_name": rollup.event_name,
+        "last_received": as_utc(rollup.last_received),
+        "event_count": rollup.event_count,
+        **{counter: getattr(rollup, counter) for counter in IDENTIFIER_COUNTERS},
+    }
+
+# The rollup's counters cover all time, but a site that fixes (or breaks) its
+# identifiers today should see its EMQ move today. So the counts in a summary
+# come from the event volume buckets of the same window instead: whole hours
+# from the hourly table, and the part of the window's first hour that it covers
+# from the minute table. That is at most 59 minute rows plus one row per hour
+# per event type, summed by the database, however many events there were.
+def window_counts_query(website_id: int, since: datetime):
+    """Events and identifier counters per event type, from the minute containing `since` on."""
+    first_minute = since.astimezone(timezone.utc).replace(tzinfo=None, second=0, microsecond=0)
+    first_hour = first_minute.replace(minute=0)
+    if first_hour < first_minute:
+        first_hour += timedelta(hours=1) # The first whole hour in the window
+
+    def buckets(table, *conditions):
+        return select(
+            table.event_name, table.event_count, *(getattr(table, counter) for counter in IDENTIFIER_COUNTERS),
+        ).where(table.website_id == website_id, *conditions)
+
+    minutes, hours = models.EventVolumeMinute, models.EventVolumeHour
+    window = union_all(
+        buckets(minutes, minutes.bucket_start >= first_minute, minutes.bucket_start < first_hour),
+        buckets(hours, hours.bucket_start >= first_hour),
+    ).subquery()
+    return select(
+        window.c.event_name,
+        func.sum(window.c.event_count).label("event_count"),
+        *(func.sum(window.c[counter]).label(counter) for counter in IDENTIFIER_COUNTERS),
+    ).group_by(window.c.event_name)
+
+def with_window_counts(summary: list[dict], window_counts) -> list[dict]:
+    """Replaces each summary's all-time counters with the window's (rows of `window_counts_query`)."""
+    counts = {row.event_name: row._mapping for row in window_counts}
+    for item in summary:
+        window = counts.get(item["event_name"], {})
+        for counter in ("event_count", *IDENTIFIER_COUNTERS):
+            item[counter] = window.get(counter) or 0
     return summary
 
+def get_recent_event_summary(db: Session, website_id: int, time_window_hours: int = 72) -> list:
+    """
+    Returns the most recent timestamp of each event type seen within a given time
+    window for a specific website, plus how many of its events arrived in that
+    window and how many of them carried each identifier.
+    Reads the precomputed `event_health_rollup` (one row per event type) and the
+    hourly volume buckets instead of grouping over the raw event_logs table.
+    """
+    cutoff_time = datetime.now(timezone.utc) - timedelta(hours=time_window_hours)
+
+    rollups = db.query(models.EventHealthRollup).filter(
+        models.EventHealthRollup.website_id == website_id,
+        models.EventHealthRollup.last_received >= cutoff_time
+    ).all()
+
+    window_counts = db.execute(window_counts_query(website_id, cutoff_time))
+    return with_window_counts([summarize_rollup(rollup) for rollup in rollups], window_counts)
+
 # NEW: Function to find potential duplicate events based on event_id
 def get_potential_duplicate_events(db: Session, website_id: int, time_window_minutes: int = 60) -> list:
     """
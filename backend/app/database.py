@@ -1,18 +1,104 @@
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 # --- Database Setup ---
 # We'll get the database URL from environment variables for flexibility.
 # It defaults to a local SQLite database for easy development, just like in xecution.ai.
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./clarity_pixel.db")
 
+# --- Connection Pool Settings ---
+# Every knob can be tuned per deployment through environment variables.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5")) # Connections kept open permanently
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10")) # Extra connections allowed during bursts
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800")) # Reconnect after this age (-1 = never)
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30")) # Max wait for a free connection
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes") # Test connections before use
+
+class PoolWaitStats:
+    """Tracks how long requests wait to get a connection out of a pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record(self, wait_seconds: float, timed_out: bool) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            waits = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "total_wait_seconds": self.total_wait_seconds,
+                "avg_wait_seconds": self.total_wait_seconds / waits if waits else 0.0,
+                "max_wait_seconds": self.max_wait_seconds,
+            }
+
+class _MeteredPoolMixin:
+    """
+    Times every checkout from the pool. `_do_get` is where a QueuePool blocks
+    when all connections are busy, so this is exactly the "stalled waiting
+    for a connection" time we want to see.
+    """
+    wait_stats: PoolWaitStats
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            self.wait_stats.record(time.perf_counter() - start, timed_out)
+
+class MeteredQueuePool(_MeteredPoolMixin, QueuePool):
+    wait_stats = PoolWaitStats()
+
+class MeteredAsyncQueuePool(_MeteredPoolMixin, AsyncAdaptedQueuePool):
+    wait_stats = PoolWaitStats()
+
+def _pool_options(url: str, poolclass: type) -> dict:
+    """
+    Builds the pool arguments for `create_engine`. In-memory SQLite can't use a
+    queue pool (each connection would be a separate empty database), so it keeps
+    SQLAlchemy's default pool.
+    """
+    if make_url(url).database in (None, "", ":memory:") and "sqlite" in url:
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE_SECONDS,
+        "pool_timeout": DB_POOL_TIMEOUT_SECONDS,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
 # The 'engine' is the core interface to the database.
 # For SQLite, we need to add a special argument `check_same_thread`.
 # This isn't needed for PostgreSQL but doesn't hurt.
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False} if "sqlite" in SQLALCHEMY_DATABASE_URL else {}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False} if "sqlite" in SQLALCHEMY_DATABASE_URL else {},
+    **_pool_options(SQLALCHEMY_DATABASE_URL, MeteredQueuePool)
 )
 
 # The SessionLocal class is our "session factory." When we call it, it creates a new database session.
@@ -25,4 +111,57 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# --- Async Database Setup ---
+# `async def` endpoints must not block the event loop, so they get their own engine
+# that talks to the same database through an asyncio driver:
+# psycopg's async mode for PostgreSQL and aiosqlite for local SQLite.
+def to_async_database_url(url: str) -> str:
+    """Swaps the driver in a sync database URL for its asyncio counterpart."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    if backend in ("postgresql", "postgres"):
+        return parsed.set(drivername="postgresql+psycopg").render_as_string(hide_password=False)
+    return url
+
+# ASYNC_DATABASE_URL can be set explicitly; otherwise we derive it from DATABASE_URL.
+ASYNC_SQLALCHEMY_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_database_url(SQLALCHEMY_DATABASE_URL)
+
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL,
+    **_pool_options(ASYNC_SQLALCHEMY_DATABASE_URL, MeteredAsyncQueuePool)
+)
+
+# `expire_on_commit=False` keeps objects readable after commit. In async code an
+# expired attribute would need a hidden lazy load, which isn't allowed.
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+# The async twin of `get_db` for `async def` endpoints.
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# --- Pool Metrics ---
+def get_pool_stats() -> dict:
+    """
+    Live statistics for both connection pools: how many connections are open,
+    checked out or in overflow right now, and how long checkouts have waited.
+    """
+    stats = {}
+    for name, pool in (("sync", engine.pool), ("async", async_engine.pool)):
+        pool_stats = {"pool_class": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            pool_stats.update({
+                "pool_size": pool.size(),
+                "max_overflow": DB_MAX_OVERFLOW,
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": max(pool.overflow(), 0), # Negative while the base pool isn't full yet
+            })
+        if isinstance(pool, _MeteredPoolMixin):
+            pool_stats["wait"] = pool.wait_stats.snapshot()
+        stats[name] = pool_stats
+    return stats
@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+from collections import deque
+
+# --- Configuration ---
+# An event_id seen twice within this window counts as a duplicate.
+DEDUP_WINDOW_SECONDS = int(os.getenv("DEDUP_WINDOW_SECONDS", "3600"))
+# The window is split into buckets of this size; a whole bucket expires at once.
+DEDUP_BUCKET_SECONDS = int(os.getenv("DEDUP_BUCKET_SECONDS", "60"))
+# Memory bound: the most event_ids we remember per website (oldest buckets go first).
+DEDUP_MAX_IDS_PER_WEBSITE = int(os.getenv("DEDUP_MAX_IDS_PER_WEBSITE", "100000"))
+# "flag" stores duplicates and only counts them; "drop" discards them at ingest.
+DEDUP_MODE = os.getenv("DEDUP_MODE", "flag")
+
+def _current_bucket(store: deque, bucket: int, factory):
+    """Returns the contents of the newest bucket in `store`, creating it if needed."""
+    if not store or store[-1][0] != bucket:
+        store.append((bucket, factory()))
+    return store[-1][1]
+
+class _WebsiteWindow:
+    """The sliding window of recently seen event_ids for one website."""
+
+    def __init__(self):
+        # event_id -> the bucket it was last seen in. This is the O(1) lookup.
+        self.last_seen: dict[str, int] = {}
+        # (bucket, event_ids seen in it), oldest first. Used to expire ids in bulk.
+        self.buckets: deque[tuple[int, set[str]]] = deque()
+        # (bucket, {duplicate event_id: times repeated}), oldest first.
+        self.duplicates: deque[tuple[int, dict[str, int]]] = deque()
+
+    def expire(self, oldest_bucket: int, max_ids: int) -> None:
+        """Forgets buckets older than the window, and more if we're over the memory bound."""
+        while self.buckets and (self.buckets[0][0] < oldest_bucket or len(self.last_seen) > max_ids):
+            bucket, event_ids = self.buckets.popleft()
+            for event_id in event_ids:
+                # Only forget ids that weren't seen again in a newer bucket.
+                if self.last_seen.get(event_id) == bucket:
+                    del self.last_seen[event_id]
+        while self.duplicates and self.duplicates[0][0] < oldest_bucket:
+            self.duplicates.popleft()
+
+    def is_empty(self) -> bool:
+        return not self.buckets and not self.duplicates
+
+class SlidingWindowDedup:
+    """
+    Flags duplicate events as they are ingested, instead of finding them later
+    with a GROUP BY/HAVING over event_logs.
+
+    For every website we keep the event_ids seen in the last window, grouped in
+    time buckets. Checking an id is a dict lookup, and expiring old ids is done a
+    bucket at a time. We also count the duplicates we flag, so the alerts endpoint
+    can read them directly. Once a bucket, every website's window is expired and
+    websites with nothing left in theirs are forgotten, so websites that stopped
+    sending don't stay in memory.
+
+    Everything lives in this process: each worker only knows the events it
+    ingested itself, and a restart starts from an empty window.
+    """
+
+    def __init__(self, window_seconds: int, bucket_seconds: int, max_ids_per_website: int):
+        self.bucket_seconds = bucket_seconds
+        self.window_buckets = max(1, window_seconds // bucket_seconds)
+        self.max_ids_per_website = max_ids_per_website
+        self._websites: dict[int, _WebsiteWindow] = {}
+        self._swept_bucket: int | None = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """How many websites currently have a window."""
+        return len(self._websites)
+
+    def _bucket(self, now: float | None) -> int:
+        return int((now if now is not None else time.time()) // self.bucket_seconds)
+
+    def _sweep(self, bucket: int) -> None:
+        """Once per bucket: expires every website's window and drops the ones left empty."""
+        if bucket == self._swept_bucket:
+            return
+        self._swept_bucket = bucket
+        oldest_bucket = bucket - self.window_buckets + 1
+        for website_id, window in list(self._websites.items()):
+            window.expire(oldest_bucket, self.max_ids_per_website)
+            if window.is_empty():
+                del self._websites[website_id]
+
+    def _existing_window(self, website_id: int, bucket: int) -> _WebsiteWindow | None:
+        """The website's window, expired up to `bucket` (None if nothing is left in it)."""
+        self._sweep(bucket)
+        window = self._websites.get(website_id)
+        if window is None:
+            return None
+        window.expire(bucket - self.window_buckets + 1, self.max_ids_per_website)
+        if window.is_empty():
+            del self._websites[website_id]
+            return None
+        return window
+
+    def _window(self, website_id: int, bucket: int) -> _WebsiteWindow:
+        window = self._existing_window(website_id, bucket)
+        if window is None:
+            window = self._websites[website_id] = _WebsiteWindow()
+        return window
+
+    def find_duplicates(self, website_id: int, event_ids: list[str | None], now: float | None = None) -> list[bool]:
+        """
+        Returns, for each event_id, whether it is a duplicate: seen within the window,
+        or repeated earlier in this same batch. Events without an id are never duplicates.
+        Nothing is recorded; call `record` once the batch has been accepted.
+        """
+        with self._lock:
+            window = self._existing_window(website_id, self._bucket(now)) # A rejected batch leaves nothing behind
+            last_seen = window.last_seen if window is not None else {}
+            seen_in_batch: set[str] = set()
+            flags = []
+            for event_id in event_ids:
+                flags.append(bool(event_id) and (event_id in last_seen or event_id in seen_in_batch))
+                if event_id:
+                    seen_in_batch.add(event_id)
+            return flags
+
+    def record(self, website_id: int, event_ids: list[str | None], duplicates: list[bool], now: float | None = None) -> None:
+        """Remembers an accepted batch of event_ids and counts its duplicates."""
+        with self._lock:
+            bucket = self._bucket(now)
+            window = self._window(website_id, bucket)
+            bucket_ids = _current_bucket(window.buckets, bucket, set)
+            bucket_duplicates = _current_bucket(window.duplicates, bucket, dict)
+            for event_id, is_duplicate in zip(event_ids, duplicates):
+                if not event_id:
+                    continue
+                window.last_seen[event_id] = bucket
+                bucket_ids.add(event_id)
+                if is_duplicate:
+                    bucket_duplicates[event_id] = bucket_duplicates.get(event_id, 0) + 1
+
+    def duplicate_event_ids(self, website_id: int, now: float | None = None) -> list[str]:
+        """The distinct event_ids flagged as duplicates within the window, most recent first."""
+        with self._lock:
+            window = self._existing_window(website_id, self._bucket(now))
+            if window is None:
+                return []
+
+            duplicate_ids: dict[str, None] = {} # An ordered set
+            for _, bucket_duplicates in reversed(window.duplicates):
+                duplicate_ids.update(dict.fromkeys(bucket_duplicates))
+            return list(duplicate_ids)
+
+    def duplicate_count(self, website_id: int, now: float | None = None) -> int:
+        """How many duplicate events were flagged for a website within the window."""
+        with self._lock:
+            window = self._existing_window(website_id, self._bucket(now))
+            if window is None:
+                return 0
+            return sum(sum(bucket_duplicates.values()) for _, bucket_duplicates in window.duplicates)
+
+# The single dedup index shared by the whole app.
+dedup_index = SlidingWindowDedup(
+    window_seconds=DEDUP_WINDOW_SECONDS,
+    bucket_seconds=DEDUP_BUCKET_SECONDS,
+    max_ids_per_website=DEDUP_MAX_IDS_PER_WEBSITE,
+)
@@ -0,0 +1,63 @@
+import os
+
+# Event Match Quality: how well Meta can match an event type's events to its users,
+# on Meta's 0-10 scale. We estimate it from identifier-coverage counters (how many
+# of the events carried each customer identifier) over the health or alert window:
+# the ingest flush keeps them per minute and hourly bucket (see crud.window_counts_query),
+# so scoring an event type sums a bounded number of rows and does a handful of
+# divisions, however many events it has.
+
+# How much each identifier adds to the score when every event carries it. They add
+# up to 10. Order follows Meta's guidance on match keys: email and phone identify
+# a person outright, the click id ties the event to an ad, the browser cookie and
+# the IP/user agent pair only narrow things down.
+# Keyed by the summary's counters (see crud.IDENTIFIER_COUNTERS).
+EMQ_WEIGHTS = {
+    "email_count": 3.0,
+    "phone_count": 2.0,
+    "fbc_count": 1.5,
+    "fbp_count": 1.5,
+    "ip_count": 1.0,
+    "user_agent_count": 1.0,
+}
+
+# What the alerts call each identifier.
+IDENTIFIER_LABELS = {
+    "email_count": "email",
+    "phone_count": "phone",
+    "fbc_count": "click ID (fbc)",
+    "fbp_count": "browser ID (fbp)",
+    "ip_count": "IP address",
+    "user_agent_count": "user agent",
+}
+
+# Scores below this are worth an alert (Meta rates 6 and up as "good").
+EMQ_LOW_SCORE = float(os.getenv("EMQ_LOW_SCORE", "6.0"))
+
+def identifier_coverage(summary: dict) -> dict[str, float]:
+    """The share (0-1) of an event type's events that carried each identifier ("email", "fbp", ...)."""
+    total = summary.get("event_count") or 0
+    return {
+        counter.removesuffix("_count"): round(summary.get(counter, 0) / total, 3) if total else 0.0
+        for counter in EMQ_WEIGHTS
+    }
+
+def emq_score(summary: dict) -> float:
+    """The estimated EMQ (0-10, one decimal) of an event type, from its summary."""
+    total = summary.get("event_count") or 0
+    if not total:
+        return 0.0
+    score = sum(weight * min(summary.get(counter, 0), total) / total for counter, weight in EMQ_WEIGHTS.items())
+    return round(score, 1)
+
+def weakest_identifiers(summary: dict, limit: int = 2) -> list[str]:
+    """The identifiers whose gaps cost the most points, worst first (for alert messages)."""
+    total = summary.get("event_count") or 0
+    if not total:
+        return []
+    lost = {
+        counter: weight * (1 - min(summary.get(counter, 0), total) / total)
+        for counter, weight in EMQ_WEIGHTS.items()
+    }
+    worst = sorted((counter for counter in lost if lost[counter] > 0), key=lambda counter: -lost[counter])
+    return [IDENTIFIER_LABELS[counter] for counter in worst[:limit]]
@@ -0,0 +1,90 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+class ExecutorBusy(RuntimeError):
+    """Raised when a BoundedExecutor already has as much work waiting as it accepts."""
+
+class BoundedExecutor:
+    """
+    A dedicated thread pool for CPU-heavy calls from async code.
+
+    At most `max_workers` calls run at once. Work beyond that waits in a queue of
+    at most `max_queue` calls; anything more is refused with ExecutorBusy, so a
+    burst turns into quick errors instead of a pile of requests waiting forever.
+    Counters show how deep the queue is and how long calls wait in it.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+
+        self.queued = 0 # Submitted, waiting for a free thread
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_queued = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    async def run(self, func: Callable[..., T], *args) -> T:
+        """Runs `func(*args)` on the pool and waits for the result without blocking the event loop."""
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise ExecutorBusy(f"{self.name}: {self.queued} calls already waiting")
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+
+        future = self._executor.submit(self._call, func, args, time.perf_counter())
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # The client went away. If the call never started, it leaves the queue here.
+            if future.cancelled():
+                with self._lock:
+                    self.queued -= 1
+            raise
+
+    def _call(self, func: Callable[..., T], args: tuple, enqueued_at: float) -> T:
+        started_at = time.perf_counter()
+        wait_seconds = started_at - enqueued_at
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.total_wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.total_run_seconds += time.perf_counter() - started_at
+
+    def stats(self) -> dict:
+        with self._lock:
+            started = self.completed + self.running
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "max_queued": self.max_queued,
+                "avg_wait_ms": round(self.total_wait_seconds / started * 1000, 3) if started else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 3),
+                "avg_run_ms": round(self.total_run_seconds / self.completed * 1000, 3) if self.completed else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
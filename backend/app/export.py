@@ -0,0 +1,281 @@
+import os
+import io
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Iterator
+
+from sqlalchemy import and_, column, or_, select, table
+from sqlalchemy.engine import Connection, Engine
+
+from . import crud, database, identifiers, models
+
+# pyarrow is a big dependency that only the Parquet/Arrow formats need, so the API
+# still starts without it; those formats then report that they're unavailable.
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+EVENT_EXPORT_BATCH_SIZE = int(os.getenv("EVENT_EXPORT_BATCH_SIZE", "10000")) # Rows per fetch, and per Parquet row group
+EVENT_STREAM_BATCH_SIZE = int(os.getenv("EVENT_STREAM_BATCH_SIZE", "1000")) # Rows per NDJSON chunk: smaller, so the first bytes go out sooner
+EVENT_EXPORT_MAX_DAYS = int(os.getenv("EVENT_EXPORT_MAX_DAYS", "31")) # Longest time range one export request may cover
+EVENT_ARCHIVE_DIR = os.getenv("EVENT_ARCHIVE_DIR", "./event_archive") # Where retention writes archived partitions
+
+EXPORT_FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "ndjson": ("application/x-ndjson", "ndjson"), # One JSON object per line; needs no pyarrow
+}
+
+# The event_logs columns we read. Raw email and phone never leave the database:
+# the files carry their SHA-256 hashes instead (the same ones we send to Meta),
+# which is all offline attribution needs to match customers.
+SOURCE_COLUMNS = [
+    "id", "website_id", "received_at", "event_id", "event_name", "event_time",
+    "event_source_url", "user_ip_address", "user_agent", "fbp", "fbc",
+    "email", "phone", "value", "currency",
+]
+
+def format_available(export_format: str) -> bool:
+    return export_format == "ndjson" or pa is not None
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed; event export and archiving are unavailable")
+
+def arrow_schema() -> "pa.Schema":
+    """
+    The columns of an export file. Low-cardinality strings (event names, currencies,
+    browsers) are dictionary-encoded, so each distinct value is stored once per row group.
+    """
+    _require_pyarrow()
+    timestamp = pa.timestamp("us", tz="UTC")
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("id", pa.int64()),
+        ("website_id", pa.int32()),
+        ("received_at", timestamp),
+        ("event_id", pa.string()),
+        ("event_name", dictionary),
+        ("event_time", timestamp),
+        ("event_source_url", pa.string()),
+        ("user_ip_address", pa.string()),
+        ("user_agent", dictionary),
+        ("fbp", pa.string()),
+        ("fbc", pa.string()),
+        ("email_sha256", pa.string()),
+        ("phone_sha256", pa.string()),
+        ("value", pa.float64()),
+        ("currency", dictionary),
+    ])
+
+def to_naive_utc(value: datetime) -> datetime:
+    """Our timestamp columns hold naive UTC, so query bounds must be naive UTC too."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def _utc(value: datetime | None) -> datetime | None:
+    return value.replace(tzinfo=timezone.utc) if value is not None and value.tzinfo is None else value
+
+# =============================================================================
+# READING
+# =============================================================================
+
+def event_log_query(website_id: int, start: datetime, end: datetime, after_event_id: int | None = None, limit: int | None = None):
+    """
+    One website's events received in [start, end), oldest first.
+    Ordered by (received_at, id), which the (website_id, received_at) index already
+    delivers, so the first rows come back without sorting the whole range.
+    `after_event_id` and `limit` let a client read a long range in resumable pieces.
+    """
+    event_logs = models.EventLog.__table__
+    query = select(*(event_logs.c[name] for name in SOURCE_COLUMNS)).where(
+        event_logs.c.website_id == website_id,
+        event_logs.c.received_at >= to_naive_utc(start),
+        event_logs.c.received_at < to_naive_utc(end),
+    )
+    if after_event_id is not None:
+        # Keyset continuation: everything after that event in (received_at, id) order.
+        after_received_at = select(event_logs.c.received_at).where(event_logs.c.id == after_event_id).scalar_subquery()
+        query = query.where(or_(
+            event_logs.c.received_at > after_received_at,
+            and_(event_logs.c.received_at == after_received_at, event_logs.c.id > after_event_id),
+        ))
+    query = query.order_by(event_logs.c.received_at, event_logs.c.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+def partition_query(partition_name: str):
+    """Every row of one event_logs partition, read straight from the partition table."""
+    partition = table(partition_name, *(column(name) for name in SOURCE_COLUMNS))
+    return select(*partition.c).order_by(partition.c.id)
+
+def prepare_columns(rows: list) -> dict[str, list]:
+    """
+    Turns a list of event_logs rows into output columns: timestamps labelled UTC,
+    and email/phone swapped for their hashes. Every output format starts from this.
+    """
+    hashed = identifiers.hash_identifier_batch(rows)
+    columns = {name: list(values) for name, values in zip(SOURCE_COLUMNS, zip(*rows))} if rows else {name: [] for name in SOURCE_COLUMNS}
+    columns["received_at"] = [_utc(value) for value in columns["received_at"]]
+    columns["event_time"] = [_utc(value) for value in columns["event_time"]]
+    columns["email_sha256"] = [hashes.get("em") for hashes in hashed]
+    columns["phone_sha256"] = [hashes.get("ph") for hashes in hashed]
+    del columns["email"], columns["phone"]
+    return columns
+
+def rows_to_record_batch(rows: list) -> "pa.RecordBatch":
+    """Turns a list of event_logs rows into one Arrow record batch."""
+    schema = arrow_schema()
+    columns = prepare_columns(rows)
+    return pa.RecordBatch.from_arrays(
+        [pa.array(columns[field.name], type=field.type) for field in schema],
+        schema=schema,
+    )
+
+# =============================================================================
+# WRITING
+# =============================================================================
+
+class _ChunkSink(io.RawIOBase):
+    """A write-only file that hands its bytes back out, so a file format can be streamed."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def write_ndjson(batches: Iterator[list]) -> Iterator[bytes]:
+    """Encodes batches of rows as newline-delimited JSON, one chunk per batch."""
+    for rows in batches:
+        columns = prepare_columns(rows)
+        names = list(columns)
+        lines = [json.dumps(dict(zip(names, values)), default=_json_default) for values in zip(*columns.values())]
+        if lines:
+            yield ("\n".join(lines) + "\n").encode()
+
+def _open_writer(sink, export_format: str):
+    schema = arrow_schema()
+    if export_format == "parquet":
+        return pq.ParquetWriter(sink, schema, compression="zstd")
+    return pa.ipc.new_stream(sink, schema)
+
+def write_batches(batches: Iterator[list], export_format: str = "parquet") -> Iterator[bytes]:
+    """
+    Encodes batches of rows as a Parquet file (one row group per batch), an
+    Arrow IPC stream or NDJSON, yielding the bytes as soon as each batch is written.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format!r}")
+    if export_format == "ndjson":
+        yield from write_ndjson(batches)
+        return
+    _require_pyarrow()
+
+    sink = _ChunkSink()
+    writer = _open_writer(sink, export_format)
+    try:
+        for rows in batches:
+            writer.write_batch(rows_to_record_batch(rows))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close() # Writes the Parquet footer / the end-of-stream marker
+    yield sink.drain()
+
+def stream_website_events(
+    website_id: int,
+    start: datetime,
+    end: datetime,
+    export_format: str = "parquet",
+    after_event_id: int | None = None,
+    limit: int | None = None,
+    engine: Engine = database.engine,
+) -> Iterator[bytes]:
+    """
+    The body of the export and listing endpoints: one website's events for a time range,
+    encoded on the fly. Uses its own connection, because the response is still
+    streaming after the request's session is gone.
+    """
+    query = event_log_query(website_id, start, end, after_event_id, limit)
+    batch_size = EVENT_STREAM_BATCH_SIZE if export_format == "ndjson" else EVENT_EXPORT_BATCH_SIZE
+    with engine.connect() as conn:
+        yield from write_batches(crud.stream_query(conn, query, batch_size), export_format)
+
+def export_to_file(conn: Connection, query, path: str, export_format: str = "parquet") -> int:
+    """
+    Writes the rows of `query` to `path` and returns how many there were. The file
+    is written under a temporary name and renamed, so a crash never leaves half a file.
+    """
+    if export_format != "ndjson":
+        _require_pyarrow()
+    row_count = 0
+
+    def counted(batches):
+        nonlocal row_count
+        for rows in batches:
+            row_count += len(rows)
+            yield rows
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as output:
+        for data in write_batches(counted(crud.stream_query(conn, query, EVENT_EXPORT_BATCH_SIZE)), export_format):
+            output.write(data)
+    os.replace(temporary_path, path)
+    return row_count
+
+def archive_partition(conn: Connection, partition_name: str, archive_dir: str = EVENT_ARCHIVE_DIR) -> str:
+    """
+    Copies a whole event_logs partition to `<archive_dir>/<partition>.parquet`
+    before retention drops it. Returns the file path.
+    """
+    path = os.path.join(archive_dir, f"{partition_name}.parquet")
+    rows = export_to_file(conn, partition_query(partition_name), path)
+    logger.info("Archived %d rows of %s to %s", rows, partition_name, path)
+    return path
+
+if __name__ == "__main__":
+    # One-off exports by hand: `python -m app.export WEBSITE_ID START END OUTPUT` from backend/.
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Export one website's event_logs for a time range.")
+    parser.add_argument("website_id", type=int)
+    parser.add_argument("start", type=datetime.fromisoformat)
+    parser.add_argument("end", type=datetime.fromisoformat)
+    parser.add_argument("output")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="parquet")
+    args = parser.parse_args()
+
+    with database.engine.connect() as conn:
+        print(export_to_file(conn, event_log_query(args.website_id, args.start, args.end), args.output, args.format))
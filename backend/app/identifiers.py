@@ -0,0 +1,108 @@
+import os
+import hashlib
+import re
+from functools import lru_cache
+from typing import Iterable
+
+# --- Configuration ---
+# How many distinct (normalized) identifiers we remember the hash of. Returning
+# customers send the same email/phone again and again, so most lookups hit.
+IDENTIFIER_HASH_CACHE_SIZE = int(os.getenv("IDENTIFIER_HASH_CACHE_SIZE", "100000"))
+# Country calling code for phone numbers written in national format (e.g. "46" for
+# Sweden turns "070-123 45 67" into "46701234567"). Empty means we leave them as is.
+IDENTIFIER_DEFAULT_COUNTRY_CODE = os.getenv("IDENTIFIER_DEFAULT_COUNTRY_CODE", "")
+
+_NON_DIGITS = re.compile(r"\D")
+
+# =============================================================================
+# NORMALIZATION
+# =============================================================================
+# Meta matches hashed customer data against its own hashes, so the text we hash
+# must be normalized exactly the way Meta expects, or nothing will ever match.
+
+def normalize_email(value: str | None) -> str | None:
+    """Trims and lowercases an email. Returns None when there is nothing left."""
+    if not value:
+        return None
+    return value.strip().lower() or None
+
+def normalize_phone(value: str | None, default_country_code: str = IDENTIFIER_DEFAULT_COUNTRY_CODE) -> str | None:
+    """
+    Normalizes a phone number to E.164 digits without the "+" (what Meta hashes):
+    "+1 (555) 010-9999" -> "15550109999". International "00" prefixes are dropped,
+    and national numbers ("0701234567") get `default_country_code` in place of the
+    leading zero when one is configured.
+    """
+    if not value:
+        return None
+    stripped = value.strip()
+    digits = _NON_DIGITS.sub("", stripped)
+    if not digits:
+        return None
+
+    if stripped.startswith("+"):
+        return digits
+    if digits.startswith("00"):
+        return digits[2:] or None
+    if default_country_code and digits.startswith("0"):
+        return default_country_code + digits.lstrip("0")
+    return digits
+
+# =============================================================================
+# HASHING
+# =============================================================================
+
+def _sha256(normalized: str | None) -> str | None:
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest() if normalized else None
+
+# Both caches are keyed on the raw value, so a returning customer skips the
+# normalization as well as the hashing.
+@lru_cache(maxsize=IDENTIFIER_HASH_CACHE_SIZE)
+def hash_email(value: str) -> str | None:
+    return _sha256(normalize_email(value))
+
+@lru_cache(maxsize=IDENTIFIER_HASH_CACHE_SIZE)
+def hash_phone(value: str) -> str | None:
+    return _sha256(normalize_phone(value))
+
+# The customer identifiers Meta wants hashed, and how each one is hashed.
+# IP address, user agent and the fbp/fbc cookies are sent as they are: Meta
+# documents them as "do not hash", and hashed values would simply be ignored.
+HASHED_IDENTIFIERS = {
+    "em": ("email", hash_email),
+    "ph": ("phone", hash_phone),
+}
+
+def hash_identifier_batch(events: Iterable) -> list[dict[str, str]]:
+    """
+    The hashing stage for a whole batch of events (EventLog objects or row dicts).
+    Returns one {"em": hash, "ph": hash} dict per event, with missing identifiers left out.
+
+    Works column by column: each distinct raw value in the batch is normalized
+    and hashed once, and repeat customers across batches come from the LRU caches.
+    """
+    events = list(events)
+    hashed: list[dict[str, str]] = [{} for _ in events]
+    if not events:
+        return hashed
+    read = dict.get if isinstance(events[0], dict) else getattr
+
+    for key, (field, hash_value) in HASHED_IDENTIFIERS.items():
+        column = [read(event, field) for event in events]
+        hashes = {raw: hash_value(raw) for raw in set(column) if raw}
+        for result, raw in zip(hashed, column):
+            hashed_value = hashes.get(raw)
+            if hashed_value:
+                result[key] = hashed_value
+    return hashed
+
+def hash_cache_stats() -> dict:
+    stats = {}
+    for name, cached in (("email", hash_email), ("phone", hash_phone)):
+        info = cached.cache_info()
+        stats[name] = {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+    return stats
+
+def clear_hash_caches() -> None:
+    hash_email.cache_clear()
+    hash_phone.cache_clear()
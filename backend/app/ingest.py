@@ -0,0 +1,166 @@
+import os
+import logging
+import threading
+import time
+from collections import deque
+
+# We import the session factory (the plumbing) and our CRUD recipes.
+from . import attribution, crud, database, monitor, timeseries
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# All thresholds come from environment variables so they can be tuned per deployment.
+# The buffer never holds more than INGEST_BUFFER_MAX_EVENTS rows in memory.
+INGEST_BUFFER_MAX_EVENTS = int(os.getenv("INGEST_BUFFER_MAX_EVENTS", "50000"))
+# A flush happens as soon as this many rows are waiting...
+INGEST_FLUSH_BATCH_SIZE = int(os.getenv("INGEST_FLUSH_BATCH_SIZE", "1000"))
+# ...or when the oldest waiting row is this old, whichever comes first.
+INGEST_FLUSH_INTERVAL_SECONDS = float(os.getenv("INGEST_FLUSH_INTERVAL_SECONDS", "1.0"))
+
+# The tables every flushed batch is folded into, after the raw insert.
+_DERIVED_RECORDERS = (
+    ("event health rollup", crud.upsert_event_health_rollup),
+    ("attribution totals", attribution.record_events),
+    ("event volume time series", timeseries.record_events),
+)
+
+class IngestBuffer:
+    """
+    An in-process "write-behind" queue for pixel events.
+
+    The ingest endpoint only drops rows in here and returns right away. A background
+    worker thread drains the queue into `event_logs` in micro-batches, so database
+    latency never sits on the pixel's critical path.
+    """
+
+    def __init__(self, max_events: int, flush_batch_size: int, flush_interval_seconds: float):
+        self.max_events = max_events
+        self.flush_batch_size = flush_batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+
+        # Each item is (enqueued_at, row). A deque gives us cheap appends and pops at both ends.
+        self._queue: deque[tuple[float, dict]] = deque()
+        self._condition = threading.Condition()
+        self._worker: threading.Thread | None = None
+        self._stopping = False
+
+        # Simple counters so we can see what the buffer is doing.
+        self.flushed_events = 0
+        self.failed_events = 0
+        self.rejected_events = 0
+        self.failed_derived_updates = 0 # Batches whose events were saved but not counted in one derived table
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def submit(self, rows: list[dict]) -> bool:
+        """
+        Adds a batch of rows to the queue. The batch is accepted or rejected as a whole.
+        Returns False when there is not enough room left, so the caller can apply
+        backpressure (e.g. answer 429) instead of letting memory grow without bound.
+        """
+        with self._condition:
+            if len(self._queue) + len(rows) > self.max_events:
+                self.rejected_events += len(rows)
+                return False
+
+            was_empty = not self._queue
+            now = time.monotonic()
+            self._queue.extend((now, row) for row in rows)
+
+            # Wake the worker if a full batch is ready, or if these are the first rows
+            # so it can start counting down the flush interval.
+            if was_empty or len(self._queue) >= self.flush_batch_size:
+                self._condition.notify()
+        return True
+
+    def start(self) -> None:
+        """Starts the background worker thread (called once at app startup)."""
+        if self._worker is not None:
+            return
+        self._stopping = False
+        self._worker = threading.Thread(target=self._run, name="ingest-buffer", daemon=True)
+        self._worker.start()
+
+    def stop(self) -> None:
+        """Stops the worker after it has flushed everything still in the queue."""
+        if self._worker is None:
+            return
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self._worker.join()
+        self._worker = None
+
+    def _take_batch(self) -> list[dict]:
+        """
+        Blocks until a flush is due, then pops up to one batch of rows.
+        A flush is due when a full batch is waiting, when the oldest row is older
+        than the flush interval, or when we are shutting down.
+        """
+        with self._condition:
+            while True:
+                if self._stopping or len(self._queue) >= self.flush_batch_size:
+                    break
+                if self._queue:
+                    oldest_age = time.monotonic() - self._queue[0][0]
+                    remaining = self.flush_interval_seconds - oldest_age
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(timeout=remaining)
+                else:
+                    self._condition.wait()
+
+            batch_size = min(len(self._queue), self.flush_batch_size)
+            return [self._queue.popleft()[1] for _ in range(batch_size)]
+
+    def _run(self) -> None:
+        while True:
+            rows = self._take_batch()
+            if rows:
+                self._flush(rows)
+            elif self._stopping:
+                return
+
+    def _flush(self, rows: list[dict]) -> None:
+        """Writes one micro-batch (events plus the tables derived from them) in a single transaction."""
+        db = database.SessionLocal()
+        try:
+            crud.bulk_insert_event_logs(db, rows)
+            # Keep the health rollup, attribution totals and volume time series in step, in the same transaction.
+            for name, record in _DERIVED_RECORDERS:
+                self._record_derived(db, name, record, rows)
+            db.commit()
+            self.flushed_events += len(rows)
+            # The new rows change these websites' dashboards.
+            monitor.website_data_versions.bump(*{row["website_id"] for row in rows})
+        except Exception:
+            # A failed flush must never kill the worker. We roll back, count the loss and move on.
+            db.rollback()
+            self.failed_events += len(rows)
+            logger.exception("Failed to flush %d buffered events", len(rows))
+        finally:
+            db.close()
+
+    def _record_derived(self, db, name: str, record, rows: list[dict]) -> None:
+        """
+        Runs one derived-table update inside a SAVEPOINT. The raw events are the source
+        of truth (and dedup has already marked them as seen), so a failure here must not
+        take them down with it: we undo just this update, count it and keep going.
+        The attribution and time-series tables can be recounted from event_logs later
+        (`python -m app.attribution` / `python -m app.timeseries`).
+        """
+        try:
+            with db.begin_nested():
+                record(db, rows)
+        except Exception:
+            self.failed_derived_updates += 1
+            logger.exception("Failed to update %s for %d flushed events", name, len(rows))
+
+# The single buffer instance shared by the whole app.
+ingest_buffer = IngestBuffer(
+    max_events=INGEST_BUFFER_MAX_EVENTS,
+    flush_batch_size=INGEST_FLUSH_BATCH_SIZE,
+    flush_interval_seconds=INGEST_FLUSH_INTERVAL_SECONDS,
+)
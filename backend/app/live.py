@@ -0,0 +1,207 @@
+import os
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from typing import AsyncIterator
+
+from . import async_crud, database, monitor, schemas
+from .dedup import dedup_index
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# Updates for one website are computed at most this often, however fast events arrive.
+LIVE_HEALTH_MIN_INTERVAL_SECONDS = float(os.getenv("LIVE_HEALTH_MIN_INTERVAL_SECONDS", "1"))
+# Health also changes with the clock alone (an event type going quiet turns "warning"),
+# so every watched website is recomputed this often even without new events.
+LIVE_HEALTH_REFRESH_SECONDS = float(os.getenv("LIVE_HEALTH_REFRESH_SECONDS", "60"))
+# A comment line is sent this often so proxies don't close an idle stream.
+LIVE_HEALTH_KEEPALIVE_SECONDS = float(os.getenv("LIVE_HEALTH_KEEPALIVE_SECONDS", "15"))
+# Messages a tab may fall behind before we drop it (its EventSource reconnects and resyncs).
+LIVE_HEALTH_SUBSCRIBER_QUEUE_SIZE = int(os.getenv("LIVE_HEALTH_SUBSCRIBER_QUEUE_SIZE", "32"))
+
+def format_sse(event: str, data) -> str:
+    """One Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _alerts_key(alerts: list[schemas.EventAlert]) -> list[tuple]:
+    # The duplicate alert is stamped with the time it was computed; that alone isn't a change.
+    return [(alert.id, alert.severity, alert.title, alert.message) for alert in alerts]
+
+class _Topic:
+    """The subscribers of one website and the last health/alerts we sent them."""
+
+    def __init__(self):
+        self.subscribers: set[asyncio.Queue] = set()
+        self.health: dict[str, schemas.EventHealth] = {}
+        self.alerts: list[schemas.EventAlert] = []
+        self.has_snapshot = False
+        self.dirty = False
+        self.refresh_task: asyncio.Task | None = None
+
+class LiveHealthHub:
+    """
+    In-process fan-out of event health updates over Server-Sent Events.
+
+    However many dashboard tabs watch a website, its health and alerts are
+    computed once per change (one read of the health rollup) and the result is
+    pushed to every tab. Tabs get a full snapshot when they connect, then only
+    the health cards that changed and the alert list when it changes.
+
+    Changes are signalled through `monitor.website_data_versions`, which the
+    ingest endpoint and the ingest buffer bump whenever a website's events change.
+    That only sees this worker's writes. Those of the other workers arrive as the
+    shared cache's invalidations of the website's health results (with
+    CACHE_BACKEND=redis, see shared_cache.py); with the memory backend a tab
+    watching another worker's writes waits for the periodic refresh.
+    """
+
+    def __init__(self):
+        self._topics: dict[int, _Topic] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._ticker: asyncio.Task | None = None
+
+    def stats(self) -> dict:
+        return {
+            "websites": len(self._topics),
+            "subscribers": sum(len(topic.subscribers) for topic in self._topics.values()),
+        }
+
+    async def start(self) -> None:
+        """Starts listening for data changes (called once at app startup)."""
+        if self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        monitor.website_data_versions.add_listener(self._on_data_changed)
+        monitor.health_results.results.add_eviction_listener(self._on_remote_invalidation)
+        self._ticker = asyncio.create_task(self._tick(), name="live-health-ticker")
+
+    async def stop(self) -> None:
+        if self._loop is None:
+            return
+        monitor.website_data_versions.remove_listener(self._on_data_changed)
+        monitor.health_results.results.remove_eviction_listener(self._on_remote_invalidation)
+        self._ticker.cancel()
+        for topic in self._topics.values():
+            if topic.refresh_task:
+                topic.refresh_task.cancel()
+            for queue in topic.subscribers:
+                self._close(queue)
+        self._loop = None
+
+    def _on_data_changed(self, website_ids: tuple) -> None:
+        # Called from whichever thread bumped the version (e.g. the ingest buffer's worker).
+        if self._loop is None:
+            return
+        watched = [website_id for website_id in website_ids if website_id in self._topics]
+        if watched:
+            self._loop.call_soon_threadsafe(self._mark_dirty, watched)
+
+    def _on_remote_invalidation(self, key) -> None:
+        # Called from the cache's subscriber thread; keys are (kind, website_id).
+        if isinstance(key, tuple) and len(key) == 2:
+            self._on_data_changed((key[1],))
+
+    def _mark_dirty(self, website_ids) -> None:
+        for website_id in website_ids:
+            topic = self._topics.get(website_id)
+            if topic is None:
+                continue
+            topic.dirty = True
+            if topic.refresh_task is None or topic.refresh_task.done():
+                topic.refresh_task = asyncio.create_task(self._refresh(website_id, topic))
+
+    async def _tick(self) -> None:
+        while True:
+            await asyncio.sleep(LIVE_HEALTH_REFRESH_SECONDS)
+            self._mark_dirty(list(self._topics))
+
+    async def _refresh(self, website_id: int, topic: _Topic) -> None:
+        """Recomputes one website until no new change came in meanwhile, pacing itself."""
+        while topic.dirty and topic.subscribers:
+            topic.dirty = False
+            try:
+                await self._publish_changes(website_id, topic)
+            except Exception:
+                logger.exception("Live health refresh failed for website %s", website_id)
+            await asyncio.sleep(LIVE_HEALTH_MIN_INTERVAL_SECONDS)
+
+    async def _compute(self, website_id: int) -> tuple[list[schemas.EventHealth], list[schemas.EventAlert]]:
+        now = datetime.now(timezone.utc)
+        async with database.AsyncSessionLocal() as db:
+            summary = await async_crud.get_recent_event_summary(db, website_id, time_window_hours=monitor.HEALTH_WINDOW_HOURS)
+            alert_summary = await async_crud.get_recent_event_summary(db, website_id, time_window_hours=monitor.ALERT_WINDOW_HOURS)
+        health = monitor.compute_event_health(summary, now)
+        alerts = monitor.compute_alerts(alert_summary, dedup_index.duplicate_event_ids(website_id), now)
+        return health, alerts
+
+    async def _publish_changes(self, website_id: int, topic: _Topic) -> None:
+        health, alerts = await self._compute(website_id)
+
+        messages = []
+        changed_health = [item for item in health if topic.health.get(item.event_name) != item]
+        if changed_health:
+            messages.append(format_sse("health", [item.model_dump(mode="json") for item in changed_health]))
+        if _alerts_key(alerts) != _alerts_key(topic.alerts):
+            messages.append(format_sse("alerts", [alert.model_dump(mode="json") for alert in alerts]))
+
+        topic.health = {item.event_name: item for item in health}
+        topic.alerts = alerts
+        topic.has_snapshot = True
+        for message in messages:
+            self._broadcast(topic, message)
+
+    def _broadcast(self, topic: _Topic, message: str) -> None:
+        for queue in list(topic.subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # This tab can't keep up. Dropping it is cheaper than buffering for it;
+                # the browser reconnects and starts again from a fresh snapshot.
+                topic.subscribers.discard(queue)
+                self._close(queue)
+
+    @staticmethod
+    def _close(queue: asyncio.Queue) -> None:
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def stream(self, website_id: int) -> AsyncIterator[str]:
+        """The SSE stream of one dashboard tab: a snapshot, then incremental updates."""
+        topic = self._topics.get(website_id)
+        if topic is None:
+            topic = self._topics[website_id] = _Topic()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=LIVE_HEALTH_SUBSCRIBER_QUEUE_SIZE)
+        topic.subscribers.add(queue)
+
+        try:
+            # The first tab on a website computes the snapshot; later ones reuse it.
+            if not topic.has_snapshot:
+                health, alerts = await self._compute(website_id)
+                topic.health = {item.event_name: item for item in health}
+                topic.alerts = alerts
+                topic.has_snapshot = True
+            yield format_sse("snapshot", {
+                "health": [item.model_dump(mode="json") for item in topic.health.values()],
+                "alerts": [alert.model_dump(mode="json") for alert in topic.alerts],
+            })
+
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=LIVE_HEALTH_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if message is None: # Dropped or shutting down
+                    return
+                yield message
+        finally:
+            topic.subscribers.discard(queue)
+            if not topic.subscribers and self._topics.get(website_id) is topic:
+                # Nobody is watching any more; forget the website.
+                del self._topics[website_id]
+
+# The single hub shared by the whole app.
+live_health = LiveHealthHub()
@@ -1,7 +1,10 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request, Response
+from fastapi import FastAPI, Depends, HTTPException, Query, status, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
 
 # Annotated as a modern way to declare dependencies, List for the response models
@@ -9,17 +12,71 @@ from typing import Annotated, List
 
 # ---- Internal Imports ----
 # We bring in all the pieces we've built so far.
-from . import crud, models, schemas, security, database
+from . import async_crud, attribution, crud, export, metrics, models, monitor, schemas, security, database, partitions, shared_cache, timeseries
+from .capi import CAPI_ENABLED, capi_dispatcher
+from .dedup import DEDUP_MODE, dedup_index
+from .ingest import ingest_buffer
+from .live import live_health
+from .maintenance import MAINTENANCE_ENABLED, maintenance_scheduler
 
 # This command ensures our database tables are created based on our models.
 # It's good practice to have it here, though Alembic is our primary tool for this.
 models.Base.metadata.create_all(bind=database.engine)
 
+# --- Periodic Maintenance Jobs ---
+# Creates upcoming event_logs partitions and enforces the retention window.
+maintenance_scheduler.register("event_log_partitions", partitions.run_partition_maintenance)
+# Drops event volume buckets older than each resolution's retention.
+maintenance_scheduler.register("event_volume_retention", lambda: timeseries.prune_expired_buckets(database.engine))
+
+# --- Request Metrics ---
+# Counts SQL statements, ORM rows and serialization time per request (see metrics.py),
+# plus a few gauges read from the background workers whenever /metrics is scraped.
+metrics.install(models.Base)
+metrics.registry.register(metrics.Gauge(
+    "ingest_buffer_queued_events", "Events waiting in the ingest buffer.",
+    lambda: {(): len(ingest_buffer)}))
+metrics.registry.register(metrics.Gauge(
+    "db_pool_checked_out_connections", "Database connections currently checked out.",
+    lambda: {(name,): pool["checked_out"] for name, pool in database.get_pool_stats().items() if "checked_out" in pool},
+    ("pool",)))
+metrics.registry.register(metrics.Gauge(
+    "password_hash_queued_jobs", "bcrypt jobs waiting for a worker.",
+    lambda: {(): security.password_hash_executor.stats()["queued"]}))
+
+# --- Lifespan ---
+# Starts background workers when the app boots and stops them cleanly on shutdown.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The EMQ windows are summed from the volume buckets, so they must outlive them.
+    timeseries.check_window_retention(max(monitor.HEALTH_WINDOW_HOURS, monitor.ALERT_WINDOW_HOURS))
+    shared_cache.cache_backend.start()
+    ingest_buffer.start()
+    if MAINTENANCE_ENABLED:
+        maintenance_scheduler.start()
+    if CAPI_ENABLED:
+        await capi_dispatcher.start()
+    await live_health.start()
+    try:
+        yield
+    finally:
+        await live_health.stop()
+        await capi_dispatcher.stop()
+        maintenance_scheduler.stop()
+        # Flushes whatever events are still waiting in the buffer before we exit.
+        ingest_buffer.stop()
+        security.password_hash_executor.shutdown()
+        # After the buffer's last flush, so its invalidations still go out.
+        shared_cache.cache_backend.stop()
+        await shared_cache.cache_backend.aclose()
+        await database.async_engine.dispose()
+
 # Create the main FastAPI application instance. This is our "restaurant".
 app = FastAPI(
     title="ClarityTracking API",
     description="The backend service for ClarityTracking, providing CAPI automation and attribution.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # --- CORS Middleware ---
@@ -39,8 +96,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-After-Id"], # Pagination cursor of GET /api/websites
 )
 
+# --- Metrics Middleware ---
+# Added last so it is the outermost layer and times everything, CORS included.
+app.add_middleware(metrics.MetricsMiddleware)
+
 # =============================================================================
 # HEALTH CHECK ENDPOINT
 # =============================================================================
@@ -50,6 +112,49 @@ def health_check():
     """A simple endpoint to confirm the API is running."""
     return {"status": "ok"}
 
+@app.get("/internal/metrics/db-pool", status_code=status.HTTP_200_OK)
+def db_pool_metrics():
+    """
+    Live connection pool statistics (checked out, overflow, wait time).
+    Use this to see whether slow requests are stalled waiting for a connection.
+    """
+    return database.get_pool_stats()
+
+@app.get("/internal/metrics/capi", status_code=status.HTTP_200_OK)
+def capi_metrics():
+    """Conversions API forwarding counters (events sent, skipped, failed batches)."""
+    return capi_dispatcher.stats()
+
+@app.get("/internal/metrics/password-hashing", status_code=status.HTTP_200_OK)
+def password_hashing_metrics():
+    """Queue depth and wait times of the dedicated bcrypt pool."""
+    return security.password_hash_executor.stats()
+
+@app.get("/internal/metrics/health-cache", status_code=status.HTTP_200_OK)
+def health_cache_metrics():
+    """Hit rate and coalesced requests of the shared /health and /alerts results."""
+    return monitor.health_results.stats()
+
+@app.get("/internal/metrics/caches", status_code=status.HTTP_200_OK)
+def cache_metrics():
+    """Per-worker hit rates of the shared caches, and the backend's Redis and invalidation counters."""
+    return {
+        "backend": shared_cache.cache_backend.stats(),
+        "principal": security.principal_cache.stats(),
+        "website_owner": security.website_owner_cache.stats(),
+        "health": monitor.health_results.results.stats(),
+    }
+
+@app.get("/internal/metrics/live-health", status_code=status.HTTP_200_OK)
+def live_health_metrics():
+    """How many websites are being watched live, and by how many dashboard tabs."""
+    return live_health.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def prometheus_metrics():
+    """Request latency, per-request database work and worker gauges, in the Prometheus text format."""
+    return PlainTextResponse(metrics.render_latest(), media_type="text/plain; version=0.0.4")
+
 # =============================================================================
 # WAITLIST ENDPOINT
 # =============================================================================
@@ -82,13 +187,13 @@ def join_waitlist(
 # =============================================================================
 
 @app.post("/api/register", response_model=schemas.UserResponse, status_code=status.HTTP_201_CREATED)
-def register_user(user_data: schemas.UserCreate, db: Session = Depends(database.get_db)):
+async def register_user(user_data: schemas.UserCreate, db: AsyncSession = Depends(database.get_async_db)):
     """
     Endpoint for new user registration.
     This is the "waiter" taking a new customer's order.
     """
     # 1. Check if a user with this email already exists by using our CRUD recipe.
-    db_user = crud.get_user_by_email(db, email=user_data.email)
+    db_user = await async_crud.get_user_by_email(db, email=user_data.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -96,27 +201,32 @@ def register_user(user_data: schemas.UserCreate, db: Session = Depends(database.
         )
     
     # 2. If the user is new, use the `create_user` recipe from our recipe book.
+    # The password is hashed on the dedicated hashing pool, so this never blocks other requests.
     try:
-        new_user = crud.create_user(db=db, user=user_data)
+        new_user = await async_crud.create_user(db=db, user=user_data)
         # 3. This is where we finalize the transaction. If `create_user` was successful,
         # we commit both the User and UserAuth records to the database.
-        db.commit()
+        await db.commit()
         # Refresh the object to get the latest state from the database.
-        db.refresh(new_user)
+        await db.refresh(new_user)
         return new_user
+    except security.ExecutorBusy:
+        # Too many passwords are already waiting to be hashed. Shed the load instead of queueing forever.
+        await db.rollback()
+        raise security.password_hashing_busy_exception()
     except Exception as e:
         # If anything goes wrong during user creation, we roll back the entire transaction.
         # This ensures our database stays in a clean, consistent state.
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create user account: {str(e)}"
         )
 
 @app.post("/api/login", response_model=schemas.TokenResponse)
-def login_for_access_token(
+async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_async_db)
 ):
     """
     Endpoint for user login.
@@ -124,29 +234,47 @@ def login_for_access_token(
     """
     # 1. Find the user by their email using our CRUD recipe.
     # Note: OAuth2PasswordRequestForm uses 'username' for the email field.
-    user = crud.get_user_by_email(db, email=form_data.username)
+    user = await async_crud.get_user_by_email(db, email=form_data.username)
 
     # 2. Verify that the user exists and the password is correct using our security utility.
-    if not user or not security.verify_password(form_data.password, user.auth.password_hash):
+    # bcrypt runs on the dedicated hashing pool, off the event loop.
+    is_valid, new_hash = False, None
+    if user:
+        try:
+            is_valid, new_hash = await security.verify_password_async(form_data.password, user.auth.password_hash)
+        except security.ExecutorBusy:
+            raise security.password_hashing_busy_exception()
+
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    # 3. If the hash was made with an older cost setting, we now know the password,
+    # so we quietly store a fresh hash made with the current settings.
+    if new_hash:
+        user.auth.password_hash = new_hash
+        await db.commit()
     
-    # 3. If credentials are valid, use our "Locksmith" to create a new JWT keycard.
+    # 4. If credentials are valid, use our "Locksmith" to create a new JWT keycard.
     # The 'sub' (subject) of the token is the user's ID.
     access_token = security.create_access_token(data={"sub": str(user.id)})
 
-    # 4. Return the token to the client.
+    # 5. Return the token to the client.
     return {"access_token": access_token, "token_type": "bearer"}
 
 # =============================================================================
 # USER & WEBSITE ENDPOINTS
 # =============================================================================
 
+# Page size of GET /api/websites. Agencies can own hundreds of sites.
+WEBSITES_PAGE_DEFAULT_LIMIT = 100
+WEBSITES_PAGE_MAX_LIMIT = 500
+
 @app.get("/api/users/me", response_model=schemas.UserResponse)
-def get_user_me(current_user: Annotated[models.User, Depends(security.get_current_user)]):
+async def get_user_me(current_user: Annotated[models.User, Depends(security.get_current_user_async)]):
     """
     A protected endpoint to get the current user's profile.
     The `get_current_user` dependency acts as the "Bouncer", ensuring only
@@ -158,28 +286,37 @@ def get_user_me(current_user: Annotated[models.User, Depends(security.get_curren
     return current_user
 
 @app.post("/api/websites", response_model=schemas.WebsiteResponse, status_code=status.HTTP_201_CREATED)
-def create_website_for_user(
+async def create_website_for_user(
     website: schemas.WebsiteCreate,
-    current_user: Annotated[models.User, Depends(security.get_current_user)],
-    db: Session = Depends(database.get_db)
+    current_user: Annotated[models.User, Depends(security.get_current_user_async)],
+    db: AsyncSession = Depends(database.get_async_db)
 ):
     """
     Protected endpoint to create a new website for the logged-in user.
     """
-    db_website = crud.create_website(db=db, website=website, user_id=current_user.id)
-    db.commit()
-    db.refresh(db_website)
+    db_website = await async_crud.create_website(db=db, website=website, user_id=current_user.id)
+    await db.commit()
+    # Reload the columns as the database stored them, so created_at has the same
+    # format here as in GET /api/websites. The (empty) connections stay as they are.
+    await db.refresh(db_website, attribute_names=["id", "user_id", "url", "name", "created_at"])
     return db_website
 
 @app.get("/api/websites", response_model=List[schemas.WebsiteResponse])
-def read_websites_for_user(
-    current_user: Annotated[models.User, Depends(security.get_current_user)],
-    db: Session = Depends(database.get_db)
+async def read_websites_for_user(
+    response: Response,
+    current_user: Annotated[models.User, Depends(security.get_current_user_async)],
+    db: AsyncSession = Depends(database.get_async_db),
+    limit: Annotated[int, Query(ge=1, le=WEBSITES_PAGE_MAX_LIMIT)] = WEBSITES_PAGE_DEFAULT_LIMIT,
+    after_id: Annotated[int | None, Query(ge=0)] = None,
 ):
     """
-    Protected endpoint to retrieve all websites owned by the logged-in user.
+    Protected endpoint to retrieve the websites owned by the logged-in user, one page at a time.
+    Websites come back ordered by id. When the page is full, the `X-Next-After-Id`
+    header holds the `after_id` to ask for the next one.
     """
-    websites = crud.get_websites_by_user(db=db, user_id=current_user.id)
+    websites = await async_crud.get_websites_by_user(db=db, user_id=current_user.id, limit=limit, after_id=after_id)
+    if len(websites) == limit:
+        response.headers["X-Next-After-Id"] = str(websites[-1].id)
     return websites
 
 # =============================================================================
@@ -187,179 +324,285 @@ def read_websites_for_user(
 # =============================================================================
 
 @app.post("/api/websites/{website_id}/connections", response_model=schemas.ConnectionResponse, status_code=status.HTTP_201_CREATED)
-def create_connection(
-    website_id: int,
+async def create_connection(
+    website_id: Annotated[int, Depends(security.get_owned_website_id_async)],
     connection: schemas.ConnectionCreate,
-    current_user: Annotated[models.User, Depends(security.get_current_user)],
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_async_db)
 ):
     """
     Protected endpoint to create a new platform connection for a specific website.
     Crucially, it first verifies that the user owns the website.
     """
-    # 1. Ownership Verification: Use our security-focused CRUD function.
-    db_website = crud.get_website_by_id_and_owner(db=db, website_id=website_id, user_id=current_user.id)
-    
-    # 2. If the website doesn't exist or doesn't belong to the user, deny access.
-    if db_website is None:
+    # 1. Ownership Verification: the `get_owned_website_id_async` dependency has
+    # already confirmed the user owns this website (or answered 404 for us).
+
+    # 2. If ownership is confirmed, proceed to create the connection.
+    db_connection = await async_crud.create_connection_for_website(db=db, connection=connection, website_id=website_id)
+    await db.commit()
+    await db.refresh(db_connection)
+    return db_connection
+
+# =============================================================================
+# EVENT INGESTION ENDPOINT
+# =============================================================================
+
+@app.post("/api/websites/{website_id}/events", response_model=schemas.EventBatchResponse, status_code=status.HTTP_202_ACCEPTED)
+async def ingest_events(
+    website_id: int,
+    batch: schemas.EventBatch,
+    request: Request,
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    """
+    Public endpoint the website snippet uses to send a batch of pixel events.
+    Events are handed to the in-process ingest buffer and written to the database
+    in micro-batches by a background worker, so we answer 202 right away.
+    """
+    # 1. Make sure the website exists before accepting anything for it.
+    # The ownership cache answers this without a query for active websites.
+    if await security.get_website_owner_id_async(db=db, website_id=website_id) is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Website not found or you do not have permission to access it."
+            detail="Website not found."
         )
-    
-    # 3. If ownership is confirmed, proceed to create the connection.
-    db_connection = crud.create_connection_for_website(db=db, connection=connection, website_id=website_id)
-    db.commit()
-    db.refresh(db_connection)
-    return db_connection
+
+    # 2. Turn the batch into rows and queue them for the background writer.
+    ip_address = request.client.host if request.client else None
+    user_agent = request.headers.get("user-agent")
+    rows = crud.build_event_log_rows(
+        website_id=website_id, events=batch.events, ip_address=ip_address, user_agent=user_agent
+    )
+
+    # 3. Flag duplicates (same event_id seen recently) with the in-memory dedup index.
+    event_ids = [row["event_id"] for row in rows]
+    duplicates = dedup_index.find_duplicates(website_id, event_ids)
+    # The flag travels with the row so the flush doesn't count a duplicate purchase
+    # twice in attribution (it isn't a column: the insert ignores it).
+    for row, is_duplicate in zip(rows, duplicates):
+        row["is_duplicate"] = is_duplicate
+    if DEDUP_MODE == "drop":
+        rows = [row for row, is_duplicate in zip(rows, duplicates) if not is_duplicate]
+
+    # 4. Backpressure: if the buffer is full, tell the snippet to retry a bit later.
+    if not ingest_buffer.submit(rows):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Event buffer is full. Please retry shortly.",
+            headers={"Retry-After": "1"},
+        )
+
+    # Only remember the ids once the batch is accepted, so a retried batch isn't flagged.
+    dedup_index.record(website_id, event_ids, duplicates)
+    # The duplicate counters just changed, so cached dashboards are stale.
+    monitor.website_data_versions.bump(website_id)
+
+    return {"accepted": len(rows)}
 
 # UPDATED: Now uses ingested data instead of mock data
 @app.get("/api/websites/{website_id}/health", response_model=list[schemas.EventHealth])
 def get_website_health(
-    website_id: int,
-    current_user: Annotated[models.User, Depends(security.get_current_user)],
+    website_id: Annotated[int, Depends(security.get_owned_website_id)],
     db: Session = Depends(database.get_db)
 ):
     """
     Returns calculated event health data for a given website based on recent event logs.
     """
-    # 1. Ownership check (critical for security)
-    db_website = crud.get_website_by_id_and_owner(
-        db=db,
-        website_id=website_id,
-        user_id=current_user.id,
-    )
-    if db_website is None: # FIX: Should be db_website, not website_id
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Website not found or you do not have permission to access it."
-        )
-    
-    # 2. UPDATED: Get the summary data from the database
-    # Let's look back 3 days (72 hours) for relevant events
-    summary_data = crud.get_recent_event_summary(db=db, website_id=website_id, time_window_hours=72)
+    # 1. Ownership check (critical for security) is done once by the
+    # `get_owned_website_id` dependency, backed by the ownership cache.
 
-    # 3. Process the summary to calculate status and mock EMQ
-    health_results = []
-    now = datetime.now(timezone.utc)
+    def compute():
+        # 2. UPDATED: Get the summary data from the database
+        # Let's look back 3 days (72 hours) for relevant events
+        summary_data = crud.get_recent_event_summary(db=db, website_id=website_id, time_window_hours=monitor.HEALTH_WINDOW_HOURS)
+
+        # 3. Process the summary to calculate status and EMQ (see monitor.py and emq.py)
+        return monitor.compute_event_health(summary_data, now=datetime.now(timezone.utc))
 
-    # Define the standard events we care about for the monitor
-    standard_events = ["PageView", "AddToCart", "InitiateCheckout", "Purchase"]
-
-    # Create a dictionary for quick lookup
-    summary_map = {item["event_name"]: item for item in summary_data}
-
-    for event_name in standard_events:
-        event_summary = summary_map.get(event_name)
-
-        if event_summary:
-            last_received = event_summary["last_received"]
-            time_diff = now - last_received
-            fbp_present = event_summary["fbp_present"]
-
-            # Simple status logic based on recency
-            if time_diff > timedelta(days=1):
-                event_status = "error"
-            elif time_diff > timedelta(hours=4): # Make warning threshold a bit shorter
-                event_status = "warning"
-            else:
-                event_status = "healthy"
-
-            # Very basic mock EMQ score calculation
-            # Start with a base score, add points for recency and fbp
-            emq_score = 4.0 
-            if event_status == "healthy":
-                emq_score += 3.0
-            elif event_status == "warning":
-                emq_score += 1.5
-                
-            if fbp_present: # Give points if fbp cookie was logged
-                 emq_score += 2.1 
-            
-            # Cap the score at 9.9 for realism 
-            emq_score = min(emq_score, 9.9)
-
-            health_results.append(schemas.EventHealth(
-                event_name=event_name,
-                emq_score=emq_score,
-                last_received=last_received,
-                status=event_status
-            ))
-        else:
-            # If the event hasn't been received in the time window
-             health_results.append(schemas.EventHealth(
-                event_name=event_name,
-                emq_score=0.0, # No data, score is 0
-                last_received=datetime.min.replace(tzinfo=timezone.utc), # Use minimum datetime
-                status="error" # Mark as error if not seen recently
-            ))
-             
-    return health_results
+    # Concurrent and repeated requests for the same website share one computation.
+    return monitor.cached_for_website("health", website_id, compute)
 
 # UPDATED: Now uses our new CRUD function for calculated health alerts rather than mock ones
 @app.get("/api/websites/{website_id}/alerts", response_model=list[schemas.EventAlert])
 def get_website_alerts(
-    website_id: int,
-    current_user: Annotated[models.User, Depends(security.get_current_user)],
+    website_id: Annotated[int, Depends(security.get_owned_website_id)],
     db: Session = Depends(database.get_db)
 ):
     """
     Returns calculated health alerts for a given website based on recent event logs.
     Currently checks for potential duplicate events.
     """
-    # 1. Ownership check (critical for security)
-    db_website = crud.get_website_by_id_and_owner(
-        db=db,
-        website_id=website_id,
-        user_id=current_user.id,
-    )
-    if db_website is None:
+    # 1. Ownership check (critical for security) is done once by the
+    # `get_owned_website_id` dependency, backed by the ownership cache.
+
+    def compute():
+        # 2. Duplicate events are flagged at ingest within the last hour.
+        # The dedup index keeps these counters in memory, so no event_logs query is needed.
+        # Unlike a query, they are per worker: each worker only counts the duplicates it
+        # received itself (with several workers, a repeat that lands on another worker
+        # isn't caught), and they start empty after a restart.
+        duplicate_ids = dedup_index.duplicate_event_ids(website_id)
+
+        # 3. The low-EMQ check looks at the last 24h of the health rollup.
+        health_summary = crud.get_recent_event_summary(db=db, website_id=website_id, time_window_hours=monitor.ALERT_WINDOW_HOURS)
+
+        return monitor.compute_alerts(health_summary, duplicate_ids, now=datetime.now(timezone.utc))
+
+    # Concurrent and repeated requests for the same website share one computation.
+    return monitor.cached_for_website("alerts", website_id, compute)
+
+def _event_range(start: datetime, end: datetime | None) -> datetime:
+    """Checks the [start, end) range of an event listing or export and returns `end` (now by default)."""
+    end = end or datetime.now(timezone.utc)
+    if export.to_naive_utc(end) <= export.to_naive_utc(start):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="`end` must be after `start`.")
+    if export.to_naive_utc(end) - export.to_naive_utc(start) > timedelta(days=export.EVENT_EXPORT_MAX_DAYS):
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Website not found or you do not have permission to access it."
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Event ranges can cover at most {export.EVENT_EXPORT_MAX_DAYS} days.",
         )
-    
-    # 2. UPDATED: No more mock data. Initialize list to hold generated alerts
-    alerts = []
+    return end
+
+@app.get("/api/websites/{website_id}/events")
+def list_website_events(
+    website_id: Annotated[int, Depends(security.get_owned_website_id)],
+    start: datetime,
+    end: datetime | None = None,
+    after_id: Annotated[int | None, Query(ge=0)] = None,
+    limit: Annotated[int | None, Query(ge=1)] = None,
+):
+    """
+    Lists a website's raw events received in [start, end), oldest first, as
+    newline-delimited JSON (one event per line). Rows are read from a streaming
+    cursor and sent batch by batch, so even a million-event range starts
+    arriving right away and never sits in memory as a whole.
+    Pass the last `id` you got as `after_id` to resume an interrupted read.
+    """
+    end = _event_range(start, end)
+    return StreamingResponse(
+        export.stream_website_events(website_id, start, end, "ndjson", after_event_id=after_id, limit=limit),
+        media_type=export.EXPORT_FORMATS["ndjson"][0],
+    )
+
+@app.get("/api/websites/{website_id}/events/export")
+def export_website_events(
+    website_id: Annotated[int, Depends(security.get_owned_website_id)],
+    start: datetime,
+    end: datetime | None = None,
+    format: Annotated[str, Query(pattern="^(parquet|arrow|ndjson)$")] = "parquet",
+):
+    """
+    Downloads a website's raw events received in [start, end) as a Parquet file
+    (or an Arrow IPC stream, or NDJSON), for offline analysis. `end` defaults to now.
+    The file is encoded while it streams, one batch of rows at a time.
+    """
+    if not export.format_available(format):
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="This export format is not available on this server.")
+    end = _event_range(start, end)
+
+    media_type, extension = export.EXPORT_FORMATS[format]
+    filename = f"events-{website_id}-{export.to_naive_utc(start):%Y%m%dT%H%M%S}-{export.to_naive_utc(end):%Y%m%dT%H%M%S}.{extension}"
+    return StreamingResponse(
+        export.stream_website_events(website_id, start, end, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.get("/api/websites/{website_id}/events/timeseries", response_model=schemas.EventTimeseriesResponse)
+def get_event_timeseries(
+    website_id: Annotated[int, Depends(security.get_owned_website_id)],
+    start: datetime,
+    end: datetime | None = None,
+    resolution: Annotated[str | None, Query(pattern="^(minute|hour|day)$")] = None,
+    event_name: Annotated[str | None, Query(max_length=100)] = None,
+    db: Session = Depends(database.get_db)
+):
+    """
+    How many events of each type a website received per minute, hour or day in
+    [start, end), read from the precomputed volume tables. `end` defaults to now.
+    Without `resolution`, the finest one that still covers `start` and fits in
+    TIMESERIES_MAX_POINTS buckets is used, so any range comes back in bounded rows.
+    """
+    end = end or datetime.now(timezone.utc)
+    if export.to_naive_utc(end) <= export.to_naive_utc(start):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="`end` must be after `start`.")
+    try:
+        return timeseries.get_event_timeseries(db, website_id, start, end, resolution, event_name)
+    except ValueError as error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(error))
+
+@app.get("/api/websites/{website_id}/dashboard", response_model=schemas.DashboardResponse)
+async def get_website_dashboard(
+    website_id: Annotated[int, Depends(security.get_owned_website_id_async)],
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    """
+    Everything the dashboard needs in one call: health cards and alerts from the
+    health rollup, and conversions, ROAS and campaigns from the attribution totals.
+
+    Supports ETag/If-None-Match: if nothing changed since the client's copy,
+    we answer 304 after one small query instead of building the dashboard.
+    """
+    # 1. Ownership check is done by the dependency (cached for active websites).
     now = datetime.now(timezone.utc)
-    
-    # 3. Check for duplicate events using the new CRUD function
-    # Look for duplicates within the last hour
-    duplicate_ids = crud.get_potential_duplicate_events(db=db, website_id=website_id, time_window_minutes=60)
-
-    if duplicate_ids:
-        # Just create one generic alert if any duplicates are found for now
-        alerts.append(schemas.EventAlert(
-            id="alert-duplicate-events", # Static ID for this type of alert
-            severity="error",
-            title="Potential Duplicate Events Detected",
-            message=f"We detected {len(duplicate_ids)} event ID(s) sent multiple times recently (e.g., '{duplicate_ids[0]}'). This could inflate conversion counts.",
-            timestamp=now # Use current time for the alert generation time
-        ))
-
-    # 4. Check for low EMQ scores (can reuse logic/data from health endpoint if needed later)
-    # For now, let's keep the mock warning alert logic based on a simple check
-    # In a real system, we might query health status or calculate EMQ here too.
-    # Placeholder: Add back the warning if InitiateCheckout was seen recently but had low score
-    health_summary = crud.get_recent_event_summary(db=db, website_id=website_id, time_window_hours=24) # Check last 24h
-    checkout_summary = next((item for item in health_summary if item["event_name"] == "InitiateCheckout"), None)
-    
-    if checkout_summary:
-        # Re-calculate a mock score (similar to /health endpoint)
-        temp_emq = 4.0
-        if (now - checkout_summary["last_received"]) < timedelta(hours=4): temp_emq += 3.0
-        if checkout_summary["fbp_present"]: temp_emq += 2.1
-        temp_emq = min(temp_emq, 9.9)
-
-        if temp_emq < 7.0: # If mock score is low
-             alerts.append(schemas.EventAlert(
-                id="alert-low-emq-checkout",
-                severity="warning",
-                title=f"'InitiateCheckout' EMQ May Be Low ({temp_emq:.1f}/10)",
-                message="Recent 'InitiateCheckout' events might be missing key customer parameters. Consider reviewing data points sent.",
-                timestamp=checkout_summary["last_received"] # Use event time for relevance
-            ))
-
-    # Add more alert generation logic here later (e.g., events not seen at all)
-
-    return alerts
\ No newline at end of file
+    since = attribution.attribution_since(now)
+    duplicate_ids = dedup_index.duplicate_event_ids(website_id)
+
+    # 2. The ETag depends on a fingerprint of the stored data (shared by all workers),
+    #    this worker's duplicate flags and the clock.
+    data_version = await async_crud.get_dashboard_data_version(db, website_id, since)
+    etag = monitor.dashboard_etag(website_id, data_version, duplicate_ids, now)
+    cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if monitor.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+
+    # 3. The health cards and the alerts each score EMQ over their own window.
+    health_summary = await async_crud.get_recent_event_summary(db=db, website_id=website_id, time_window_hours=monitor.HEALTH_WINDOW_HOURS)
+    alert_summary = await async_crud.get_recent_event_summary(db=db, website_id=website_id, time_window_hours=monitor.ALERT_WINDOW_HOURS)
+
+    # 4. Conversions, revenue and spend come from the precomputed per-day attribution tables.
+    conversions, spend = await async_crud.get_attribution_totals(db, website_id, since)
+    dashboard = monitor.compute_dashboard(health_summary, alert_summary, duplicate_ids, now, attribution.compute_attribution(conversions, spend))
+
+    response.headers.update(cache_headers)
+    return dashboard
+
+@app.put("/api/websites/{website_id}/campaign-spend", response_model=schemas.CampaignSpendResponse)
+async def report_campaign_spend(
+    website_id: Annotated[int, Depends(security.get_owned_website_id_async)],
+    spend: schemas.CampaignSpendBatch,
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    """
+    Records ad spend per campaign and day, so the dashboard can compute ROAS.
+    Sending the same (day, campaign, currency) again (even within one batch) replaces the earlier figure.
+    """
+    saved = await async_crud.save_campaign_spend(db, website_id, spend.entries)
+    await db.commit()
+    # ROAS just changed, so cached dashboards are stale.
+    monitor.website_data_versions.bump(website_id)
+    return {"saved": saved}
+
+@app.get("/api/websites/{website_id}/health/stream")
+async def stream_website_health(
+    website_id: Annotated[int, Depends(security.get_owned_website_id_async)],
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    """
+    Live event health over Server-Sent Events, instead of polling /health and /alerts.
+
+    The stream opens with a `snapshot` event (health cards and alerts), then sends
+    a `health` event with just the cards that changed and an `alerts` event with
+    the new alert list whenever new events are ingested. All tabs watching the
+    same website share one computation per change.
+    """
+    # The ownership check may have used the session; hand its connection back
+    # to the pool now rather than holding it for as long as the stream is open.
+    await db.close()
+
+    return StreamingResponse(
+        live_health.stream(website_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}, # Don't let proxies buffer the stream
+    )
@@ -0,0 +1,61 @@
+import os
+import logging
+import threading
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# How often the periodic housekeeping jobs run (partitions, retention, ...).
+# Enabled by default because upcoming event_logs partitions must be created in time;
+# event retention itself only deletes anything once EVENT_LOG_RETENTION_DAYS is set.
+MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "3600"))
+MAINTENANCE_ENABLED = os.getenv("MAINTENANCE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+class MaintenanceScheduler:
+    """
+    Runs registered housekeeping jobs on a background thread: once at startup,
+    then every `interval_seconds`. A failing job is logged and never stops the others.
+    """
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._jobs: list[tuple[str, Callable[[], object]]] = []
+        self._stop_event = threading.Event()
+        self._worker: threading.Thread | None = None
+
+    def register(self, name: str, job: Callable[[], object]) -> None:
+        self._jobs.append((name, job))
+
+    def run_once(self) -> dict:
+        """Runs every job one time and returns what each of them reported."""
+        results = {}
+        for name, job in self._jobs:
+            try:
+                results[name] = job()
+            except Exception:
+                logger.exception("Maintenance job %r failed", name)
+                results[name] = "failed"
+        return results
+
+    def start(self) -> None:
+        if self._worker is not None:
+            return
+        self._stop_event.clear()
+        self._worker = threading.Thread(target=self._run, name="maintenance", daemon=True)
+        self._worker.start()
+
+    def stop(self) -> None:
+        if self._worker is None:
+            return
+        self._stop_event.set()
+        self._worker.join()
+        self._worker = None
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            self.run_once()
+            self._stop_event.wait(self.interval_seconds)
+
+# The single scheduler shared by the whole app. Jobs are registered in main.py.
+maintenance_scheduler = MaintenanceScheduler(interval_seconds=MAINTENANCE_INTERVAL_SECONDS)
@@ -0,0 +1,239 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable
+
+import fastapi.routing
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Request metrics in the Prometheus text format, without extra dependencies.
+#
+# A middleware times every request, and for the request being served we also
+# count what happens inside it: SQL statements (via SQLAlchemy engine events),
+# ORM objects loaded, and the time spent turning the result into JSON.
+# Everything is labelled by route template (e.g. /api/websites/{website_id}/alerts),
+# never by raw URL, so the number of series stays small.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+ROW_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000)
+
+def _escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (non-cumulative, plus +Inf), sum, count]
+        self._values: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        bucket_names = self.labelnames + ("le",)
+        with self._lock:
+            for labels, (bucket_counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ("+Inf",), bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_format_labels(bucket_names, labels + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+class Gauge:
+    """A value read when /metrics is scraped. `collect` returns {label values: value}."""
+
+    def __init__(self, name: str, documentation: str, collect: Callable[[], dict], labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.collect = collect
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                continue # One broken gauge must not take the whole scrape down
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_requests_total = registry.register(Counter(
+    "http_requests_total", "HTTP requests served.", ("method", "route", "status")))
+http_request_duration_seconds = registry.register(Histogram(
+    "http_request_duration_seconds", "Time to serve a request, until the response is fully sent.", ("method", "route")))
+http_request_db_queries = registry.register(Histogram(
+    "http_request_db_queries", "SQL statements executed per request.", ("method", "route"), COUNT_BUCKETS))
+http_request_db_seconds = registry.register(Histogram(
+    "http_request_db_seconds", "Time spent executing SQL per request.", ("method", "route")))
+http_request_orm_rows = registry.register(Histogram(
+    "http_request_orm_rows", "ORM objects loaded from the database per request.", ("method", "route"), ROW_BUCKETS))
+http_request_serialization_seconds = registry.register(Histogram(
+    "http_request_serialization_seconds", "Time spent validating and serializing the response model per request.", ("method", "route")))
+
+# =============================================================================
+# PER-REQUEST COUNTERS
+# =============================================================================
+
+class RequestStats:
+    """What happened while serving one request. Shared by reference with worker threads."""
+    __slots__ = ("db_queries", "db_seconds", "orm_rows", "serialization_seconds")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.orm_rows = 0
+        self.serialization_seconds = 0.0
+
+# Set by the middleware. Sync endpoints run in a worker thread with a copy of the
+# context, which still points at the same RequestStats object.
+current_request_stats: ContextVar[RequestStats | None] = ContextVar("current_request_stats", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get("query_start_times")
+    if not start_times:
+        return
+    elapsed = time.perf_counter() - start_times.pop()
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_seconds += elapsed
+
+def _on_orm_load(target, context):
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.orm_rows += 1
+
+_original_serialize_response = fastapi.routing.serialize_response
+
+async def _timed_serialize_response(*args, **kwargs):
+    start = time.perf_counter()
+    try:
+        return await _original_serialize_response(*args, **kwargs)
+    finally:
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.serialization_seconds += time.perf_counter() - start
+
+_installed = False
+
+def install(base) -> None:
+    """
+    Hooks the per-request counters into SQLAlchemy (every engine, sync and async,
+    and every model derived from `base`) and into FastAPI's response serialization.
+    FastAPI has no hook for the latter, so we wrap its module-level
+    `serialize_response`, which the route handlers look up on every call.
+    """
+    global _installed
+    if _installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(base, "load", _on_orm_load, propagate=True)
+    fastapi.routing.serialize_response = _timed_serialize_response
+    _installed = True
+
+# =============================================================================
+# MIDDLEWARE
+# =============================================================================
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (so streaming responses pass straight through) that records every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request_stats.reset(token)
+            route = scope.get("route")
+            # Unmatched paths share one label, so random URLs can't create new series.
+            route_label = getattr(route, "path", "unmatched")
+            method = scope["method"]
+
+            http_requests_total.inc(method, route_label, status_code)
+            http_request_duration_seconds.observe(elapsed, method, route_label)
+            http_request_db_queries.observe(stats.db_queries, method, route_label)
+            http_request_db_seconds.observe(stats.db_seconds, method, route_label)
+            http_request_orm_rows.observe(stats.orm_rows, method, route_label)
+            http_request_serialization_seconds.observe(stats.serialization_seconds, method, route_label)
+
+def render_latest() -> str:
+    return registry.render()
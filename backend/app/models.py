@@ -1,13 +1,17 @@
 from __future__ import annotations
 from typing import List, Optional
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 
 from sqlalchemy import (
+    DateTime,
     String,
     Text,
     ForeignKey,
+    Index,
     JSON
 )
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
 from sqlalchemy.orm import (
     DeclarativeBase,
     Mapped,
@@ -15,6 +19,20 @@ from sqlalchemy.orm import (
     relationship
 )
 
+# The database's own clock, in UTC, as a naive timestamp like every other column.
+# Used where the time a row was actually written matters more than the app's clock.
+class utcnow(FunctionElement):
+    type = DateTime()
+    inherit_cache = True
+
+@compiles(utcnow, "postgresql")
+def _utcnow_postgresql(element, compiler, **kw):
+    return "timezone('utc', statement_timestamp())"
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP" # SQLite: UTC already
+
 # The base class for all our database models.
 # It's like the foundation of our building; everything else is built on top of it.
 class Base(DeclarativeBase):
@@ -71,6 +89,11 @@ class Website(Base):
     )
     user: Mapped["User"] = relationship(back_populates="websites")
 
+    __table_args__ = (
+        # Keyset pagination of a user's websites: WHERE user_id = ? AND id > ? ORDER BY id.
+        Index("ix_websites_user_id_id", "user_id", "id"),
+    )
+
 # Represents a connection to a specific ad platform (like Meta, TikTok, or Shopify).
 # This is the key to our "platform agnostic" future.
 PLATFORMS = ("meta", "shopify", "tiktok")
@@ -78,7 +101,7 @@ class Connection(Base):
     __tablename__ = "connections"
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
-    website_id: Mapped[int] = mapped_column(ForeignKey("websites.id"))
+    website_id: Mapped[int] = mapped_column(ForeignKey("websites.id"), index=True) # selectinload fetches by website_id IN (...)
     platform: Mapped[str] = mapped_column(String(50)) # e.g., "meta", "shopify", "tiktok"
     
     # Stores platform-specific IDs, like Pixel ID for Meta or Store ID for Shopify.
@@ -90,6 +113,11 @@ class Connection(Base):
     is_active: Mapped[bool] = mapped_column(default=True)
     created_at: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc))
 
+    # Forwarding checkpoint: the last event_logs.id we delivered to the platform,
+    # so the dispatcher picks up exactly where it left off (even after a restart).
+    last_forwarded_event_id: Mapped[Optional[int]] = mapped_column()
+    last_forwarded_at: Mapped[Optional[datetime]] = mapped_column()
+
     website: Mapped["Website"] = relationship(back_populates="connections")
 
 # Represents a user who has signed up for the waitlist.
@@ -110,19 +138,35 @@ class Waitlist(Base):
 # NEW: Represents a raw event received from a user's website snippet.
 class EventLog(Base):
     __tablename__ = "event_logs"
+    # Composite indexes shaped after the queries that still read event_logs: they
+    # all filter by website plus a received_at range. (Per-event-type summaries come
+    # from event_health_rollup, so there is no (website, event_name) index to maintain.)
+    __table_args__ = (
+        # Duplicate detection (GROUP BY event_id within a time window).
+        Index("ix_event_logs_website_event_id_received", "website_id", "event_id", "received_at"),
+        # Plain time-range scans of one website's events.
+        Index("ix_event_logs_website_received", "website_id", "received_at"),
+        # The CAPI dispatcher's checkpoint scan (website, id > checkpoint ORDER BY id):
+        # walks the index in order and stops at the batch limit, no sort.
+        Index("ix_event_logs_website_id_id", "website_id", "id"),
+    )
 
-    id: Mapped[int] = mapped_column(primary_key=True, index=True)
-    website_id: Mapped[int] = mapped_column(ForeignKey("websites.id"), index=True)
+    id: Mapped[int] = mapped_column(primary_key=True)
+    website_id: Mapped[int] = mapped_column(ForeignKey("websites.id"))
     received_at: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc), index=True)
+    # When the row was inserted, by the database's clock. received_at is stamped when
+    # the request is accepted, which can be well before the buffered row is written;
+    # the CAPI dispatcher needs the write time to know which rows are safely visible.
+    inserted_at: Mapped[datetime] = mapped_column(server_default=utcnow())
     
     # Core Meta event details
-    event_id: Mapped[Optional[str]] = mapped_column(String(100), index=True) # For deduplication
-    event_name: Mapped[str] = mapped_column(String(100), index=True)
+    event_id: Mapped[Optional[str]] = mapped_column(String(100)) # For deduplication
+    event_name: Mapped[str] = mapped_column(String(100))
     event_time: Mapped[datetime] # Timestamp from the client when the event occurred
     event_source_url: Mapped[Optional[str]] = mapped_column(String(2048))
     
     # Key user identifiers (we'll store them raw initially for simplicity, hash later)
-    # Storing raw temporarily helps debugging; hash before sending to Meta.
+    # Storing raw temporarily helps debugging; hashed on the way out to Meta (see identifiers.py).
     user_ip_address: Mapped[Optional[str]] = mapped_column(String(64))
     user_agent: Mapped[Optional[str]] = mapped_column(String(512))
     fbp: Mapped[Optional[str]] = mapped_column(String(100)) # _fbp cookie
@@ -136,3 +180,98 @@ class EventLog(Base):
 
     # Relationship back to the Website (optional but good practice)
     website: Mapped["Website"] = relationship() # Defaults to lazy loading
+
+# NEW: A precomputed, per-event-type summary of a website's event stream.
+# One row per (website, event_name), updated incrementally every time a batch of
+# events is written. The health monitor reads these few rows instead of scanning
+# the whole event_logs table on every request.
+class EventHealthRollup(Base):
+    __tablename__ = "event_health_rollup"
+
+    website_id: Mapped[int] = mapped_column(ForeignKey("websites.id"), primary_key=True)
+    event_name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    first_received: Mapped[datetime]
+    last_received: Mapped[datetime]
+
+    # How many events of this type we've received in total...
+    event_count: Mapped[int] = mapped_column(default=0)
+    # ...and how many of them carried each customer identifier. (EMQ is scored over a
+    # window instead, from the same counters on the event volume buckets below.)
+    email_count: Mapped[int] = mapped_column(default=0)
+    phone_count: Mapped[int] = mapped_column(default=0)
+    ip_count: Mapped[int] = mapped_column(default=0)
+    user_agent_count: Mapped[int] = mapped_column(default=0)
+    fbp_count: Mapped[int] = mapped_column(default=0)
+    fbc_count: Mapped[int] = mapped_column(default=0)
+
+# NEW: Attribution. A purchase is credited to the ad campaign that brought the
+# customer in: the utm_campaign on the page it happened on or, failing that, the
+# campaign of the ad click its `fbc` cookie came from. Like the health rollup, these
+# tables are updated incrementally as events are flushed, so the dashboard reads a
+# few precomputed rows instead of scanning months of event_logs.
+
+# Which campaign each ad click (fbc cookie) belongs to, learned from the landing
+# page views that carry both the cookie and utm parameters.
+class AttributionClick(Base):
+    __tablename__ = "attribution_clicks"
+
+    website_id: Mapped[int] = mapped_column(ForeignKey("websites.id"), primary_key=True)
+    fbc: Mapped[str] = mapped_column(String(255), primary_key=True)
+    campaign: Mapped[str] = mapped_column(String(255))
+    last_seen: Mapped[datetime]
+
+# Conversions and revenue per website, day (UTC, by received_at), campaign and currency.
+class AttributionDaily(Base):
+    __tablename__ = "attribution_daily"
+
+    website_id: Mapped[int] = mapped_column(ForeignKey("websites.id"), primary_key=True)
+    day: Mapped[date] = mapped_column(primary_key=True)
+    campaign: Mapped[str] = mapped_column(String(255), primary_key=True)
+    currency: Mapped[str] = mapped_column(String(10), primary_key=True)
+    conversions: Mapped[int] = mapped_column(default=0)
+    revenue: Mapped[float] = mapped_column(default=0.0)
+
+# Ad spend per campaign and day, as reported by the customer (or, later, synced
+# from the ad platforms). ROAS is attributed revenue divided by this.
+class CampaignSpend(Base):
+    __tablename__ = "campaign_spend"
+
+    website_id: Mapped[int] = mapped_column(ForeignKey("websites.id"), primary_key=True)
+    day: Mapped[date] = mapped_column(primary_key=True)
+    campaign: Mapped[str] = mapped_column(String(255), primary_key=True)
+    currency: Mapped[str] = mapped_column(String(10), primary_key=True)
+    spend: Mapped[float] = mapped_column(default=0.0)
+    # When the figure was last reported (database clock). Lets the dashboard's ETag
+    # notice spend changes made through any worker.
+    updated_at: Mapped[datetime] = mapped_column(server_default=utcnow())
+
+# NEW: Event volume time series. How many events of each type a website received
+# per minute, hour and day (UTC, by received_at), for charts and volume-drop checks.
+# All three tables are updated from the same batch deltas as the events are flushed:
+# the batch is counted per minute, and those counts are summed into hours and days.
+# Each resolution has its own retention (see timeseries.py), so the fine-grained
+# minute table stays small while the daily one can be kept for years.
+class EventVolumeColumns:
+    website_id: Mapped[int] = mapped_column(ForeignKey("websites.id"), primary_key=True)
+    # The first instant of the bucket. Leading the key after website_id, so one
+    # website's range is a single index scan whatever the event types.
+    bucket_start: Mapped[datetime] = mapped_column(primary_key=True, index=True)
+    event_name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    event_count: Mapped[int] = mapped_column(default=0)
+    # How many of the bucket's events carried each customer identifier, like the
+    # health rollup's counters but per bucket, so EMQ can be scored over a window.
+    email_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    phone_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    ip_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    user_agent_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    fbp_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    fbc_count: Mapped[int] = mapped_column(default=0, server_default="0")
+
+class EventVolumeMinute(EventVolumeColumns, Base):
+    __tablename__ = "event_volume_minute"
+
+class EventVolumeHour(EventVolumeColumns, Base):
+    __tablename__ = "event_volume_hour"
+
+class EventVolumeDay(EventVolumeColumns, Base):
+    __tablename__ = "event_volume_day"
@@ -0,0 +1,173 @@
+import os
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable
+
+from . import emq, schemas
+from .cache import CoalescingCache, VersionCounter
+from .shared_cache import SharedCache
+
+# The event health monitor: turns the per-event-type summaries (see
+# crud.summarize_rollup) into the health cards, alerts and totals the dashboard
+# shows. These are plain functions over already-loaded data, so the /health,
+# /alerts and /dashboard endpoints can all share one query's results.
+
+# --- Configuration ---
+HEALTH_WINDOW_HOURS = 72 # Event types not seen for this long show up as "error"
+ALERT_WINDOW_HOURS = 24
+# The standard events we care about for the monitor.
+STANDARD_EVENTS = ["PageView", "AddToCart", "InitiateCheckout", "Purchase"]
+# The event type that counts as a conversion.
+CONVERSION_EVENT = "Purchase"
+# A dashboard ETag stays valid for at most this long, even when no new events
+# arrive, because the health status of an event type depends on the clock too.
+DASHBOARD_ETAG_BUCKET_SECONDS = int(os.getenv("DASHBOARD_ETAG_BUCKET_SECONDS", "60"))
+
+# Bumped whenever a website's events change (accepted at ingest, written by the
+# ingest buffer). Anything this worker derives from a website's events can check
+# it to see whether it is still current. It only sees this worker's writes, so the
+# dashboard's ETag is built from the database instead (see `dashboard_etag`).
+website_data_versions = VersionCounter()
+
+# /health and /alerts results are shared for a few seconds between everyone looking
+# at the same website (several tabs, a whole team, every worker when the cache backend
+# is Redis), and identical requests arriving together run the queries once. New events
+# for a website evict its entries everywhere (see `_evict_health_results`).
+# A ttl of 0 keeps only the coalescing.
+HEALTH_CACHE_TTL_SECONDS = float(os.getenv("HEALTH_CACHE_TTL_SECONDS", "5"))
+HEALTH_CACHE_MAX_ENTRIES = int(os.getenv("HEALTH_CACHE_MAX_ENTRIES", "2000"))
+HEALTH_CACHE_KINDS = ("health", "alerts")
+health_results = CoalescingCache(results=SharedCache("health", maxsize=HEALTH_CACHE_MAX_ENTRIES, ttl_seconds=HEALTH_CACHE_TTL_SECONDS))
+
+def _evict_health_results(website_ids: tuple) -> None:
+    for website_id in website_ids:
+        for kind in HEALTH_CACHE_KINDS:
+            health_results.results.delete((kind, website_id))
+
+website_data_versions.add_listener(_evict_health_results)
+
+def cached_for_website(kind: str, website_id: int, compute: Callable[[], Any]) -> Any:
+    """
+    Returns `compute()` for this website's current data, shared through `health_results`.
+    Results computed while new data arrived are handed out but not kept.
+    """
+    version = website_data_versions.get(website_id)
+    return health_results.get_or_compute(
+        (kind, website_id),
+        compute,
+        is_current=lambda: website_data_versions.get(website_id) == version,
+    )
+
+def event_status(last_received: datetime, now: datetime) -> str:
+    """Simple status logic based on recency."""
+    time_diff = now - last_received
+    if time_diff > timedelta(days=1):
+        return "error"
+    if time_diff > timedelta(hours=4): # Make warning threshold a bit shorter
+        return "warning"
+    return "healthy"
+
+def compute_event_health(summary: list[dict], now: datetime) -> list[schemas.EventHealth]:
+    """One health card per standard event, from the summaries within the health window."""
+    # Create a dictionary for quick lookup
+    summary_map = {item["event_name"]: item for item in summary}
+
+    health_results = []
+    for event_name in STANDARD_EVENTS:
+        event_summary = summary_map.get(event_name)
+
+        if event_summary:
+            status = event_status(event_summary["last_received"], now)
+            health_results.append(schemas.EventHealth(
+                event_name=event_name,
+                emq_score=emq.emq_score(event_summary),
+                last_received=event_summary["last_received"],
+                status=status,
+                identifier_coverage=emq.identifier_coverage(event_summary),
+            ))
+        else:
+            # If the event hasn't been received in the time window
+            health_results.append(schemas.EventHealth(
+                event_name=event_name,
+                emq_score=0.0, # No data, score is 0
+                last_received=datetime.min.replace(tzinfo=timezone.utc), # Use minimum datetime
+                status="error" # Mark as error if not seen recently
+            ))
+
+    return health_results
+
+def compute_alerts(summary: list[dict], duplicate_ids: list[str], now: datetime) -> list[schemas.EventAlert]:
+    """
+    Health alerts from the summaries within the alert window plus the event_ids
+    the dedup index flagged. Currently checks for duplicates and low checkout EMQ (see emq.py).
+    """
+    alerts = []
+
+    if duplicate_ids:
+        # Just create one generic alert if any duplicates are found for now
+        alerts.append(schemas.EventAlert(
+            id="alert-duplicate-events", # Static ID for this type of alert
+            severity="error",
+            title="Potential Duplicate Events Detected",
+            message=f"We detected {len(duplicate_ids)} event ID(s) sent multiple times recently (e.g., '{duplicate_ids[0]}'). This could inflate conversion counts.",
+            timestamp=now # Use current time for the alert generation time
+        ))
+
+    # Warn if InitiateCheckout was seen recently but its events carry too few customer identifiers.
+    checkout_summary = next((item for item in summary if item["event_name"] == "InitiateCheckout"), None)
+
+    if checkout_summary:
+        checkout_emq = emq.emq_score(checkout_summary)
+
+        if checkout_emq < emq.EMQ_LOW_SCORE:
+            missing = emq.weakest_identifiers(checkout_summary)
+            alerts.append(schemas.EventAlert(
+                id="alert-low-emq-checkout",
+                severity="warning",
+                title=f"'InitiateCheckout' EMQ May Be Low ({checkout_emq:.1f}/10)",
+                message=f"Many 'InitiateCheckout' events are missing key customer parameters (most of all: {', '.join(missing)}). Sending them improves how well Meta matches these events.",
+                timestamp=checkout_summary["last_received"] # Use event time for relevance
+            ))
+
+    # Add more alert generation logic here later (e.g., events not seen at all)
+
+    return alerts
+
+def compute_dashboard(health_summary: list[dict], alert_summary: list[dict], duplicate_ids: list[str], now: datetime, attribution: dict) -> schemas.DashboardResponse:
+    """
+    Everything the dashboard shows, from the summaries of the health and alert
+    windows (each counting only its own window's events), the dedup index's
+    flagged ids, and the attribution totals (see attribution.compute_attribution).
+    """
+    return schemas.DashboardResponse(
+        total_conversions_recovered=attribution["total_conversions"],
+        overall_roas=attribution["overall_roas"],
+        campaign_performance=attribution["campaigns"],
+        event_health_monitor=compute_event_health(health_summary, now),
+        alerts=compute_alerts(alert_summary, duplicate_ids, now),
+        currency=attribution["currency"],
+        attribution_window_days=attribution["window_days"],
+    )
+
+def dashboard_etag(website_id: int, data_version: tuple, duplicate_ids: list[str], now: datetime) -> str:
+    """
+    The ETag of a website's dashboard. It changes when the stored data moves
+    (`data_version`, see async_crud.get_dashboard_data_version), when the answering
+    worker's duplicate flags change, or when the time bucket rolls over.
+    The stored data and the clock are the same on every worker, but the duplicate
+    flags come from that worker's own dedup index (see dedup.py), and so does the
+    dashboard's duplicate alert. Workers that saw different duplicates therefore
+    give different tags, and a client bouncing between them gets a fresh 200 rather
+    than a 304 for another worker's alerts.
+    """
+    bucket = int(now.timestamp()) // DASHBOARD_ETAG_BUCKET_SECONDS
+    fingerprint = repr((website_id, data_version, duplicate_ids, bucket))
+    digest = hashlib.sha256(fingerprint.encode()).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """True if the client's If-None-Match header already names `etag`."""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
@@ -0,0 +1,180 @@
+import os
+import logging
+import re
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from . import database, export, models
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# On PostgreSQL `event_logs` is range-partitioned by received_at (see migration
+# 6f7b1512bfcb). These settings control how partitions are laid out and kept.
+EVENT_LOG_PARTITION_INTERVAL = os.getenv("EVENT_LOG_PARTITION_INTERVAL", "daily") # "daily" or "weekly"
+EVENT_LOG_PARTITIONS_AHEAD_DAYS = int(os.getenv("EVENT_LOG_PARTITIONS_AHEAD_DAYS", "7")) # Create partitions this far ahead
+# Retention deletes raw events for good, so it is off unless you ask for it: 0 (the
+# default) keeps every event forever. To enable it, set EVENT_LOG_RETENTION_DAYS to
+# the number of days to keep (e.g. 90), and pick EVENT_LOG_RETENTION_MODE "archive"
+# or "detach" if old events should survive outside the live table. The maintenance
+# job (MAINTENANCE_ENABLED, hourly) then removes older events, starting at the next boot.
+EVENT_LOG_RETENTION_DAYS = int(os.getenv("EVENT_LOG_RETENTION_DAYS", "0"))
+EVENT_LOG_RETENTION_MODE = os.getenv("EVENT_LOG_RETENTION_MODE", "drop") # "drop", "detach" (keep the table) or "archive" (Parquet file, then drop)
+
+# Without partitions (SQLite, or PostgreSQL before the migration) retention falls
+# back to deleting old rows in small batches, so no single DELETE gets huge.
+RETENTION_DELETE_BATCH_SIZE = 10000
+
+PARENT_TABLE = "event_logs"
+# Partitions are named after the first day they hold, e.g. event_logs_p20251018.
+_PARTITION_NAME = re.compile(r"^event_logs_p(\d{8})$")
+# Several workers may run maintenance at once; a PostgreSQL advisory lock lets only one through.
+_MAINTENANCE_LOCK_ID = 7_406_117_116 # Arbitrary, but must stay stable
+
+def partition_start(day: date, interval: str = EVENT_LOG_PARTITION_INTERVAL) -> date:
+    """Returns the first day of the partition that holds `day` (weekly partitions start on Monday)."""
+    if interval == "weekly":
+        return day - timedelta(days=day.weekday())
+    return day
+
+def partition_step(interval: str = EVENT_LOG_PARTITION_INTERVAL) -> timedelta:
+    return timedelta(weeks=1) if interval == "weekly" else timedelta(days=1)
+
+def partition_name(start: date) -> str:
+    return f"{PARENT_TABLE}_p{start:%Y%m%d}"
+
+def is_partitioned(conn: Connection) -> bool:
+    """True if `event_logs` is a declaratively partitioned PostgreSQL table."""
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :table AND pg_table_is_visible(c.oid)"
+    ), {"table": PARENT_TABLE}).first() is not None
+
+def list_partitions(conn: Connection) -> list[tuple[str, date]]:
+    """Lists our date-named partitions of `event_logs` as (name, first day), oldest first."""
+    rows = conn.execute(text(
+        "SELECT child.relname FROM pg_inherits i "
+        "JOIN pg_class parent ON parent.oid = i.inhparent "
+        "JOIN pg_class child ON child.oid = i.inhrelid "
+        "WHERE parent.relname = :table AND pg_table_is_visible(parent.oid)"
+    ), {"table": PARENT_TABLE}).scalars()
+
+    partitions = []
+    for name in rows:
+        match = _PARTITION_NAME.match(name)
+        if match: # Skips the default partition
+            partitions.append((name, datetime.strptime(match.group(1), "%Y%m%d").date()))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+def ensure_partitions(conn: Connection, today: date | None = None, ahead_days: int = EVENT_LOG_PARTITIONS_AHEAD_DAYS) -> list[str]:
+    """
+    Makes sure partitions exist from the current one up to `ahead_days` ahead,
+    so incoming events never land in the default partition. Returns the names created.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    existing = {name for name, _ in list_partitions(conn)}
+    step = partition_step()
+
+    created = []
+    start = partition_start(today)
+    while start <= today + timedelta(days=ahead_days):
+        name = partition_name(start)
+        if name not in existing:
+            conn.execute(text(
+                f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF {PARENT_TABLE} '
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{(start + step).isoformat()}')"
+            ))
+            created.append(name)
+        start += step
+    return created
+
+def drop_expired_partitions(conn: Connection, retention_days: int = EVENT_LOG_RETENTION_DAYS, mode: str = EVENT_LOG_RETENTION_MODE, today: date | None = None) -> list[str]:
+    """
+    Detaches (and by default drops, or archives to Parquet then drops) every partition whose whole range is older than
+    the retention window. This is a metadata operation: no rows are deleted one by one.
+    Returns the names of the partitions that were removed.
+    """
+    if retention_days <= 0:
+        return []
+
+    cutoff = (today or datetime.now(timezone.utc).date()) - timedelta(days=retention_days)
+    step = partition_step()
+
+    removed = []
+    for name, start in list_partitions(conn):
+        if start + step > cutoff:
+            break # Sorted oldest first, so everything after this is still in use
+        if mode == "archive":
+            # Written while the partition is still attached, so a failed export leaves everything in place.
+            export.archive_partition(conn, name)
+        conn.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION "{name}"'))
+        if mode in ("drop", "archive"):
+            conn.execute(text(f'DROP TABLE "{name}"'))
+        removed.append(name)
+    return removed
+
+def delete_expired_events(engine: Engine, retention_days: int = EVENT_LOG_RETENTION_DAYS, batch_size: int = RETENTION_DELETE_BATCH_SIZE) -> int:
+    """
+    Retention fallback for unpartitioned tables: deletes events older than the
+    retention window in small batches, committing after each one.
+    Returns the number of rows deleted.
+    """
+    if retention_days <= 0:
+        return 0
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        with engine.begin() as conn:
+            expired_ids = select(models.EventLog.id).where(
+                models.EventLog.received_at < cutoff
+            ).limit(batch_size).scalar_subquery()
+            result = conn.execute(delete(models.EventLog).where(models.EventLog.id.in_(expired_ids)))
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+
+def run_partition_maintenance(engine: Engine = database.engine) -> dict:
+    """
+    The periodic job: creates upcoming partitions and enforces retention.
+    Safe to call from every worker; on PostgreSQL only one runs at a time.
+    """
+    with engine.connect() as conn:
+        is_postgresql = conn.dialect.name == "postgresql"
+        if is_postgresql:
+            # Session-level advisory lock: it survives the commits below.
+            locked = conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": _MAINTENANCE_LOCK_ID}).scalar()
+            conn.commit()
+            if not locked:
+                return {"skipped": "another worker is running maintenance"}
+
+        try:
+            if is_partitioned(conn):
+                created = ensure_partitions(conn)
+                conn.commit()
+                removed = drop_expired_partitions(conn)
+                conn.commit()
+                if created or removed:
+                    logger.info("event_logs partitions created=%s removed=%s", created, removed)
+                return {"created": created, "removed": removed}
+
+            conn.rollback()
+            deleted = delete_expired_events(engine)
+            if deleted:
+                logger.info("Deleted %d expired event_logs rows", deleted)
+            return {"deleted": deleted}
+        finally:
+            if is_postgresql:
+                conn.rollback() # In case a step above failed mid-transaction
+                conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _MAINTENANCE_LOCK_ID})
+                conn.commit()
+
+if __name__ == "__main__":
+    # Lets ops run maintenance by hand: `python -m app.partitions` from backend/.
+    logging.basicConfig(level=logging.INFO)
+    print(run_partition_maintenance())
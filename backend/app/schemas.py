@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, Dict, Any
-from datetime import datetime
+from datetime import date, datetime
 
 # =============================================================================
 # SECURITY & AUTH SCHEMAS
@@ -86,6 +86,8 @@ class EventHealth(BaseModel):
     emq_score: float
     last_received: datetime
     status: str # e.g., "healthy", "warning", "error"
+    # Share (0-1) of the events that carried each customer identifier; the EMQ is built from these.
+    identifier_coverage: Optional[Dict[str, float]] = None
 
 # NEW: Schema for the Health Monitor alerts
 class EventAlert(BaseModel):
@@ -96,12 +98,70 @@ class EventAlert(BaseModel):
     message: str
     timestamp: datetime
 
+# NEW: Schemas for the pixel event ingestion endpoint
+# The storefront snippet sends events in batches, so one request can carry many events.
+MAX_EVENTS_PER_BATCH = 1000
+
+class EventIngest(BaseModel):
+    """A single raw event as sent by the website snippet."""
+    event_name: str = Field(..., min_length=1, max_length=100) # e.g., "PageView", "Purchase"
+    event_time: datetime # When the event happened on the client
+    event_id: Optional[str] = Field(None, max_length=100) # Used for deduplication
+    event_source_url: Optional[str] = Field(None, max_length=2048)
+
+    # Optional user identifiers. IP and user agent fall back to the request's own values.
+    user_ip_address: Optional[str] = Field(None, max_length=64)
+    user_agent: Optional[str] = Field(None, max_length=512)
+    fbp: Optional[str] = Field(None, max_length=100)
+    fbc: Optional[str] = Field(None, max_length=255)
+    email: Optional[str] = Field(None, max_length=255)
+    phone: Optional[str] = Field(None, max_length=100)
+
+    # Basic purchase info if available
+    value: Optional[float] = Field(None, allow_inf_nan=False) # NaN would poison every revenue sum it touches
+    currency: Optional[str] = Field(None, max_length=10)
+
+class EventBatch(BaseModel):
+    """A batch of events sent in one request by the website snippet."""
+    events: list[EventIngest] = Field(..., min_length=1, max_length=MAX_EVENTS_PER_BATCH)
+
+class EventBatchResponse(BaseModel):
+    """The shape of the response after a batch of events is accepted."""
+    accepted: int
+
 class DashboardResponse(BaseModel):
     """The single source of truth for the frontend dashboard."""
     total_conversions_recovered: int
     overall_roas: float
     campaign_performance: list[Dict[str, Any]] # A list of campaign objects
     event_health_monitor: list[EventHealth]
+    alerts: list[EventAlert] = []
+    currency: Optional[str] = None # The currency ROAS and campaign revenue are reported in
+    attribution_window_days: Optional[int] = None
+
+# NEW: Event volume per time bucket, for charts and volume-drop checks.
+class EventVolumeSeries(BaseModel):
+    event_name: str
+    counts: list[int] # One per bucket, aligned with `buckets` (0 when nothing arrived)
+    total: int
+
+class EventTimeseriesResponse(BaseModel):
+    resolution: str # "minute", "hour" or "day"
+    buckets: list[datetime] # The start of each bucket, in UTC
+    series: list[EventVolumeSeries]
+
+# NEW: Ad spend reported per campaign and day, so we can compute ROAS.
+class CampaignSpendEntry(BaseModel):
+    day: date
+    campaign: str = Field(..., min_length=1, max_length=255) # Must match the utm_campaign (or utm_id) on the ads' links
+    spend: float = Field(..., ge=0, allow_inf_nan=False)
+    currency: Optional[str] = Field(None, max_length=10) # Defaults to the site's default currency
+
+class CampaignSpendBatch(BaseModel):
+    entries: list[CampaignSpendEntry] = Field(..., min_length=1, max_length=1000)
+
+class CampaignSpendResponse(BaseModel):
+    saved: int
 
 # =============================================================================
 # WAITLIST SCHEMAS
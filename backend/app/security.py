@@ -5,10 +5,15 @@ from passlib.context import CryptContext
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # We import these to interact with our database and schemas.
-from . import database, models, schemas
+from . import async_crud, crud, database, models, schemas
+from .cache import MISSING
+from .shared_cache import SharedCache
+from .executor import BoundedExecutor, ExecutorBusy
 
 # --- Configuration ---
 # Load secrets from environment variables.
@@ -24,8 +29,30 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 # A token will be valid for 30 minutes.
 
 # --- Password Hashing ---
+# The bcrypt cost factor. Each +1 doubles the work (12 takes roughly 250 ms).
+# Hashes made with a different cost are upgraded the next time their user logs in.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt runs in its own small thread pool (it releases the GIL while it works),
+# so a burst of logins can't take every worker thread from the rest of the API.
+PASSWORD_HASH_MAX_WORKERS = int(os.getenv("PASSWORD_HASH_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Logins waiting for a free hashing thread beyond this get a 503 right away.
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+
 # This creates a context for hashing and verifying passwords using bcrypt.
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Pinning min and max rounds to the configured cost makes any other cost "need an update".
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+password_hash_executor = BoundedExecutor(
+    name="password-hash",
+    max_workers=PASSWORD_HASH_MAX_WORKERS,
+    max_queue=PASSWORD_HASH_MAX_QUEUE,
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifies a plain password against its hashed version."""
@@ -35,6 +62,25 @@ def get_password_hash(password: str) -> str:
     """Hashes a plain password."""
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Verifies a password on the hashing pool. Returns (is_valid, new_hash):
+    `new_hash` is set when the stored hash uses outdated parameters and should be
+    replaced. Raises ExecutorBusy when too many hashes are already waiting.
+    """
+    return await password_hash_executor.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hashes a password on the hashing pool. Raises ExecutorBusy when it is saturated."""
+    return await password_hash_executor.run(pwd_context.hash, password)
+
+def password_hashing_busy_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-in attempts right now. Please try again in a moment.",
+        headers={"Retry-After": "1"},
+    )
+
 # --- JWT (Token) Handling ---
 # This is the "Locksmith" that creates the JWT.
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -51,30 +97,211 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 # This tells FastAPI where to look for the token (in the Authorization header).
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login")
 
-# --- The "Bouncer" Dependency ---
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)) -> models.User:
-    """
-    Decodes a JWT, validates it, and fetches the corresponding user from the database.
-    This function will be a dependency for all protected endpoints.
-    """
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def decode_access_token(token: str) -> schemas.TokenData:
+    """
+    Decodes and validates a JWT, returning the data embedded in it.
+    Raises a 401 if the token is invalid, expired or has no usable subject.
+    """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: Optional[str] = payload.get("sub")
         if user_id is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(user_id=int(user_id))
+            raise _credentials_exception()
+        return schemas.TokenData(user_id=int(user_id))
     except (JWTError, ValueError):
         # Catches any decoding errors or if the user_id isn't a valid integer.
-        raise credentials_exception
-    
+        raise _credentials_exception()
+
+# --- Principal Cache ---
+# The dashboard fires several protected requests at once, and each one used to
+# look the same user up again. We keep a short-lived copy of each resolved user
+# (keyed by user id) so hot sessions skip that SELECT entirely.
+# The token itself is still decoded and checked on every request.
+# With the Redis cache backend the copies are shared by all workers, and a change
+# to a user evicts it in every one of them.
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+
+principal_cache = SharedCache("principal", maxsize=PRINCIPAL_CACHE_MAX_ENTRIES, ttl_seconds=PRINCIPAL_CACHE_TTL_SECONDS)
+
+# Only plain column values are cached, never the ORM object itself.
+_PRINCIPAL_FIELDS = ("id", "name", "email", "registered_at")
+
+def _principal_snapshot(user: models.User) -> dict:
+    return {field: getattr(user, field) for field in _PRINCIPAL_FIELDS}
+
+def _principal_from_snapshot(snapshot) -> models.User | None:
+    """
+    Rebuilds a User from the cache. Every request gets its own fresh object in the
+    "detached" state: its columns are readable, it isn't tied to any session,
+    and it can be merged into one if an endpoint ever needs that.
+    """
+    if snapshot is MISSING:
+        return None
+    user = models.User(**snapshot)
+    make_transient_to_detached(user)
+    return user
+
+def _cache_principal(user: models.User) -> None:
+    principal_cache.set(user.id, _principal_snapshot(user))
+
+def _get_cached_principal(user_id: int) -> models.User | None:
+    return _principal_from_snapshot(principal_cache.get(user_id))
+
+# The async dependencies use these, so a cache lookup never blocks the event loop.
+async def _cache_principal_async(user: models.User) -> None:
+    await principal_cache.aset(user.id, _principal_snapshot(user))
+
+async def _get_cached_principal_async(user_id: int) -> models.User | None:
+    return _principal_from_snapshot(await principal_cache.aget(user_id))
+
+def invalidate_principal(user_id: int) -> None:
+    """Drops a user from the principal cache. Call this whenever a user changes."""
+    principal_cache.delete(user_id)
+
+# --- Evicting after commit ---
+# The flush hooks below evict an entry as soon as the change is sent to the
+# database, but until the transaction commits other requests still read the old
+# row and could cache it again. So each flush hook also notes the key on the
+# session, and the entry is evicted once more right after the commit.
+_EVICT_AFTER_COMMIT = "evict_after_commit"
+
+def _evict_now_and_after_commit(target, invalidate) -> None:
+    invalidate(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_EVICT_AFTER_COMMIT, set()).add((invalidate, target.id))
+
+@event.listens_for(Session, "after_commit")
+def _evict_committed_changes(session: Session) -> None:
+    for invalidate, key in session.info.pop(_EVICT_AFTER_COMMIT, ()):
+        invalidate(key)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_changes(session: Session) -> None:
+    # The flush hooks already evicted these, and nothing changed in the database.
+    session.info.pop(_EVICT_AFTER_COMMIT, None)
+
+# Any change to a User through the ORM evicts it automatically.
+# (Bulk `update()`/`delete()` statements bypass these hooks and must call
+# `invalidate_principal` themselves.)
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_principal_on_change(mapper, connection, target: models.User) -> None:
+    _evict_now_and_after_commit(target, invalidate_principal)
+
+# --- The "Bouncer" Dependency ---
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)) -> models.User:
+    """
+    Decodes a JWT, validates it, and fetches the corresponding user from the database.
+    This function will be a dependency for all protected endpoints.
+    Recently seen users come from the principal cache instead of the database.
+    """
+    token_data = decode_access_token(token)
+
+    user = _get_cached_principal(token_data.user_id)
+    if user is not None:
+        return user
+
     user = db.query(models.User).filter(models.User.id == token_data.user_id).first()
-    
+
+    if user is None:
+        raise _credentials_exception()
+
+    _cache_principal(user)
+    return user
+
+# The same "Bouncer" for `async def` endpoints. It uses the async session so
+# authentication never blocks the event loop.
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(database.get_async_db)) -> models.User:
+    """Async version of `get_current_user`, sharing the same principal cache."""
+    token_data = decode_access_token(token)
+
+    user = await _get_cached_principal_async(token_data.user_id)
+    if user is not None:
+        return user
+
+    user = await db.get(models.User, token_data.user_id)
+
     if user is None:
-        raise credentials_exception
-        
+        raise _credentials_exception()
+
+    await _cache_principal_async(user)
     return user
+
+# --- Website Ownership Cache ---
+# Every website-scoped endpoint starts with "does this user own this website?".
+# The answer rarely changes, so we remember website_id -> owner_id for a while.
+# Only websites that exist are cached: the public ingest endpoint checks ids
+# anyone can make up, and those misses must not be able to fill the cache.
+OWNERSHIP_CACHE_TTL_SECONDS = float(os.getenv("OWNERSHIP_CACHE_TTL_SECONDS", "300"))
+OWNERSHIP_CACHE_MAX_ENTRIES = int(os.getenv("OWNERSHIP_CACHE_MAX_ENTRIES", "50000"))
+
+website_owner_cache = SharedCache("website-owner", maxsize=OWNERSHIP_CACHE_MAX_ENTRIES, ttl_seconds=OWNERSHIP_CACHE_TTL_SECONDS)
+
+def invalidate_website_owner(website_id: int) -> None:
+    """Drops a website from the ownership cache. Call this when a website changes hands."""
+    website_owner_cache.delete(website_id)
+
+# Creating, transferring (changing user_id) or deleting a website evicts it automatically.
+@event.listens_for(models.Website, "after_insert")
+@event.listens_for(models.Website, "after_update")
+@event.listens_for(models.Website, "after_delete")
+def _invalidate_website_owner_on_change(mapper, connection, target: models.Website) -> None:
+    _evict_now_and_after_commit(target, invalidate_website_owner)
+
+def get_website_owner_id(db: Session, website_id: int) -> int | None:
+    """Returns the website's owner id (None if it doesn't exist), using the cache first for existing websites."""
+    owner_id = website_owner_cache.get(website_id)
+    if owner_id is MISSING:
+        owner_id = crud.get_website_owner_id(db, website_id)
+        if owner_id is not None:
+            website_owner_cache.set(website_id, owner_id)
+    return owner_id
+
+async def get_website_owner_id_async(db: AsyncSession, website_id: int) -> int | None:
+    """Async version of `get_website_owner_id`, sharing the same cache."""
+    owner_id = await website_owner_cache.aget(website_id)
+    if owner_id is MISSING:
+        owner_id = await async_crud.get_website_owner_id(db, website_id)
+        if owner_id is not None:
+            await website_owner_cache.aset(website_id, owner_id)
+    return owner_id
+
+def _website_not_found_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Website not found or you do not have permission to access it."
+    )
+
+# --- The "Ownership Bouncer" Dependency ---
+def get_owned_website_id(
+    website_id: int,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(database.get_db)
+) -> int:
+    """
+    Resolves ownership of the `{website_id}` in the path once per request.
+    Returns the website id if the current user owns it, otherwise raises a 404
+    (we don't reveal whether the website exists at all).
+    """
+    if get_website_owner_id(db, website_id) != current_user.id:
+        raise _website_not_found_exception()
+    return website_id
+
+async def get_owned_website_id_async(
+    website_id: int,
+    current_user: models.User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(database.get_async_db)
+) -> int:
+    """Async version of `get_owned_website_id`."""
+    if await get_website_owner_id_async(db, website_id) != current_user.id:
+        raise _website_not_found_exception()
+    return website_id
@@ -0,0 +1,415 @@
+import os
+import json
+import logging
+import queue
+import threading
+from datetime import datetime
+from typing import Any, Callable, Hashable
+
+from .cache import MISSING, TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Caches shared by every uvicorn worker.
+#
+# Each worker keeps its own in-memory copy of hot entries (the "local" level, a
+# TTLCache) so most reads cost nothing. With CACHE_BACKEND=redis there is also a
+# shared level in Redis: a worker that misses locally looks there before going to
+# the database, and every invalidation is broadcast over Redis pub/sub so all the
+# other workers drop their local copies too. With the default "memory" backend
+# each worker simply caches on its own, exactly like before.
+
+# --- Configuration ---
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory") # "memory" or "redis"
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "claritytracking")
+# Cache lookups happen inline on the request path, so they must fail fast. Async
+# endpoints await them on the event loop (see SharedCache.aget/aset); only the sync
+# ones, which already run in the threadpool, make blocking calls.
+CACHE_REDIS_TIMEOUT_SECONDS = float(os.getenv("CACHE_REDIS_TIMEOUT_SECONDS", "0.1"))
+
+# =============================================================================
+# VALUE ENCODING
+# =============================================================================
+
+def _encode_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if hasattr(value, "model_dump"): # Pydantic models (e.g. cached response items)
+        return value.model_dump()
+    raise TypeError(f"{type(value).__name__} can't be stored in the shared cache")
+
+def _decode_object(data: dict) -> Any:
+    if len(data) == 1 and "__datetime__" in data:
+        return datetime.fromisoformat(data["__datetime__"])
+    return data
+
+def encode_value(value: Any) -> str:
+    """JSON, not pickle: whatever is in Redis must never be able to run code in the API."""
+    return json.dumps(value, default=_encode_default, separators=(",", ":"))
+
+def decode_value(data: bytes | str) -> Any:
+    return json.loads(data, object_hook=_decode_object)
+
+def _key_to_json(key: Hashable) -> Any:
+    return list(key) if isinstance(key, tuple) else key
+
+def _key_from_json(key: Any) -> Hashable:
+    return tuple(key) if isinstance(key, list) else key
+
+def _key_string(key: Hashable) -> str:
+    return ":".join(map(str, key)) if isinstance(key, tuple) else str(key)
+
+# =============================================================================
+# BACKENDS
+# =============================================================================
+
+class MemoryBackend:
+    """No shared level: every worker caches on its own and invalidations stay local."""
+    name = "memory"
+
+    def register(self, cache: "SharedCache") -> None:
+        pass
+
+    def get(self, namespace: str, key: Hashable) -> Any:
+        return MISSING
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl_seconds: float) -> None:
+        pass
+
+    async def aget(self, namespace: str, key: Hashable) -> Any:
+        return MISSING
+
+    async def aset(self, namespace: str, key: Hashable, value: Any, ttl_seconds: float) -> None:
+        pass
+
+    def invalidate(self, namespace: str, key: Hashable) -> None:
+        pass
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+class RedisBackend:
+    """
+    A shared level in Redis (or anything speaking its protocol), plus pub/sub
+    invalidation. Invalidations are handed to a background thread, which deletes
+    the keys and publishes them in one pipeline, so a burst of writes costs one
+    round trip and never blocks a request. Any Redis error is treated like a miss:
+    the cache must never take the API down with it.
+    Lookups from async code go through a second, asyncio client (`aget`/`aset`),
+    so a slow Redis never stalls the event loop.
+    """
+    name = "redis"
+
+    def __init__(self, client=None, async_client=None, url: str = CACHE_REDIS_URL, prefix: str = CACHE_KEY_PREFIX):
+        if client is None or async_client is None:
+            import redis # Optional dependency, only needed with CACHE_BACKEND=redis
+            import redis.asyncio
+            options = {"socket_timeout": CACHE_REDIS_TIMEOUT_SECONDS, "socket_connect_timeout": CACHE_REDIS_TIMEOUT_SECONDS}
+            client = client if client is not None else redis.Redis.from_url(url, **options)
+            # Its connections are opened lazily, on the loop that first uses them.
+            async_client = async_client if async_client is not None else redis.asyncio.Redis.from_url(url, **options)
+        self.client = client
+        self.async_client = async_client
+        self.prefix = prefix
+        self.channel = f"{prefix}:cache-invalidation"
+        # Tells our own broadcasts apart from the other workers'.
+        self.sender_id = f"{os.getpid():x}-{id(self):x}"
+        self._caches: dict[str, SharedCache] = {}
+        self._pending: queue.Queue = queue.Queue()
+        self._stop_event = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._pubsub = None
+
+        self.remote_hits = 0
+        self.remote_misses = 0
+        self.errors = 0
+        self.invalidations_published = 0
+        self.invalidations_received = 0
+
+    def _redis_key(self, namespace: str, key: Hashable) -> str:
+        return f"{self.prefix}:{namespace}:{_key_string(key)}"
+
+    def register(self, cache: "SharedCache") -> None:
+        self._caches[cache.namespace] = cache
+
+    def _decode_hit(self, data: bytes | None) -> Any:
+        if data is None:
+            self.remote_misses += 1
+            return MISSING
+        self.remote_hits += 1
+        return decode_value(data)
+
+    def get(self, namespace: str, key: Hashable) -> Any:
+        try:
+            data = self.client.get(self._redis_key(namespace, key))
+        except Exception:
+            self.errors += 1
+            return MISSING
+        return self._decode_hit(data)
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl_seconds: float) -> None:
+        try:
+            self.client.set(self._redis_key(namespace, key), encode_value(value), px=max(1, int(ttl_seconds * 1000)))
+        except Exception:
+            self.errors += 1
+
+    async def aget(self, namespace: str, key: Hashable) -> Any:
+        try:
+            data = await self.async_client.get(self._redis_key(namespace, key))
+        except Exception:
+            self.errors += 1
+            return MISSING
+        return self._decode_hit(data)
+
+    async def aset(self, namespace: str, key: Hashable, value: Any, ttl_seconds: float) -> None:
+        try:
+            await self.async_client.set(self._redis_key(namespace, key), encode_value(value), px=max(1, int(ttl_seconds * 1000)))
+        except Exception:
+            self.errors += 1
+
+    def invalidate(self, namespace: str, key: Hashable) -> None:
+        self._pending.put((namespace, key))
+        if not self._threads: # Not started (scripts, benchmarks): publish right away
+            self._publish_pending()
+
+    # --- Background threads ---
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stop_event.clear()
+        self._threads = [
+            threading.Thread(target=self._run_publisher, name="cache-invalidation-publisher", daemon=True),
+            threading.Thread(target=self._run_subscriber, name="cache-invalidation-subscriber", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        if not self._threads:
+            return
+        self._stop_event.set()
+        self._pending.put(None) # Wakes the publisher
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+        self._publish_pending() # Whatever was queued after the publisher left
+
+    async def aclose(self) -> None:
+        """Closes the asyncio client's connections (on the loop that opened them)."""
+        try:
+            await self.async_client.aclose()
+        except Exception:
+            logger.warning("Could not close the async Redis client", exc_info=True)
+
+    def _publish_pending(self) -> None:
+        """Deletes and broadcasts everything queued so far, in one pipeline."""
+        keys = set()
+        while True:
+            try:
+                item = self._pending.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                keys.add(item)
+        if not keys:
+            return
+        message = json.dumps({"sender": self.sender_id, "keys": [[namespace, _key_to_json(key)] for namespace, key in keys]})
+        try:
+            pipeline = self.client.pipeline(transaction=False)
+            pipeline.delete(*(self._redis_key(namespace, key) for namespace, key in keys))
+            pipeline.publish(self.channel, message)
+            pipeline.execute()
+            self.invalidations_published += len(keys)
+        except Exception:
+            self.errors += 1
+            logger.warning("Could not publish %d cache invalidations", len(keys), exc_info=True)
+
+    def _run_publisher(self) -> None:
+        while not self._stop_event.is_set():
+            first = self._pending.get()
+            if first is not None:
+                self._pending.put(first)
+            self._publish_pending()
+
+    def handle_message(self, data: bytes | str) -> None:
+        """Evicts the local copies named in another worker's broadcast."""
+        message = json.loads(data)
+        if message.get("sender") == self.sender_id:
+            return # We already evicted these locally
+        for namespace, key in message.get("keys", []):
+            cache = self._caches.get(namespace)
+            if cache is not None:
+                cache.evict_local(_key_from_json(key))
+                self.invalidations_received += 1
+
+    def _run_subscriber(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                self._pubsub.subscribe(self.channel)
+                # While we weren't listening, other workers may have invalidated entries.
+                for cache in self._caches.values():
+                    cache.clear()
+                while not self._stop_event.is_set():
+                    message = self._pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        self.handle_message(message["data"])
+            except Exception:
+                self.errors += 1
+                logger.warning("Cache invalidation subscriber lost Redis, reconnecting", exc_info=True)
+                self._stop_event.wait(1.0)
+            finally:
+                if self._pubsub is not None:
+                    try:
+                        self._pubsub.close()
+                    except Exception:
+                        pass
+                    self._pubsub = None
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "remote_hits": self.remote_hits,
+            "remote_misses": self.remote_misses,
+            "errors": self.errors,
+            "invalidations_published": self.invalidations_published,
+            "invalidations_received": self.invalidations_received,
+        }
+
+def create_backend(name: str = CACHE_BACKEND):
+    if name == "redis":
+        return RedisBackend()
+    if name != "memory":
+        raise RuntimeError(f"Unknown CACHE_BACKEND {name!r} (expected 'memory' or 'redis')")
+    return MemoryBackend()
+
+# =============================================================================
+# THE CACHE
+# =============================================================================
+
+class SharedCache:
+    """
+    A TTLCache-compatible cache (get/set/delete/clear) with a local level in this
+    worker and, depending on the backend, a shared level behind it.
+    `delete` is the invalidation: it evicts the entry in every worker.
+    Values must be JSON-friendly (plus datetimes and pydantic models).
+    """
+
+    def __init__(self, namespace: str, maxsize: int, ttl_seconds: float, backend=None):
+        self.namespace = namespace
+        self.local = TTLCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+        self.backend = backend if backend is not None else cache_backend
+        self.backend.register(self)
+        self._eviction_listeners: list[Callable[[Hashable], None]] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.local.enabled
+
+    @property
+    def maxsize(self) -> int:
+        return self.local.maxsize
+
+    @property
+    def ttl_seconds(self) -> float:
+        return self.local.ttl_seconds
+
+    @property
+    def hits(self) -> int:
+        return self.local.hits
+
+    @property
+    def misses(self) -> int:
+        return self.local.misses
+
+    def __len__(self) -> int:
+        return len(self.local)
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        value = self.local.get(key)
+        if value is not MISSING:
+            return value
+        if not self.enabled:
+            return default
+        value = self.backend.get(self.namespace, key)
+        if value is MISSING:
+            return default
+        self.local.set(key, value)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if not self.enabled:
+            return
+        self.local.set(key, value)
+        self.backend.set(self.namespace, key, value, self.ttl_seconds)
+
+    # The same two for async code: the shared level is read and written with awaits.
+    # (`delete` needs no async twin: invalidations are queued for the publisher thread.)
+
+    async def aget(self, key: Hashable, default: Any = MISSING) -> Any:
+        value = self.local.get(key)
+        if value is not MISSING:
+            return value
+        if not self.enabled:
+            return default
+        value = await self.backend.aget(self.namespace, key)
+        if value is MISSING:
+            return default
+        self.local.set(key, value)
+        return value
+
+    async def aset(self, key: Hashable, value: Any) -> None:
+        if not self.enabled:
+            return
+        self.local.set(key, value)
+        await self.backend.aset(self.namespace, key, value, self.ttl_seconds)
+
+    def delete(self, key: Hashable) -> None:
+        self.local.delete(key)
+        self.backend.invalidate(self.namespace, key)
+
+    def evict_local(self, key: Hashable) -> None:
+        """Drops only this worker's copy (used when another worker broadcasts an invalidation)."""
+        self.local.delete(key)
+        for listener in list(self._eviction_listeners):
+            listener(key)
+
+    def add_eviction_listener(self, listener: Callable[[Hashable], None]) -> None:
+        """
+        Calls `listener(key)` whenever another worker invalidates `key`: the only way
+        this worker hears about their writes. It runs on the subscriber thread, so it
+        must be quick and thread-safe. (With the memory backend it is never called.)
+        """
+        self._eviction_listeners.append(listener)
+
+    def remove_eviction_listener(self, listener: Callable[[Hashable], None]) -> None:
+        if listener in self._eviction_listeners:
+            self._eviction_listeners.remove(listener)
+
+    def clear(self) -> None:
+        """Clears this worker's copies; the shared level expires on its own."""
+        self.local.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.local),
+            "max_entries": self.maxsize,
+            "ttl_seconds": self.ttl_seconds,
+            "local_hits": self.local.hits,
+            "local_misses": self.local.misses,
+        }
+
+# The backend shared by every cache in this worker, chosen by CACHE_BACKEND.
+# Its background threads are started and stopped by the app's lifespan.
+cache_backend = create_backend()
@@ -0,0 +1,258 @@
+import os
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from . import crud, models
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+# How long each resolution is kept, in days. 0 keeps it forever.
+TIMESERIES_MINUTE_RETENTION_DAYS = int(os.getenv("TIMESERIES_MINUTE_RETENTION_DAYS", "3"))
+TIMESERIES_HOUR_RETENTION_DAYS = int(os.getenv("TIMESERIES_HOUR_RETENTION_DAYS", "90"))
+TIMESERIES_DAY_RETENTION_DAYS = int(os.getenv("TIMESERIES_DAY_RETENTION_DAYS", "0"))
+# The most buckets one time-series response holds per event type. The endpoint picks
+# the finest resolution that fits, so any range comes back in a bounded number of rows.
+TIMESERIES_MAX_POINTS = int(os.getenv("TIMESERIES_MAX_POINTS", "1500"))
+
+class Resolution(NamedTuple):
+    name: str
+    model: type
+    step: timedelta
+    retention_days: int
+
+# Finest first: each level is rolled up into the next one.
+RESOLUTIONS = {
+    "minute": Resolution("minute", models.EventVolumeMinute, timedelta(minutes=1), TIMESERIES_MINUTE_RETENTION_DAYS),
+    "hour": Resolution("hour", models.EventVolumeHour, timedelta(hours=1), TIMESERIES_HOUR_RETENTION_DAYS),
+    "day": Resolution("day", models.EventVolumeDay, timedelta(days=1), TIMESERIES_DAY_RETENTION_DAYS),
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+def _naive_utc(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+def bucket_start(value: datetime, step: timedelta) -> datetime:
+    """The start of the (UTC) bucket of size `step` that `value` falls in."""
+    value = _naive_utc(value)
+    return _EPOCH + (value - _EPOCH) // step * step
+
+# =============================================================================
+# INCREMENTAL UPDATES (called for every flushed batch of events)
+# =============================================================================
+
+# Every bucket counts its events and, like the health rollup, how many of them
+# carried each customer identifier (see crud.IDENTIFIER_COUNTERS).
+VOLUME_COUNTERS = ("event_count", *crud.IDENTIFIER_COUNTERS)
+
+def aggregate_volumes(rows: list[dict]) -> dict[str, list[dict]]:
+    """
+    Counts a batch of event rows per (website, minute, event_name), then rolls those
+    counts up into hours and days. Returns one list of deltas per resolution.
+    """
+    levels: dict[str, dict[tuple, Counter]] = {}
+    previous = None
+    for resolution in RESOLUTIONS.values():
+        counts: dict[tuple, Counter] = {}
+        if previous is None:
+            for row in rows:
+                bucket = counts.setdefault((row["website_id"], bucket_start(row["received_at"], resolution.step), row["event_name"]), Counter())
+                bucket["event_count"] += 1
+                for counter, column in crud.IDENTIFIER_COUNTERS.items():
+                    if row.get(column):
+                        bucket[counter] += 1
+        else:
+            for (website_id, start, event_name), bucket in previous.items():
+                counts.setdefault((website_id, bucket_start(start, resolution.step), event_name), Counter()).update(bucket)
+        levels[resolution.name] = previous = counts
+
+    return {
+        name: [
+            {
+                "website_id": website_id, "bucket_start": start, "event_name": event_name,
+                **{counter: bucket[counter] for counter in VOLUME_COUNTERS},
+            }
+            for (website_id, start, event_name), bucket in counts.items()
+        ]
+        for name, counts in levels.items()
+    }
+
+def build_volume_upsert(dialect_name: str, model: type, deltas: list[dict]):
+    """Adds a batch's counts onto the existing buckets of one resolution (or creates them)."""
+    stmt = crud.upsert_dialect_insert(dialect_name, model).values(deltas)
+    return stmt.on_conflict_do_update(
+        index_elements=[model.website_id, model.bucket_start, model.event_name],
+        set_={counter: getattr(model, counter) + getattr(stmt.excluded, counter) for counter in VOLUME_COUNTERS},
+    )
+
+def record_events(db: Session | Connection, rows: list[dict]) -> None:
+    """
+    Folds a batch of freshly written event rows into the minute, hour and day tables.
+    Runs in the ingest flush's transaction, next to the health rollup. The caller commits.
+    """
+    if not rows:
+        return
+    dialect_name = db.get_bind().dialect.name if isinstance(db, Session) else db.dialect.name
+    for name, deltas in aggregate_volumes(rows).items():
+        db.execute(build_volume_upsert(dialect_name, RESOLUTIONS[name].model, deltas))
+
+# =============================================================================
+# RETENTION
+# =============================================================================
+
+def retained_since(resolution: Resolution, now: datetime) -> datetime | None:
+    """The oldest bucket a resolution still keeps (None when it is kept forever)."""
+    if resolution.retention_days <= 0:
+        return None
+    return bucket_start(now - timedelta(days=resolution.retention_days), resolution.step)
+
+def prune_expired_buckets(engine: Engine, now: datetime | None = None) -> dict:
+    """
+    The periodic job: deletes the buckets each resolution no longer keeps.
+    It runs often enough (see MAINTENANCE_INTERVAL_SECONDS) that each run only
+    removes a short stretch of time, so one DELETE per table is enough.
+    """
+    now = now or datetime.now(timezone.utc)
+    deleted = {}
+    with engine.begin() as conn:
+        for resolution in RESOLUTIONS.values():
+            cutoff = retained_since(resolution, now)
+            if cutoff is None:
+                continue
+            model = resolution.model
+            deleted[resolution.name] = conn.execute(delete(model).where(model.bucket_start < cutoff)).rowcount
+    if any(deleted.values()):
+        logger.info("Pruned expired event volume buckets: %s", deleted)
+    return deleted
+
+def check_window_retention(window_hours: int) -> None:
+    """
+    The health and alert summaries read their counts from the volume buckets (see
+    crud.window_counts_query): whole hours from the hourly table, the window's first
+    partial hour from the minute table. Refuses to start if either is pruned before
+    the window ends, since the summaries would quietly count only part of it.
+    """
+    for name in ("minute", "hour"):
+        retention_days = RESOLUTIONS[name].retention_days
+        if 0 < retention_days and retention_days * 24 < window_hours:
+            raise RuntimeError(
+                f"TIMESERIES_{name.upper()}_RETENTION_DAYS={retention_days} is shorter than the "
+                f"{window_hours}h health window; keep at least {-(-window_hours // 24)} days"
+            )
+
+# =============================================================================
+# READING
+# =============================================================================
+
+def bucket_count(start: datetime, end: datetime, step: timedelta) -> int:
+    """How many buckets of size `step` the range [start, end) touches."""
+    first = bucket_start(start, step)
+    return -(-(_naive_utc(end) - first) // step) # Rounded up
+
+def choose_resolution(start: datetime, end: datetime, requested: str | None = None, now: datetime | None = None) -> Resolution:
+    """
+    The resolution to read [start, end) at: the requested one, or else the finest one
+    that both still holds data from `start` and fits in TIMESERIES_MAX_POINTS buckets.
+    Raises ValueError when the range can't be served.
+    """
+    now = now or datetime.now(timezone.utc)
+    candidates = [RESOLUTIONS[requested]] if requested else list(RESOLUTIONS.values())
+    for resolution in candidates:
+        cutoff = retained_since(resolution, now)
+        too_old = cutoff is not None and _naive_utc(start) < cutoff
+        too_many = bucket_count(start, end, resolution.step) > TIMESERIES_MAX_POINTS
+        if not too_old and not too_many:
+            return resolution
+        if requested and too_old:
+            raise ValueError(f"{resolution.name} buckets are only kept for {resolution.retention_days} days; use a coarser resolution.")
+        if requested:
+            raise ValueError(f"That range has more than {TIMESERIES_MAX_POINTS} {resolution.name} buckets; use a coarser resolution or a shorter range.")
+    raise ValueError(f"That range is too long: it has more than {TIMESERIES_MAX_POINTS} daily buckets.")
+
+def volume_query(resolution: Resolution, website_id: int, start: datetime, end: datetime, event_name: str | None = None):
+    """One website's buckets in [start, end) at one resolution (empty buckets have no row)."""
+    model = resolution.model
+    query = select(model.bucket_start, model.event_name, model.event_count).where(
+        model.website_id == website_id,
+        model.bucket_start >= bucket_start(start, resolution.step),
+        model.bucket_start < _naive_utc(end),
+    )
+    if event_name is not None:
+        query = query.where(model.event_name == event_name)
+    return query
+
+def build_series(rows: list, resolution: Resolution, start: datetime, end: datetime) -> dict:
+    """
+    Turns bucket rows into the response: the bucket start times, and one list of
+    counts per event type aligned with them (missing buckets filled in as 0).
+    """
+    first = bucket_start(start, resolution.step)
+    buckets = [first + resolution.step * index for index in range(bucket_count(start, end, resolution.step))]
+    positions = {bucket: index for index, bucket in enumerate(buckets)}
+
+    series: dict[str, list[int]] = {}
+    for bucket, event_name, count in rows:
+        counts = series.setdefault(event_name, [0] * len(buckets))
+        counts[positions[bucket]] += count
+
+    return {
+        "resolution": resolution.name,
+        "buckets": [crud.as_utc(bucket) for bucket in buckets],
+        "series": [
+            {"event_name": event_name, "counts": counts, "total": sum(counts)}
+            for event_name, counts in sorted(series.items())
+        ],
+    }
+
+def get_event_timeseries(db: Session, website_id: int, start: datetime, end: datetime, resolution: str | None = None, event_name: str | None = None) -> dict:
+    """Event counts per bucket for a website and range (see `choose_resolution`)."""
+    chosen = choose_resolution(start, end, resolution)
+    rows = db.execute(volume_query(chosen, website_id, start, end, event_name)).all()
+    return build_series(rows, chosen, start, end)
+
+def rebuild(engine: Engine, website_id: int | None = None) -> int:
+    """
+    Recounts all three resolutions from event_logs (e.g. after the upgrades that added
+    them and their identifier counters), streaming the events through the same code as the ingest flush, then
+    prunes what retention wouldn't keep. Returns the number of events counted.
+    Pause ingestion while it runs: a batch flushed mid-rebuild could be counted twice.
+    """
+    event_logs = models.EventLog.__table__
+    query = select(
+        event_logs.c.website_id, event_logs.c.received_at, event_logs.c.event_name,
+        *(event_logs.c[column] for column in crud.IDENTIFIER_COUNTERS.values()),
+    )
+    if website_id is not None:
+        query = query.where(event_logs.c.website_id == website_id)
+
+    counted = 0
+    with Session(engine) as db:
+        for resolution in RESOLUTIONS.values():
+            stmt = delete(resolution.model)
+            if website_id is not None:
+                stmt = stmt.where(resolution.model.website_id == website_id)
+            db.execute(stmt)
+
+        with engine.connect() as reader: # A second connection, so the upserts don't disturb the open cursor
+            for rows in crud.stream_query(reader, query):
+                record_events(db, [row._asdict() for row in rows])
+                counted += len(rows)
+        db.commit()
+    prune_expired_buckets(engine)
+    logger.info("Rebuilt event volume time series from %d events", counted)
+    return counted
+
+if __name__ == "__main__":
+    # Backfills the time series by hand: `python -m app.timeseries [WEBSITE_ID]` from backend/.
+    import sys
+    from . import database
+
+    logging.basicConfig(level=logging.INFO)
+    print(rebuild(database.engine, int(sys.argv[1]) if len(sys.argv) > 1 else None))
@@ -0,0 +1,50 @@
+"""Helpers shared by the benchmark scripts."""
+import json
+import os
+import statistics
+import sys
+
+# Make the `app` package importable, just like alembic/env.py does.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Defaults shared by the seeder and the load test.
+DEFAULT_MANIFEST = "bench_seed.json"
+BENCH_PASSWORD = "benchmark-password"
+
+def log(message: str) -> None:
+    """Progress goes to stderr, so stdout stays clean JSON."""
+    print(message, file=sys.stderr, flush=True)
+
+def percentile(sorted_values: list[float], share: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * share))]
+
+def summarize_latencies(latencies_ms: list[float], elapsed_seconds: float | None = None) -> dict:
+    """p50/p90/p99/max of a list of latencies, plus throughput when the wall time is known."""
+    values = sorted(latencies_ms)
+    summary = {
+        "count": len(values),
+        "p50_ms": round(statistics.median(values), 3) if values else 0.0,
+        "p90_ms": round(percentile(values, 0.90), 3),
+        "p99_ms": round(percentile(values, 0.99), 3),
+        "max_ms": round(values[-1], 3) if values else 0.0,
+    }
+    if elapsed_seconds:
+        summary["throughput_per_second"] = round(len(values) / elapsed_seconds, 1)
+    return summary
+
+def write_json(data: dict, path: str | None = None) -> None:
+    """Prints results as JSON, and also saves them to `path` when one is given."""
+    text = json.dumps(data, indent=2, default=str)
+    print(text)
+    if path:
+        with open(path, "w") as output:
+            output.write(text + "\n")
+
+def website_owner(website_id: int, users: int) -> int:
+    """The seeder hands websites to users round-robin; this is who owns which."""
+    return (website_id - 1) % users + 1
+
+def user_email(user_id: int) -> str:
+    return f"bench-user-{user_id}@example.com"
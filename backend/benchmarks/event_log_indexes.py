@@ -0,0 +1,197 @@
+"""
+Benchmark: event_logs query plans and latency before/after the composite indexes.
+
+Seeds a database with a multi-million-row event_logs table, then runs the two
+query shapes that still read event_logs (one website's events over a time range,
+as the listing and export do, and duplicate event_ids) twice:
+once with the old single-column indexes and once with the composite indexes
+from migration 934f9471319f. For each run it prints the query plan and the
+median latency.
+
+Usage (from the backend/ directory):
+
+    python -m benchmarks.event_log_indexes --rows 2000000
+    python -m benchmarks.event_log_indexes --database-url postgresql+psycopg://... --skip-seed
+
+Results are printed as JSON on stdout; plans and progress go to stderr.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, func, insert, select, text
+
+# Make the `app` package importable, just like alembic/env.py does.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Only the models are imported: app.database would connect to DATABASE_URL.
+from app import models
+
+EVENT_NAMES = ["PageView", "ViewContent", "AddToCart", "InitiateCheckout", "Purchase"]
+
+# Index sets, matching migration 934f9471319f.
+OLD_INDEXES = {
+    "ix_event_logs_id": "(id)",
+    "ix_event_logs_website_id": "(website_id)",
+    "ix_event_logs_event_name": "(event_name)",
+    "ix_event_logs_event_id": "(event_id)",
+}
+NEW_INDEXES = {
+    "ix_event_logs_website_event_id_received": "(website_id, event_id, received_at)",
+    "ix_event_logs_website_received": "(website_id, received_at)",
+}
+ALWAYS_INDEXES = {"ix_event_logs_received_at": "(received_at)"}
+
+def log(message: str) -> None:
+    print(message, file=sys.stderr, flush=True)
+
+def seed(engine, rows: int, websites: int, days: int, chunk_size: int = 20000) -> None:
+    """Creates the schema and fills event_logs with `rows` synthetic events."""
+    models.Base.metadata.drop_all(engine)
+    models.Base.metadata.create_all(engine)
+
+    with engine.begin() as conn:
+        # Loading is much faster without secondary indexes; they are built afterwards.
+        drop_indexes(conn, {**NEW_INDEXES, **ALWAYS_INDEXES})
+        conn.execute(insert(models.User), [{"id": 1, "name": "Bench", "email": "bench@example.com"}])
+        conn.execute(insert(models.Website), [
+            {"id": website_id, "user_id": 1, "url": f"https://shop{website_id}.example.com", "name": f"Shop {website_id}"}
+            for website_id in range(1, websites + 1)
+        ])
+
+    rng = random.Random(42)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    window_seconds = days * 24 * 3600
+    written = 0
+    while written < rows:
+        batch = []
+        for _ in range(min(chunk_size, rows - written)):
+            received_at = now - timedelta(seconds=rng.randrange(window_seconds))
+            batch.append({
+                "website_id": rng.randint(1, websites),
+                "received_at": received_at,
+                # ~2% of events reuse a recent event_id, like a double-firing pixel.
+                "event_id": f"evt-{rng.randrange(rows // 50 if rng.random() < 0.02 else rows * 10)}",
+                "event_name": rng.choice(EVENT_NAMES),
+                "event_time": received_at,
+                "fbp": "fb.1.1700000000.123" if rng.random() < 0.7 else None,
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(models.EventLog), batch)
+        written += len(batch)
+        log(f"seeded {written}/{rows} rows")
+
+    with engine.begin() as conn:
+        create_indexes(conn, ALWAYS_INDEXES)
+
+def drop_indexes(conn, indexes: dict) -> None:
+    for name in indexes:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+def create_indexes(conn, indexes: dict) -> None:
+    for name, columns in indexes.items():
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON event_logs {columns}"))
+    conn.execute(text("ANALYZE"))
+
+def event_range_query(website_id: int, cutoff: datetime):
+    """One website's events since `cutoff`, in the order the event listing and export read them."""
+    return select(
+        models.EventLog.id, models.EventLog.received_at, models.EventLog.event_name
+    ).where(
+        models.EventLog.website_id == website_id,
+        models.EventLog.received_at >= cutoff
+    ).order_by(models.EventLog.received_at, models.EventLog.id)
+
+def duplicate_event_ids_query(website_id: int, cutoff: datetime):
+    """Same shape as crud.get_potential_duplicate_events."""
+    return select(models.EventLog.event_id).where(
+        models.EventLog.website_id == website_id,
+        models.EventLog.received_at >= cutoff,
+        models.EventLog.event_id.is_not(None)
+    ).group_by(models.EventLog.event_id).having(func.count(models.EventLog.event_id) > 1)
+
+def explain(conn, stmt) -> list[str]:
+    """Returns the database's query plan for a statement as a list of lines."""
+    compiled = stmt.compile(conn)
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    if conn.dialect.name == "postgresql":
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+    else:
+        prefix = "EXPLAIN QUERY PLAN "
+    rows = conn.exec_driver_sql(prefix + str(compiled), params).all()
+    return [" | ".join(str(value) for value in row) for row in rows]
+
+def time_query(conn, build_query, website_ids: list[int], cutoff: datetime, repeats: int) -> dict:
+    """Runs a query for several websites and reports latency percentiles in ms."""
+    timings = []
+    for _ in range(repeats):
+        for website_id in website_ids:
+            start = time.perf_counter()
+            conn.execute(build_query(website_id, cutoff)).all()
+            timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "runs": len(timings),
+        "p50_ms": statistics.median(timings),
+        "p99_ms": timings[min(len(timings) - 1, int(len(timings) * 0.99))],
+    }
+
+def run_phase(engine, label: str, websites: int, repeats: int) -> dict:
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    queries = {
+        # (query builder, time window) -- the same windows the dashboard uses.
+        "event_range_24h": (event_range_query, now - timedelta(hours=24)),
+        "duplicate_event_ids_60m": (duplicate_event_ids_query, now - timedelta(minutes=60)),
+    }
+    sample_websites = random.Random(7).sample(range(1, websites + 1), min(20, websites))
+
+    results = {}
+    with engine.connect() as conn:
+        for name, (build_query, cutoff) in queries.items():
+            plan = explain(conn, build_query(sample_websites[0], cutoff))
+            log(f"\n[{label}] {name} plan:\n  " + "\n  ".join(plan))
+            results[name] = {"plan": plan, **time_query(conn, build_query, sample_websites, cutoff, repeats)}
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///./bench_event_logs.db")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--websites", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=30, help="Spread received_at over this many days")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse an already seeded database")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    if not args.skip_seed:
+        seed(engine, args.rows, args.websites, args.days)
+
+    with engine.begin() as conn:
+        drop_indexes(conn, NEW_INDEXES)
+        create_indexes(conn, OLD_INDEXES)
+    before = run_phase(engine, "before", args.websites, args.repeats)
+
+    with engine.begin() as conn:
+        drop_indexes(conn, OLD_INDEXES)
+        create_indexes(conn, NEW_INDEXES)
+    after = run_phase(engine, "after", args.websites, args.repeats)
+
+    print(json.dumps({
+        "database": engine.dialect.name,
+        "rows": args.rows,
+        "websites": args.websites,
+        "before": before,
+        "after": after,
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
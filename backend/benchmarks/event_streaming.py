@@ -0,0 +1,88 @@
+"""
+Compares reading a large event_logs range all at once (`.all()`, then encode)
+with the streaming path behind GET /api/websites/{id}/events (crud.stream_query
+plus NDJSON encoding, batch by batch), in-process against a database seeded by
+benchmarks/seed.py.
+
+For each mode it reports the time to the first encoded byte, the total time,
+and the peak Python memory allocated while reading (tracemalloc). tracemalloc
+slows Python down several times, so compare the two modes with each other,
+not with production latencies.
+
+Usage (from the backend/ directory):
+
+    python -m benchmarks.event_streaming --database-url sqlite:///./bench_api.db --days 30
+
+Seed with `--websites 1` to put every row in one website's range.
+Results are printed as JSON on stdout (and saved to --output).
+"""
+import argparse
+import os
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import log, write_json
+
+def measure(produce_chunks) -> dict:
+    """Runs a chunk generator to the end, timing the first chunk and tracking peak memory."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    first_byte_ms = None
+    total_bytes = 0
+    for chunk in produce_chunks():
+        if first_byte_ms is None:
+            first_byte_ms = (time.perf_counter() - start) * 1000
+        total_bytes += len(chunk)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "first_byte_ms": round(first_byte_ms or 0.0, 3),
+        "total_seconds": round(elapsed, 3),
+        "bytes": total_bytes,
+        "peak_memory_mb": round(peak / 1024 / 1024, 1),
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///./bench_api.db")
+    parser.add_argument("--website-id", type=int, default=1)
+    parser.add_argument("--days", type=int, default=30, help="Read events received in the last N days")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    # app.database reads DATABASE_URL when it is first imported.
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    from app import database, export
+
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(days=args.days)
+    query = export.event_log_query(args.website_id, start, end)
+
+    def materialized():
+        # What every query did before: load the whole result, then encode it.
+        with database.engine.connect() as conn:
+            rows = conn.execute(query).all()
+        yield from export.write_batches(iter([rows]), "ndjson")
+
+    def streamed():
+        yield from export.stream_website_events(args.website_id, start, end, "ndjson")
+
+    results = {}
+    for name, produce in (("materialized", materialized), ("streamed", streamed)):
+        log(f"reading website {args.website_id}, last {args.days} days: {name}")
+        results[name] = measure(produce)
+        log(f"  first byte {results[name]['first_byte_ms']}ms, peak {results[name]['peak_memory_mb']}MB")
+
+    write_json({
+        "database": database.engine.dialect.name,
+        "website_id": args.website_id,
+        "days": args.days,
+        "batch_size": export.EVENT_STREAM_BATCH_SIZE,
+        "modes": results,
+    }, args.output)
+
+if __name__ == "__main__":
+    main()
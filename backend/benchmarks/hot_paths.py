@@ -0,0 +1,85 @@
+"""
+Micro-benchmarks of the functions behind the hottest endpoints, called
+in-process against a database seeded by benchmarks/seed.py (no HTTP involved):
+
+- crud.get_recent_event_summary       (/health, /alerts)
+- crud.get_potential_duplicate_events (the old /alerts duplicate query)
+- security.get_current_user           (every protected endpoint), with the
+                                      principal cache cold and warm
+
+Usage (from the backend/ directory):
+
+    python -m benchmarks.hot_paths --database-url sqlite:///./bench_api.db --repeats 200
+
+Results are printed as JSON on stdout (and saved to --output).
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+from benchmarks.common import DEFAULT_MANIFEST, log, summarize_latencies, write_json
+
+def time_calls(call, arguments: list, repeats: int, before_each=None) -> dict:
+    latencies = []
+    for i in range(repeats):
+        argument = arguments[i % len(arguments)]
+        if before_each:
+            before_each()
+        start = time.perf_counter()
+        call(argument)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return summarize_latencies(latencies)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///./bench_api.db")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    # app.database reads DATABASE_URL when it is first imported.
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    from app import crud, database, security
+
+    with open(args.manifest) as manifest_file:
+        manifest = json.load(manifest_file)
+    rng = random.Random(7)
+    website_ids = [rng.randint(1, manifest["websites"]) for _ in range(50)]
+    tokens = [security.create_access_token({"sub": str(user_id)}) for user_id in range(1, manifest["users"] + 1)]
+
+    results = {}
+    db = database.SessionLocal()
+    try:
+        log("crud.get_recent_event_summary")
+        results["get_recent_event_summary"] = time_calls(
+            lambda website_id: crud.get_recent_event_summary(db, website_id, time_window_hours=72),
+            website_ids, args.repeats)
+
+        log("crud.get_potential_duplicate_events")
+        results["get_potential_duplicate_events"] = time_calls(
+            lambda website_id: crud.get_potential_duplicate_events(db, website_id, time_window_minutes=60),
+            website_ids, args.repeats)
+
+        log("security.get_current_user")
+        results["get_current_user_cold"] = time_calls(
+            lambda token: security.get_current_user(token, db),
+            tokens, args.repeats, before_each=security.principal_cache.clear)
+        results["get_current_user_warm"] = time_calls(
+            lambda token: security.get_current_user(token, db),
+            tokens, args.repeats)
+    finally:
+        db.close()
+
+    write_json({
+        "database": database.engine.dialect.name,
+        "repeats": args.repeats,
+        "seed": manifest,
+        "functions": results,
+    }, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark: throughput of the identifier hashing stage, in events per second.
+
+Builds synthetic event batches in which a share of the customers are returning
+ones (same email/phone as an earlier event), then hashes them three ways:
+
+- per_event:   normalize + SHA-256 every identifier of every event, no cache
+- batch_cold:  app.identifiers.hash_identifier_batch with empty LRU caches
+- batch_warm:  the same batches again, now that the caches know the customers
+
+Usage (from the backend/ directory):
+
+    python -m benchmarks.identifier_hashing --events 200000 --returning 0.7
+
+Results are printed as JSON on stdout.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+# Make the `app` package importable, just like alembic/env.py does.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import identifiers
+
+def make_events(count: int, returning_share: float, seed: int = 42) -> list[dict]:
+    """Events with an email and a phone; `returning_share` of them reuse an earlier customer."""
+    rng = random.Random(seed)
+    customers: list[tuple[str, str]] = []
+    events = []
+    for i in range(count):
+        if customers and rng.random() < returning_share:
+            email, phone = rng.choice(customers)
+        else:
+            email = f"  Customer{i}@Example.com "
+            phone = f"+46 70-{i % 1000:03d} {i // 1000 % 100:02d} {i % 97:02d}"
+            customers.append((email, phone))
+        events.append({"email": email, "phone": phone})
+    return events
+
+def hash_per_event(events: list[dict]) -> list[dict]:
+    """The naive baseline: one event at a time, every value hashed again."""
+    results = []
+    for event in events:
+        results.append({
+            "em": hashlib.sha256(identifiers.normalize_email(event["email"]).encode()).hexdigest(),
+            "ph": hashlib.sha256(identifiers.normalize_phone(event["phone"]).encode()).hexdigest(),
+        })
+    return results
+
+def measure(label: str, run, batches: list[list[dict]]) -> dict:
+    events = sum(len(batch) for batch in batches)
+    start = time.perf_counter()
+    for batch in batches:
+        run(batch)
+    elapsed = time.perf_counter() - start
+    return {"stage": label, "events": events, "seconds": round(elapsed, 4), "events_per_second": round(events / elapsed)}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--returning", type=float, default=0.7, help="Share of events from returning customers")
+    args = parser.parse_args()
+
+    events = make_events(args.events, args.returning)
+    batches = [events[i:i + args.batch_size] for i in range(0, len(events), args.batch_size)]
+
+    # Both approaches must produce exactly the same hashes.
+    assert hash_per_event(batches[0]) == identifiers.hash_identifier_batch(batches[0])
+    identifiers.clear_hash_caches()
+
+    results = [measure("per_event", hash_per_event, batches)]
+    results.append(measure("batch_cold", identifiers.hash_identifier_batch, batches))
+    results.append(measure("batch_warm", identifiers.hash_identifier_batch, batches))
+
+    print(json.dumps({
+        "events": args.events,
+        "batch_size": args.batch_size,
+        "returning_share": args.returning,
+        "results": results,
+        "hash_cache": identifiers.hash_cache_stats(),
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Load test: latency percentiles and throughput of the API hot paths under
+concurrent load, against a running server and a database seeded by
+benchmarks/seed.py.
+
+Scenarios (run one after the other, each with --concurrency clients):
+
+- ingest:    POST /api/websites/{id}/events with --ingest-batch events
+- health:    GET  /api/websites/{id}/health
+- alerts:    GET  /api/websites/{id}/alerts
+- dashboard: GET  /api/websites/{id}/dashboard (no If-None-Match)
+- login:     POST /api/login
+- users_me:  GET  /api/users/me
+
+Usage (from the backend/ directory):
+
+    python -m benchmarks.seed --database-url sqlite:///./bench_api.db --create-schema
+    DATABASE_URL=sqlite:///./bench_api.db SECRET_KEY=... uvicorn app.main:app --port 8000
+    python -m benchmarks.load_test --base-url http://localhost:8000 --requests 2000 --concurrency 32
+
+Results are printed as JSON on stdout (and saved to --output), so runs can be
+compared over time; progress goes to stderr.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.common import DEFAULT_MANIFEST, log, summarize_latencies, user_email, website_owner, write_json
+
+SCENARIOS = ["ingest", "health", "alerts", "dashboard", "login", "users_me"]
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, manifest: dict, ingest_batch: int, seed: int = 7):
+        self.client = client
+        self.manifest = manifest
+        self.ingest_batch = ingest_batch
+        self.rng = random.Random(seed)
+        self.tokens: dict[int, str] = {}
+
+    async def log_in_users(self, count: int) -> None:
+        """Gets a token for the first `count` users (bcrypt makes this the slow part of setup)."""
+        for user_id in range(1, min(count, self.manifest["users"]) + 1):
+            response = await self.client.post("/api/login", data={"username": user_email(user_id), "password": self.manifest["password"]})
+            response.raise_for_status()
+            self.tokens[user_id] = response.json()["access_token"]
+
+    def _owned_website(self) -> tuple[int, dict]:
+        """A random website owned by one of the logged-in users, with that user's auth header."""
+        while True:
+            website_id = self.rng.randint(1, self.manifest["websites"])
+            token = self.tokens.get(website_owner(website_id, self.manifest["users"]))
+            if token:
+                return website_id, {"Authorization": f"Bearer {token}"}
+
+    def request_for(self, scenario: str):
+        """Builds the next request of a scenario as a coroutine factory."""
+        if scenario == "ingest":
+            website_id = self.rng.randint(1, self.manifest["websites"])
+            now = datetime.now(timezone.utc).isoformat()
+            events = [{
+                "event_name": self.rng.choice(["PageView", "AddToCart", "Purchase"]),
+                "event_time": now,
+                "event_id": f"load-{self.rng.randrange(10**9)}",
+                "fbp": "fb.1.1700000000.1",
+                "email": f"load{self.rng.randrange(10000)}@example.com",
+            } for _ in range(self.ingest_batch)]
+            return lambda: self.client.post(f"/api/websites/{website_id}/events", json={"events": events})
+        if scenario in ("health", "alerts", "dashboard"):
+            website_id, headers = self._owned_website()
+            return lambda: self.client.get(f"/api/websites/{website_id}/{scenario}", headers=headers)
+        if scenario == "login":
+            user_id = self.rng.randint(1, self.manifest["users"])
+            data = {"username": user_email(user_id), "password": self.manifest["password"]}
+            return lambda: self.client.post("/api/login", data=data)
+        if scenario == "users_me":
+            token = self.tokens[self.rng.choice(list(self.tokens))]
+            return lambda: self.client.get("/api/users/me", headers={"Authorization": f"Bearer {token}"})
+        raise ValueError(f"Unknown scenario {scenario!r}")
+
+    async def run_scenario(self, scenario: str, requests: int, concurrency: int) -> dict:
+        latencies: list[float] = []
+        statuses: dict[int, int] = {}
+        errors = 0
+        remaining = iter(range(requests))
+
+        async def worker() -> None:
+            nonlocal errors
+            for _ in remaining:
+                send = self.request_for(scenario)
+                start = time.perf_counter()
+                try:
+                    response = await send()
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                    if response.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        return {
+            **summarize_latencies(latencies, elapsed),
+            "errors": errors,
+            "statuses": {str(code): count for code, count in sorted(statuses.items())},
+            "seconds": round(elapsed, 3),
+        }
+
+async def run(args) -> dict:
+    with open(args.manifest) as manifest_file:
+        manifest = json.load(manifest_file)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        load_test = LoadTest(client, manifest, args.ingest_batch)
+        log(f"logging in {args.login_users} users")
+        await load_test.log_in_users(args.login_users)
+
+        results = {}
+        for scenario in args.scenarios:
+            # Logins are expensive by design, so that scenario gets fewer requests.
+            requests = max(1, args.requests // 10) if scenario == "login" else args.requests
+            log(f"running {scenario}: {requests} requests, concurrency {args.concurrency}")
+            results[scenario] = await load_test.run_scenario(scenario, requests, args.concurrency)
+            log(f"  p50={results[scenario]['p50_ms']}ms p99={results[scenario]['p99_ms']}ms errors={results[scenario]['errors']}")
+
+    return {
+        "base_url": args.base_url,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "concurrency": args.concurrency,
+        "ingest_batch": args.ingest_batch,
+        "seed": manifest,
+        "scenarios": results,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per scenario (login runs a tenth of these)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--ingest-batch", type=int, default=10, help="Events per ingest request")
+    parser.add_argument("--login-users", type=int, default=20, help="Users whose tokens the protected scenarios use")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    write_json(asyncio.run(run(args)), args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+A local stand-in for the Meta Conversions API, for testing event forwarding.
+
+It accepts `POST /{version}/{pixel_id}/events` just like graph.facebook.com,
+remembers what it received, and answers the way Meta does. Latency and
+failures can be simulated so retries, checkpoints and concurrency limits can
+be watched without a real pixel.
+
+Usage (from the backend/ directory):
+
+    MOCK_CAPI_LATENCY_MS=50 MOCK_CAPI_FAILURE_RATE=0.1 uvicorn benchmarks.mock_capi:app --port 9000
+    META_GRAPH_API_URL=http://localhost:9000 uvicorn app.main:app
+
+`GET /_stats` shows how many requests and events arrived per pixel, and the
+highest number of requests that were in flight for one pixel at the same time.
+"""
+import asyncio
+import os
+import random
+from collections import defaultdict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+LATENCY_MS = float(os.getenv("MOCK_CAPI_LATENCY_MS", "0"))
+FAILURE_RATE = float(os.getenv("MOCK_CAPI_FAILURE_RATE", "0")) # Share of requests answered with a 500
+
+app = FastAPI(title="Mock Conversions API")
+
+requests_received: dict[str, int] = defaultdict(int)
+events_received: dict[str, int] = defaultdict(int)
+event_ids_received: dict[str, list] = defaultdict(list)
+in_flight: dict[str, int] = defaultdict(int)
+max_in_flight: dict[str, int] = defaultdict(int)
+
+@app.post("/{version}/{pixel_id}/events")
+async def receive_events(version: str, pixel_id: str, request: Request):
+    payload = await request.json()
+    in_flight[pixel_id] += 1
+    max_in_flight[pixel_id] = max(max_in_flight[pixel_id], in_flight[pixel_id])
+    try:
+        if LATENCY_MS:
+            await asyncio.sleep(LATENCY_MS / 1000)
+        requests_received[pixel_id] += 1
+
+        if not payload.get("access_token"):
+            return JSONResponse(status_code=400, content={"error": {"message": "An access token is required", "code": 190}})
+        data = payload.get("data") or []
+        if len(data) > 1000:
+            return JSONResponse(status_code=400, content={"error": {"message": "Too many events in one request", "code": 100}})
+        if FAILURE_RATE and random.random() < FAILURE_RATE:
+            return JSONResponse(status_code=500, content={"error": {"message": "Simulated failure", "code": 2}})
+
+        events_received[pixel_id] += len(data)
+        event_ids_received[pixel_id].extend(event.get("event_id") for event in data)
+        return {"events_received": len(data), "messages": [], "fbtrace_id": f"mock-{requests_received[pixel_id]}"}
+    finally:
+        in_flight[pixel_id] -= 1
+
+@app.get("/_stats")
+async def stats():
+    return {
+        pixel_id: {
+            "requests": requests_received[pixel_id],
+            "events": events_received[pixel_id],
+            "distinct_event_ids": len(set(event_ids_received[pixel_id])),
+            "max_in_flight": max_in_flight[pixel_id],
+        }
+        for pixel_id in requests_received
+    }
+
+@app.post("/_reset")
+async def reset():
+    for counters in (requests_received, events_received, event_ids_received, in_flight, max_in_flight):
+        counters.clear()
+    return {"status": "ok"}
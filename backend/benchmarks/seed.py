@@ -0,0 +1,137 @@
+"""
+Seeds a database with synthetic users, websites and events for benchmarking.
+
+Works on SQLite and PostgreSQL. The schema should already exist
+(`alembic upgrade head`), so PostgreSQL gets the real partitioned event_logs
+table; `--create-schema` builds it from the models instead, which is handy for
+a throwaway SQLite file. Partitions covering the seeded days are created first,
+and the health rollup, attribution totals and volume time series are filled
+through the same upserts the ingest buffer uses.
+
+Usage (from the backend/ directory):
+
+    python -m benchmarks.seed --database-url sqlite:///./bench_api.db --create-schema --rows 1000000
+    python -m benchmarks.seed --database-url postgresql+psycopg://... --rows 10000000 --websites 1000
+
+Every user's password is the same (see benchmarks/common.py). A manifest
+describing the seed is written to --manifest for benchmarks/load_test.py and
+printed as JSON on stdout.
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("SECRET_KEY", "benchmark") # app.crud imports app.security
+
+from sqlalchemy import create_engine, insert, text
+from passlib.context import CryptContext
+
+from benchmarks.common import BENCH_PASSWORD, DEFAULT_MANIFEST, log, user_email, website_owner, write_json
+from app import attribution, crud, models, partitions, timeseries
+
+EVENT_NAMES = ["PageView", "ViewContent", "AddToCart", "InitiateCheckout", "Purchase"]
+EVENT_WEIGHTS = [60, 20, 10, 6, 4]
+
+def seed_accounts(conn, users: int, websites: int, bcrypt_rounds: int) -> None:
+    # bcrypt is slow on purpose, so every user shares one hash of the same password.
+    password_hash = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=bcrypt_rounds).hash(BENCH_PASSWORD)
+    conn.execute(insert(models.User), [
+        {"id": user_id, "name": f"Bench {user_id}", "email": user_email(user_id)}
+        for user_id in range(1, users + 1)
+    ])
+    conn.execute(insert(models.UserAuth), [
+        {"user_id": user_id, "password_hash": password_hash} for user_id in range(1, users + 1)
+    ])
+    conn.execute(insert(models.Website), [
+        {"id": website_id, "user_id": website_owner(website_id, users), "url": f"https://shop{website_id}.example.com", "name": f"Shop {website_id}"}
+        for website_id in range(1, websites + 1)
+    ])
+    if conn.dialect.name == "postgresql":
+        # The ids were given explicitly, so move the sequences past them.
+        for table in ("users", "websites"):
+            conn.execute(text(f"SELECT setval('{table}_id_seq', (SELECT MAX(id) FROM {table}))"))
+
+def make_event_rows(rng: random.Random, count: int, websites: int, now: datetime, window_seconds: int, total_rows: int) -> list[dict]:
+    rows = []
+    for _ in range(count):
+        received_at = now - timedelta(seconds=rng.randrange(window_seconds))
+        customer = rng.randrange(max(1, total_rows // 20)) # Customers come back about 20 times
+        rows.append({
+            "website_id": rng.randint(1, websites),
+            "received_at": received_at,
+            # ~2% of events reuse a recent event_id, like a double-firing pixel.
+            "event_id": f"evt-{rng.randrange(max(1, total_rows // 50) if rng.random() < 0.02 else total_rows * 10)}",
+            "event_name": rng.choices(EVENT_NAMES, EVENT_WEIGHTS)[0],
+            "event_time": received_at,
+            "event_source_url": f"https://shop.example.com/p/{rng.randrange(500)}?utm_campaign=c{rng.randrange(20)}",
+            "user_ip_address": f"10.{customer % 256}.{customer // 256 % 256}.{customer % 97}",
+            "user_agent": "Mozilla/5.0 (benchmark)",
+            "fbp": f"fb.1.1700000000.{customer}" if rng.random() < 0.7 else None,
+            "fbc": f"fb.1.1700000000.click{customer}" if rng.random() < 0.2 else None,
+            "email": f"customer{customer}@example.com" if rng.random() < 0.3 else None,
+            "phone": f"+4670{customer:07d}" if rng.random() < 0.1 else None,
+            "value": round(rng.uniform(10, 300), 2) if rng.random() < 0.04 else None,
+            "currency": "USD",
+        })
+    return rows
+
+def seed_events(engine, rows: int, websites: int, days: int, chunk_size: int) -> None:
+    rng = random.Random(42)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    window_seconds = days * 24 * 3600
+
+    with engine.connect() as conn:
+        if partitions.is_partitioned(conn):
+            created = partitions.ensure_partitions(conn, today=(now - timedelta(days=days)).date(), ahead_days=days + 1)
+            conn.commit()
+            log(f"created {len(created)} partitions")
+
+    written = 0
+    started = time.perf_counter()
+    while written < rows:
+        batch = make_event_rows(rng, min(chunk_size, rows - written), websites, now, window_seconds, rows)
+        with engine.begin() as conn:
+            conn.execute(insert(models.EventLog), batch)
+            conn.execute(crud.build_event_health_rollup_upsert(conn.dialect.name, crud.aggregate_event_health(batch)))
+            attribution.record_events(conn, batch)
+            timeseries.record_events(conn, batch)
+        written += len(batch)
+        log(f"seeded {written}/{rows} events ({written / (time.perf_counter() - started):.0f}/s)")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite:///./bench_api.db")
+    parser.add_argument("--create-schema", action="store_true", help="Drop and create the tables from the models first")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="event_logs rows to insert")
+    parser.add_argument("--websites", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--days", type=int, default=30, help="Spread received_at over this many days")
+    parser.add_argument("--chunk-size", type=int, default=20000)
+    parser.add_argument("--bcrypt-rounds", type=int, default=int(os.getenv("BCRYPT_ROUNDS", "12")))
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    if args.create_schema:
+        models.Base.metadata.drop_all(engine)
+        models.Base.metadata.create_all(engine)
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        seed_accounts(conn, args.users, args.websites, args.bcrypt_rounds)
+    seed_events(engine, args.rows, args.websites, args.days, args.chunk_size)
+
+    write_json({
+        "database": engine.dialect.name,
+        "users": args.users,
+        "websites": args.websites,
+        "rows": args.rows,
+        "days": args.days,
+        "password": BENCH_PASSWORD,
+        "seed_seconds": round(time.perf_counter() - started, 1),
+    }, args.manifest)
+
+if __name__ == "__main__":
+    main()
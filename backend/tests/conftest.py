@@ -0,0 +1,10 @@
+import os
+import tempfile
+
+# app.database builds its engines at import time, so point them at a throwaway
+# SQLite file before any test imports the app (never at a real database).
+_database_dir = tempfile.mkdtemp(prefix="claritytracking-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_database_dir}/test.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("CACHE_BACKEND", "memory")
@@ -0,0 +1,65 @@
+"""
+GET /api/websites must cost the same number of SQL statements however many
+websites (and connections) a user owns, i.e. there is no N+1 relationship
+loading in the listing.
+"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app import database, models, security
+from app.main import app
+
+CONNECTIONS_PER_WEBSITE = 2
+
+def seed(conn, websites: int) -> None:
+    conn.execute(insert(models.User), [{"id": 1, "name": "Agency", "email": "agency@example.com"}])
+    conn.execute(insert(models.Website), [
+        {"id": website_id, "user_id": 1, "url": f"https://shop{website_id}.example.com", "name": f"Shop {website_id}"}
+        for website_id in range(1, websites + 1)
+    ])
+    conn.execute(insert(models.Connection), [
+        {"website_id": website_id, "platform": "meta", "platform_identifiers": {"pixel_id": str(website_id * 10 + n)}}
+        for website_id in range(1, websites + 1) for n in range(CONNECTIONS_PER_WEBSITE)
+    ])
+
+@pytest.fixture
+def count_listing_queries(tmp_path):
+    """Returns a function that seeds a fresh database and counts one listing's statements."""
+    def count(websites: int) -> int:
+        path = tmp_path / f"websites_{websites}.db"
+        engine = create_engine(f"sqlite:///{path}")
+        models.Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            seed(conn, websites)
+        engine.dispose()
+
+        # No pool: each request runs on its own event loop under TestClient.
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+        sessions = async_sessionmaker(async_engine, expire_on_commit=False)
+        statements = []
+        event.listen(async_engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+        async def get_async_db():
+            async with sessions() as db:
+                yield db
+
+        app.dependency_overrides[database.get_async_db] = get_async_db
+        app.dependency_overrides[security.get_current_user_async] = lambda: models.User(id=1, name="Agency", email="agency@example.com")
+        try:
+            response = TestClient(app).get("/api/websites", params={"limit": 500})
+        finally:
+            app.dependency_overrides.clear()
+
+        assert response.status_code == 200
+        listed = response.json()
+        assert len(listed) == websites
+        assert all(len(website["connections"]) == CONNECTIONS_PER_WEBSITE for website in listed)
+        return len(statements)
+    return count
+
+def test_website_listing_query_count_is_constant(count_listing_queries):
+    counts = {websites: count_listing_queries(websites) for websites in (1, 10, 100)}
+    assert len(set(counts.values())) == 1, f"query count grows with the number of websites: {counts}"
@@ -1,29 +1,33 @@
 import { useState, useEffect } from 'react';
-// We'll add API calls and chart imports later
+import { getWebsiteDashboard } from '../services/api';
 // NEW: Import Recharts components
 import { BarChart, Bar, XAxis, YAxis, Tooltip, ResponsiveContainer, CartesianGrid } from 'recharts';
 
-// Placeholder data for now
-const mockAttributionData = {
-  totalConversionsRecovered: 137,
-  trueROAS: 3.4,
-  campaignPerformance: [
-    { id: 'C1', name: 'Campaign A', roas: 4.1 },
-    { id: 'C2', name: 'Campaign B', roas: 2.8 },
-    { id: 'C3', name: 'Campaign C', roas: 3.9 },
-  ],
-};
-
 function AttributionDashboard({ websiteId }) {
-  const [data, setData] = useState(mockAttributionData); // Using mock data for now
-  const [isLoading, setIsLoading] = useState(false); // Set to false since we have mock data
+  const [data, setData] = useState(null);
+  const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState(null);
 
-  // We'll add a useEffect for fetching real data later
-  // useEffect(() => {
-  //   const fetchData = async () => { ... };
-  //   fetchData();
-  // }, [websiteId]);
+  // The numbers come precomputed from the backend's attribution engine.
+  useEffect(() => {
+    const fetchData = async () => {
+      if (!websiteId) return;
+      try {
+        setIsLoading(true);
+        const dashboard = await getWebsiteDashboard(websiteId);
+        setData({
+          totalConversionsRecovered: dashboard.total_conversions_recovered,
+          trueROAS: dashboard.overall_roas,
+          campaignPerformance: dashboard.campaign_performance,
+        });
+      } catch (err) {
+        setError(err.message);
+      } finally {
+        setIsLoading(false);
+      }
+    };
+    fetchData();
+  }, [websiteId]);
 
   if (isLoading) {
     return <p className="text-gray-400 mt-4">Loading attribution data...</p>;
@@ -33,11 +37,15 @@ function AttributionDashboard({ websiteId }) {
     return <p className="text-red-400 mt-4">Error loading attribution data: {error}</p>;
   }
 
+  if (!data) {
+    return null;
+  }
+
   return (
     <div className="mt-8 pt-6 border-t border-gray-700">
       <h3 className="text-lg font-semibold text-white mb-4">Attribution Overview</h3>
       
-      {/* Placeholder sections for the key metrics */}
+      {/* The key metrics */}
       <div className="grid grid-cols-1 md:grid-cols-2 gap-4 mb-6">
         <div className="bg-gray-700 p-4 rounded-lg">
           <p className="text-3xl font-bold text-white">{data.totalConversionsRecovered}</p>
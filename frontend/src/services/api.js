@@ -109,4 +109,11 @@ export async function getWebsiteHealth(websiteId) {
 export async function getWebsiteAlerts(websiteId) {
   const response = await authFetch(`/api/websites/${websiteId}/alerts`);
   return handleErrors(response);
-}
\ No newline at end of file
+}
+/**
+ * NEW: Fetches the aggregated dashboard (conversions, ROAS, campaigns, health, alerts).
+ */
+export async function getWebsiteDashboard(websiteId) {
+  const response = await authFetch(`/api/websites/${websiteId}/dashboard`);
+  return handleErrors(response);
+}